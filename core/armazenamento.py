@@ -0,0 +1,193 @@
+import hashlib
+import os
+import posixpath
+from collections import Counter
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.core.files.utils import validate_file_name
+from django.db import models
+from django.utils.module_loading import import_string
+
+
+# =========================================================
+# ARMAZENAMENTO DEDUPLICADO (nome = hash do conteúdo)
+# =========================================================
+# Envolve o storage real (FileSystemStorage ou S3Storage): cada arquivo é
+# gravado em <prefixo>/<2 primeiros do hash>/<sha256><extensão>. Reenviar o
+# mesmo arquivo (ou o mesmo papel timbrado em várias configurações) aponta
+# para o objeto que já existe, sem novo upload/PUT.
+#
+# Como um objeto pode ser usado por vários registros, delete() só apaga
+# quando nenhum registro aponta para ele (contagem de referências abaixo);
+# o resto (arquivos substituídos por um novo upload, que o Django não apaga)
+# fica para o comando limpar_arquivos_orfaos.
+
+BLOCO_HASH = 1024 * 1024
+
+
+def hash_conteudo(content):
+    sha = hashlib.sha256()
+    for bloco in content.chunks(BLOCO_HASH):
+        sha.update(bloco)
+    return sha.hexdigest()
+
+
+class ArmazenamentoDeduplicado(Storage):
+    """
+    STORAGES["default"] = {
+        "BACKEND": "core.armazenamento.ArmazenamentoDeduplicado",
+        "OPTIONS": {"backend": "storages.backends.s3.S3Storage"},
+    }
+
+    `backend` é o storage real (caminho da classe) e `opcoes`, os argumentos
+    dele. Arquivos gravados antes (fora do prefixo) continuam sendo lidos e
+    apagados normalmente.
+    """
+
+    def __init__(self, backend="django.core.files.storage.FileSystemStorage", opcoes=None, prefixo="arquivos"):
+        self.backend = import_string(backend)(**(opcoes or {}))
+        self.prefixo = prefixo.strip("/")
+
+    def __getattr__(self, nome):
+        # Atributos próprios do storage real (location, bucket, ...)
+        if nome == "backend":
+            raise AttributeError(nome)
+        return getattr(self.backend, nome)
+
+    def nome_por_conteudo(self, name, content):
+        extensao = posixpath.splitext(name or "")[1].lower()[:10]
+        chave = hash_conteudo(content)
+        return f"{self.prefixo}/{chave[:2]}/{chave}{extensao}"
+
+    def deduplicado(self, name):
+        return bool(name) and name.startswith(self.prefixo + "/")
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        name = self.nome_por_conteudo(name, content)
+        validate_file_name(name, allow_relative_path=True)
+        if self.backend.exists(name):
+            # Mesmo conteúdo já gravado: nada a enviar. A data de modificação
+            # é renovada para o limpar_arquivos_orfaos não apagar o objeto
+            # (órfão antigo) antes de o registro novo ser salvo
+            self.tocar(name)
+            return name
+        # Corrida entre dois uploads iguais: no pior caso o FileSystemStorage
+        # grava uma cópia com sufixo (o S3 sobrescreve com o mesmo conteúdo)
+        return self.backend.save(name, content, max_length=max_length)
+
+    def tocar(self, name):
+        """Atualiza a data de modificação do objeto, sem mudar o conteúdo."""
+        try:
+            caminho = self.backend.path(name)
+        except NotImplementedError:
+            caminho = None
+        if caminho:
+            os.utime(caminho)
+            return
+
+        bucket = getattr(self.backend, "bucket", None)
+        if bucket is None:
+            return
+        from storages.utils import clean_name
+
+        # S3: cópia sobre si mesmo (REPLACE exige repetir tipo, cache e ACL)
+        objeto = bucket.Object(self.backend._normalize_name(clean_name(name)))
+        extras = {"ContentType": objeto.content_type, "Metadata": objeto.metadata}
+        if objeto.cache_control:
+            extras["CacheControl"] = objeto.cache_control
+        if self.backend.default_acl:
+            extras["ACL"] = self.backend.default_acl
+        objeto.copy_from(
+            CopySource={"Bucket": bucket.name, "Key": objeto.key},
+            MetadataDirective="REPLACE",
+            **extras,
+        )
+
+    def delete(self, name):
+        if self.deduplicado(name) and contar_referencias(name):
+            return
+        self.backend.delete(name)
+
+    def _open(self, name, mode="rb"):
+        return self.backend.open(name, mode)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def get_accessed_time(self, name):
+        return self.backend.get_accessed_time(name)
+
+    def get_created_time(self, name):
+        return self.backend.get_created_time(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+# =========================================================
+# REFERÊNCIAS (quem aponta para cada arquivo)
+# =========================================================
+# Todos os FileField/ImageField no storage padrão, mais os campos JSON
+# listados em `campos_arquivos_json` do model (ex.: Empresa.logo_derivados),
+# cujos valores são nomes de arquivo.
+
+def _fontes_referencias():
+    for model in apps.get_models():
+        for campo in model._meta.get_fields():
+            if isinstance(campo, models.FileField) and campo.storage is default_storage:
+                yield model, campo.name, False
+        for nome in getattr(model, "campos_arquivos_json", ()):
+            yield model, nome, True
+
+
+def _nomes_json(valor):
+    if isinstance(valor, dict):
+        valor = list(valor.values())
+    if not isinstance(valor, list):
+        return []
+    return [v for v in valor if isinstance(v, str) and v]
+
+
+def contar_referencias(name):
+    """Quantos registros apontam para o arquivo `name`."""
+    total = 0
+    for model, campo, json in _fontes_referencias():
+        if json:
+            # icontains compara o JSON como texto (SQLite e PostgreSQL); a
+            # contagem exata é feita aqui
+            valores = model._base_manager.filter(**{f"{campo}__icontains": name})
+            total += sum(_nomes_json(valor).count(name) for valor in valores.values_list(campo, flat=True))
+        else:
+            total += model._base_manager.filter(**{campo: name}).count()
+    return total
+
+
+def referencias_por_arquivo():
+    """Counter {nome do arquivo: registros que apontam para ele}."""
+    contagem = Counter()
+    for model, campo, json in _fontes_referencias():
+        valores = model._base_manager.filter(**{f"{campo}__isnull": False})
+        if not json:
+            valores = valores.exclude(**{campo: ""})
+        for valor in valores.values_list(campo, flat=True).iterator():
+            contagem.update(_nomes_json(valor) if json else [valor])
+    return contagem
@@ -0,0 +1,5 @@
+def tenant(request):
+    """
+    Disponibiliza o tenant da requisição (empresa + permissões) nos templates.
+    """
+    return {"tenant": getattr(request, "tenant", None)}
@@ -0,0 +1,100 @@
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+
+REPLICA_ALIAS = "replica"
+
+# Ativado pelo ReplicaMiddleware nas views marcadas com @usa_replica
+_usar_replica = ContextVar("usar_replica", default=False)
+
+# Apps/models que sempre leem do primário (sessão e usuário recém-gravados
+# no login não podem depender do atraso da réplica).
+REPLICA_APPS_EXCLUIDOS = {"sessions", "auth", "contenttypes", "admin"}
+REPLICA_MODELS_EXCLUIDOS = {"core.user"}
+
+REPLICA_STICKY_COOKIE = "db_primario_ate"
+
+
+def replica_configurada():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def usa_replica(view):
+    """
+    Marca uma view somente-leitura para ler da réplica (ver ReplicaMiddleware).
+    Em class-based views, use o atributo de classe `usa_replica = True`.
+    """
+    view.usa_replica = True
+    return view
+
+
+def set_usar_replica(ativo):
+    return _usar_replica.set(ativo)
+
+
+def reset_usar_replica(token):
+    _usar_replica.reset(token)
+
+
+def marcar_primario(response):
+    """
+    Read-your-writes: por REPLICA_STICKY_SECONDS após uma escrita, as leituras
+    desse navegador continuam indo para o primário.
+    """
+    segundos = settings.REPLICA_STICKY_SECONDS
+    response.set_cookie(
+        REPLICA_STICKY_COOKIE,
+        str(int(time.time()) + segundos),
+        max_age=segundos,
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+def leitura_fixada_no_primario(request):
+    try:
+        ate = int(request.COOKIES.get(REPLICA_STICKY_COOKIE, "0"))
+    except ValueError:
+        return False
+    return ate > time.time()
+
+
+class ReplicaRouter:
+    """
+    Envia leituras para a réplica apenas quando a requisição atual foi
+    liberada para isso (view marcada e sem escrita recente do usuário) e
+    fora de transaction.atomic(). Escritas sempre vão para o primário.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _usar_replica.get():
+            return None
+        if connections["default"].in_atomic_block:
+            # Dentro de uma transação, lê o que a própria transação gravou
+            return None
+        if model._meta.app_label in REPLICA_APPS_EXCLUIDOS:
+            return None
+        if model._meta.label_lower in REPLICA_MODELS_EXCLUIDOS:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplica e primário têm os mesmos dados
+        return True
+
+
+def pool_stats(alias="default"):
+    """
+    Estatísticas do pool psycopg3 deste processo (ver DB_POOL nas settings).
+    Retorna None quando o banco não usa pool.
+    """
+    connection = connections[alias]
+    if connection.vendor != "postgresql" or not connection.settings_dict["OPTIONS"].get("pool"):
+        return None
+    return connection.pool.get_stats()
@@ -154,6 +154,9 @@ class PropostaConfiguracaoForm(forms.ModelForm):
             "margem_esquerda",
             "margem_direita",
             "numero_auto_iniciar",
+            "expirar_vencidas",
+            "expirar_apos_dias",
+            "expirar_rascunhos",
             # numero_config vem via numero_config_json
         ]
         widgets = {
@@ -169,6 +172,7 @@ class PropostaConfiguracaoForm(forms.ModelForm):
             "margem_esquerda": forms.NumberInput(attrs={"step": "0.1", "min": "0"}),
             "margem_direita": forms.NumberInput(attrs={"step": "0.1", "min": "0"}),
             "numero_auto_iniciar": forms.NumberInput(attrs={"min": "1"}),
+            "expirar_apos_dias": forms.NumberInput(attrs={"min": "0"}),
         }
 
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,166 @@
+import hashlib
+import io
+import logging
+import posixpath
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+try:
+    from PIL import ImageCms
+except ImportError:  # Pillow sem LittleCMS: mantém as cores como vieram
+    ImageCms = None
+
+logger = logging.getLogger(__name__)
+
+
+# =========================================================
+# DERIVADOS DA LOGO DA EMPRESA
+# =========================================================
+# A logo enviada (muitas vezes uma foto de celular com vários MB) fica
+# guardada como veio; sidebar, página pública e PDF usam versões de tamanho
+# fixo geradas no upload, sem metadados (EXIF, GPS, textos do PNG).
+
+# Resolução do PDF: o logo ocupa até 25 x 25 mm no cabeçalho
+PDF_DPI = 300
+PDF_LADO_MM = 25
+
+# nome: (largura, altura, formato, recorte). Tamanhos em 2x para telas de alta
+# densidade; "recorte" preenche a caixa inteira (object-fit: cover), senão a
+# imagem cabe inteira nela (object-fit: contain).
+DERIVADOS_LOGO = {
+    # .sidebar-user-avatar: círculo de 40px
+    "sidebar": (80, 80, "WEBP", True),
+    # .empresa-logo da página pública: até 80 x 80px
+    "publica": (160, 160, "WEBP", False),
+    # PNG: o WeasyPrint incorpora direto no PDF, com transparência
+    "pdf": (
+        round(PDF_LADO_MM / 25.4 * PDF_DPI),
+        round(PDF_LADO_MM / 25.4 * PDF_DPI),
+        "PNG",
+        False,
+    ),
+}
+
+PASTA_DERIVADOS = "logos/derivados"
+
+_EXTENSOES = {"WEBP": "webp", "PNG": "png"}
+
+
+def _abrir(conteudo):
+    imagem = Image.open(io.BytesIO(conteudo))
+    # JPEG: decodifica já reduzido (escala 1/2, 1/4, 1/8) quando a foto é
+    # muito maior que o maior derivado; evita descomprimir os MB inteiros
+    maior = max(max(largura, altura) for largura, altura, _, _ in DERIVADOS_LOGO.values())
+    imagem.draft("RGB", (maior * 2, maior * 2))
+    imagem = ImageOps.exif_transpose(imagem)
+
+    icc = imagem.info.get("icc_profile")
+    if icc and ImageCms is not None:
+        # Converte para sRGB antes de descartar o perfil de cor
+        modo = "RGBA" if "A" in imagem.getbands() else "RGB"
+        try:
+            imagem = ImageCms.profileToProfile(
+                imagem.convert(modo),
+                ImageCms.ImageCmsProfile(io.BytesIO(icc)),
+                ImageCms.createProfile("sRGB"),
+                outputMode=modo,
+            )
+        except (OSError, ValueError, ImageCms.PyCMSError):
+            pass
+
+    transparente = "A" in imagem.getbands() or "transparency" in imagem.info
+    return imagem.convert("RGBA" if transparente else "RGB")
+
+
+def _redimensionar(imagem, largura, altura, recorte):
+    if recorte:
+        return ImageOps.fit(imagem, (largura, altura), Image.Resampling.LANCZOS)
+    return ImageOps.contain(imagem, (largura, altura), Image.Resampling.LANCZOS)
+
+
+def _codificar(imagem, formato):
+    # Imagem nova, só com os pixels: nada de imagem.info (EXIF, ICC, textos)
+    # vai para o arquivo
+    limpa = Image.new(imagem.mode, imagem.size)
+    limpa.paste(imagem)
+    saida = io.BytesIO()
+    if formato == "WEBP":
+        limpa.save(saida, format="WEBP", quality=85, method=6)
+    else:
+        limpa.save(saida, format="PNG", optimize=True)
+    return saida.getvalue()
+
+
+def gerar_derivados_logo(empresa):
+    """
+    Gera os derivados de DERIVADOS_LOGO a partir de `empresa.logo` e grava
+    no storage da logo (disco local ou S3). Retorna o dicionário para
+    `Empresa.logo_derivados`: {"origem": nome da logo, <derivado>: nome}.
+
+    Se o arquivo ou a imagem não puderem ser lidos, retorna só a origem: as telas continuam
+    usando a logo original.
+    """
+    logo = empresa.logo
+    if not logo:
+        return {}
+
+    derivados = {"origem": logo.name}
+    try:
+        # Arquivo sumido do storage (ou S3 fora do ar) também cai aqui
+        with logo.open("rb") as arquivo:
+            conteudo = arquivo.read()
+        imagem = _abrir(conteudo)
+    except (UnidentifiedImageError, OSError, ValueError, Image.DecompressionBombError):
+        logger.warning("Logo da empresa %s não pôde ser processada: %s", empresa.pk, logo.name, exc_info=True)
+        return derivados
+
+    # Hash do original no nome: a URL muda junto com a logo
+    chave = hashlib.sha256(conteudo).hexdigest()[:12]
+    base = posixpath.splitext(posixpath.basename(logo.name))[0][:40]
+    for nome, (largura, altura, formato, recorte) in DERIVADOS_LOGO.items():
+        dados = _codificar(_redimensionar(imagem, largura, altura, recorte), formato)
+        caminho = f"{PASTA_DERIVADOS}/{empresa.pk}/{base}_{chave}_{nome}.{_EXTENSOES[formato]}"
+        derivados[nome] = logo.storage.save(caminho, ContentFile(dados))
+    return derivados
+
+
+def excluir_derivados_logo(storage, derivados, manter=()):
+    for nome, caminho in (derivados or {}).items():
+        # S3 sobrescreve o mesmo nome: não apaga o que acabou de ser gravado
+        if nome != "origem" and caminho and caminho not in manter:
+            storage.delete(caminho)
+
+
+def atualizar_derivados_logo(empresa, forcar=False):
+    """
+    Regera os derivados quando a logo mudou desde a última geração (ou
+    sempre, com `forcar`), exclui os antigos e grava o resultado sem passar
+    por save() (não altera updated_at nem dispara signals). Retorna True se
+    algo mudou.
+    """
+    atuais = empresa.logo_derivados or {}
+    nome_logo = empresa.logo.name if empresa.logo else None
+    if not forcar and atuais.get("origem") == nome_logo:
+        return False
+
+    novos = gerar_derivados_logo(empresa)
+    empresa.logo_derivados = novos
+    type(empresa).objects.filter(pk=empresa.pk).update(logo_derivados=novos)
+    # Depois do update: os antigos já não são referenciados pela empresa
+    excluir_derivados_logo(empresa.logo.storage, atuais, manter=novos.values())
+    return True
+
+
+def url_logo(empresa, derivado):
+    """
+    URL do derivado da logo; a logo original se ele não existir (ainda não
+    gerado, imagem ilegível ou gerado para uma logo anterior).
+    """
+    if not empresa or not empresa.logo:
+        return ""
+    derivados = empresa.logo_derivados or {}
+    caminho = derivados.get(derivado)
+    if caminho and derivados.get("origem") == empresa.logo.name:
+        return empresa.logo.storage.url(caminho)
+    return empresa.logo.url
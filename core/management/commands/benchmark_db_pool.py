@@ -0,0 +1,100 @@
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.models import Empresa
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do banco com e sem o pool do psycopg3. "
+        "Simula requisições (abrir conexão, algumas consultas, fechar) em várias "
+        "threads contra o Postgres configurado em DATABASE_URL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=2000, help="Total de requisições por modo.")
+        parser.add_argument("--queries", type=int, default=3, help="Consultas por requisição.")
+        parser.add_argument("--pool-min-size", type=int, default=4)
+        parser.add_argument("--pool-max-size", type=int, default=16)
+
+    def handle(self, *args, **opts):
+        base = connections["default"].settings_dict
+        if connections["default"].vendor != "postgresql":
+            raise CommandError("Este benchmark precisa de um Postgres (defina DATABASE_URL).")
+
+        direto = dict(base, CONN_MAX_AGE=0)
+        direto["OPTIONS"] = {k: v for k, v in base["OPTIONS"].items() if k != "pool"}
+
+        com_pool = dict(direto)
+        com_pool["OPTIONS"] = dict(
+            direto["OPTIONS"],
+            pool={
+                "min_size": opts["pool_min_size"],
+                "max_size": opts["pool_max_size"],
+                "timeout": 30,
+            },
+        )
+
+        connections.settings["bench_direto"] = direto
+        connections.settings["bench_pool"] = com_pool
+
+        resultados = [
+            self._rodar("bench_direto", "sem pool", opts),
+            self._rodar("bench_pool", "com pool", opts),
+        ]
+
+        self.stdout.write("")
+        self.stdout.write(f"{'modo':<10} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for r in resultados:
+            self.stdout.write(
+                f"{r['modo']:<10} {r['rps']:>9.1f} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f}"
+            )
+
+        stats = connections["bench_pool"].pool.get_stats()
+        self.stdout.write("")
+        self.stdout.write(f"Estatísticas do pool: {stats}")
+        connections["bench_pool"].close_pool()
+
+    def _rodar(self, alias, modo, opts):
+        total = opts["requests"]
+        n_threads = opts["threads"]
+        por_thread = [total // n_threads + (1 if i < total % n_threads else 0) for i in range(n_threads)]
+        latencias = []
+        lock = threading.Lock()
+
+        def worker(qtd):
+            conn = connections[alias]
+            locais = []
+            for _ in range(qtd):
+                inicio = time.perf_counter()
+                for _ in range(opts["queries"]):
+                    Empresa.objects.using(alias).filter(ativo=True).exists()
+                # Fim de "requisição": com CONN_MAX_AGE=0 o Django fecha a conexão
+                # (ou a devolve ao pool, quando há pool).
+                conn.close()
+                locais.append((time.perf_counter() - inicio) * 1000)
+            with lock:
+                latencias.extend(locais)
+
+        threads = [threading.Thread(target=worker, args=(qtd,)) for qtd in por_thread]
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duracao = time.perf_counter() - inicio
+
+        quantis = statistics.quantiles(latencias, n=100)
+        self.stdout.write(f"{modo}: {len(latencias)} requisições em {duracao:.2f}s")
+        return {
+            "modo": modo,
+            "rps": len(latencias) / duracao,
+            "p50": quantis[49],
+            "p95": quantis[94],
+            "p99": quantis[98],
+        }
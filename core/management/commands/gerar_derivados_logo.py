@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.logos import atualizar_derivados_logo
+from core.models import Empresa
+from core.tenant import invalidate_tenant
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera os derivados da logo (sidebar, página pública, PDF) das empresas "
+        "que ainda não têm ou cuja logo mudou desde a última geração. Para "
+        "rodar uma vez após o deploy ou depois de mudar DERIVADOS_LOGO (--forcar)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empresa", type=int, help="Só esta empresa.")
+        parser.add_argument(
+            "--forcar",
+            action="store_true",
+            help="Regera mesmo quando os derivados estão em dia.",
+        )
+
+    def handle(self, *args, **opts):
+        empresas = Empresa.objects.exclude(logo="").exclude(logo__isnull=True).order_by("pk")
+        if opts["empresa"]:
+            empresas = empresas.filter(pk=opts["empresa"])
+
+        total = 0
+        for empresa in empresas.only("pk", "logo", "logo_derivados").iterator():
+            if atualizar_derivados_logo(empresa, forcar=opts["forcar"]):
+                invalidate_tenant(empresa_id=empresa.pk)
+                gerados = [nome for nome in empresa.logo_derivados if nome != "origem"]
+                self.stdout.write(f"Empresa {empresa.pk}: {', '.join(gerados) or 'logo ilegível'}.")
+                total += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{total} empresa(s) atualizada(s)."))
@@ -0,0 +1,88 @@
+from datetime import timedelta
+
+from django.core.files.storage import storages
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.armazenamento import (
+    ArmazenamentoDeduplicado,
+    contar_referencias,
+    referencias_por_arquivo,
+)
+from core.uploads import PASTA_UPLOADS_DIRETOS, storage_real
+
+
+def _arquivos(storage, pasta):
+    try:
+        pastas, arquivos = storage.listdir(pasta)
+    except FileNotFoundError:
+        # Disco local: pasta ainda não criada (no S3 a listagem vem vazia)
+        return
+    for nome in arquivos:
+        yield f"{pasta}/{nome}"
+    for sub in pastas:
+        yield from _arquivos(storage, f"{pasta}/{sub}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Apaga do storage os arquivos deduplicados (core.armazenamento) e os "
+        "uploads diretos (core.uploads) que nenhum registro referencia mais: "
+        "logos, papéis timbrados e modelos próprios substituídos, removidos "
+        "ou nunca confirmados. Arquivos recentes são mantidos (upload em "
+        "andamento ainda sem registro salvo). Pensado para rodar diariamente "
+        "(cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--horas",
+            type=int,
+            default=24,
+            help="Só apaga arquivos modificados há mais que isso (padrão: 24).",
+        )
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Só lista os órfãos, sem apagar.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["horas"] < 0:
+            raise CommandError("--horas não pode ser negativo.")
+
+        pastas = [PASTA_UPLOADS_DIRETOS]
+        if isinstance(storages["default"], ArmazenamentoDeduplicado):
+            pastas.insert(0, storages["default"].prefixo)
+        storage = storage_real()
+
+        limite = timezone.now() - timedelta(hours=opts["horas"])
+        referencias = referencias_por_arquivo()
+
+        total = orfaos = recentes = 0
+        liberados = 0
+        for nome in (n for pasta in pastas for n in _arquivos(storage, pasta)):
+            total += 1
+            if referencias[nome]:
+                continue
+            if storage.get_modified_time(nome) > limite:
+                recentes += 1
+                continue
+            if not opts["simular"] and contar_referencias(nome):
+                # As referências foram lidas no início: confere de novo logo
+                # antes de apagar (registro salvo durante a varredura)
+                continue
+            orfaos += 1
+            liberados += storage.size(nome)
+            if opts["simular"]:
+                self.stdout.write(f"órfão: {nome}")
+            else:
+                storage.delete(nome)
+
+        verbo = "órfão(s)" if opts["simular"] else "apagado(s)"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{total} arquivo(s) em {', '.join(pastas)}: {orfaos} {verbo} "
+                f"({liberados / 1024 / 1024:.1f} MB), {recentes} órfão(s) recente(s) mantido(s)."
+            )
+        )
@@ -0,0 +1,74 @@
+import gzip
+
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+
+from core.staticfiles import montar_bundle
+
+
+# CSS/JS de cada tela: antes (arquivos separados, sem compressão) e depois
+# (bundles de STATIC_BUNDLES, minificados e com Brotli/gzip)
+PAGINAS = {
+    "login / registrar empresa": ["css/login.min.css", "js/main.min.js"],
+    "kanban / histórico / relatórios": ["css/base.min.css"],
+    "proposta (formulário)": ["css/base.min.css", "js/propostas.min.js"],
+    "contato (formulário)": ["css/base.min.css", "js/contato.min.js"],
+    "serviço (formulário)": ["css/base.min.css", "js/servico.min.js"],
+    "usuário (formulário)": ["css/base.min.css", "js/usuarios.min.js"],
+    "definições da empresa": ["css/base.min.css", "js/funcoes_gerais.min.js"],
+}
+
+
+def _ler(caminho):
+    encontrado = finders.find(caminho)
+    if not encontrado:
+        raise CommandError(f"Arquivo estático não encontrado: {caminho}")
+    with open(encontrado, encoding="utf-8") as arquivo:
+        return arquivo.read()
+
+
+class Command(BaseCommand):
+    help = (
+        "Bytes de CSS/JS transferidos por tela antes (arquivos separados, sem "
+        "compressão) e depois dos bundles do collectstatic (minificados, com "
+        "Brotli e gzip). Calculado a partir dos arquivos de origem; não "
+        "precisa do collectstatic."
+    )
+
+    def handle(self, *args, **opts):
+        bundles = {}
+        for nome in settings.STATIC_BUNDLES:
+            conteudo = montar_bundle(nome, _ler).encode("utf-8")
+            bundles[nome] = {
+                "arquivos": len(settings.STATIC_BUNDLES[nome]),
+                "original": sum(len(_ler(c).encode("utf-8")) for c in settings.STATIC_BUNDLES[nome]),
+                "minificado": len(conteudo),
+                "gzip": len(gzip.compress(conteudo, compresslevel=9)),
+                "brotli": len(brotli.compress(conteudo)),
+            }
+
+        self.stdout.write(
+            f"{'bundle':<26} {'arqs':>4} {'original':>9} {'minif.':>9} {'gzip':>8} {'brotli':>8}"
+        )
+        for nome, b in bundles.items():
+            self.stdout.write(
+                f"{nome:<26} {b['arquivos']:>4} {b['original']:>9} {b['minificado']:>9} "
+                f"{b['gzip']:>8} {b['brotli']:>8}"
+            )
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'tela':<34} {'req antes':>9} {'bytes antes':>11} {'req depois':>10} "
+            f"{'brotli':>8} {'gzip':>8} {'redução':>8}"
+        )
+        for pagina, nomes in PAGINAS.items():
+            antes = sum(bundles[n]["original"] for n in nomes)
+            req_antes = sum(bundles[n]["arquivos"] for n in nomes)
+            depois_br = sum(bundles[n]["brotli"] for n in nomes)
+            depois_gz = sum(bundles[n]["gzip"] for n in nomes)
+            self.stdout.write(
+                f"{pagina:<34} {req_antes:>9} {antes:>11} {len(nomes):>10} "
+                f"{depois_br:>8} {depois_gz:>8} {(1 - depois_br / antes) * 100:>7.1f}%"
+            )
@@ -0,0 +1,167 @@
+import hashlib
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, models
+
+
+# =========================================================
+# TENANT ATIVO (por thread / tarefa async)
+# =========================================================
+
+# Guarda o Tenant da requisição (ou um empresa_id em comandos/scripts).
+# Definido pelo TenantMiddleware.
+_tenant_atual = ContextVar("tenant_atual", default=None)
+
+TENANT_QUERY_CACHE_TIMEOUT = 60
+
+# Empresas com invalidação pendente dentro de adiar_invalidacao_tenant()
+_invalidacoes_adiadas = ContextVar("invalidacoes_adiadas", default=None)
+
+
+class TenantNotSetError(RuntimeError):
+    """
+    Consulta escopada feita fora de uma requisição/contexto com tenant ativo.
+    """
+
+
+def set_current_tenant(tenant):
+    return _tenant_atual.set(tenant)
+
+
+def reset_current_tenant(token):
+    _tenant_atual.reset(token)
+
+
+@contextmanager
+def tenant_context(empresa):
+    """
+    Ativa um tenant fora do ciclo de requisição (comandos, shell, jobs):
+
+        with tenant_context(empresa):
+            Proposta.tenant_objects.filter(status="rascunho")
+    """
+    token = set_current_tenant(empresa)
+    try:
+        yield
+    finally:
+        reset_current_tenant(token)
+
+
+def get_current_empresa_id():
+    """
+    empresa_id do tenant ativo. Levanta TenantNotSetError se nenhum tenant
+    foi ativado; retorna None quando o tenant ativo não tem empresa.
+    """
+    tenant = _tenant_atual.get()
+    if tenant is None:
+        raise TenantNotSetError("Nenhum tenant ativo para a consulta escopada.")
+    if isinstance(tenant, int):
+        return tenant
+    if hasattr(tenant, "empresa_id"):
+        # Tenant da requisição
+        return tenant.empresa_id
+    # Instância de Empresa
+    return tenant.pk
+
+
+# =========================================================
+# CACHE DE CONSULTAS POR TENANT
+# =========================================================
+
+def _tenant_cache_versao_key(empresa_id):
+    return f"core:tenant_qcache_versao:{empresa_id}"
+
+
+def invalidate_tenant_query_cache(empresa_id):
+    """
+    Descarta todas as consultas cacheadas da empresa (troca a versão).
+    Chamado pelos sinais de save/delete dos models escopados.
+    """
+    pendentes = _invalidacoes_adiadas.get()
+    if pendentes is not None:
+        pendentes.add(empresa_id)
+        return
+    cache.set(_tenant_cache_versao_key(empresa_id), uuid.uuid4().hex, None)
+
+
+@contextmanager
+def adiar_invalidacao_tenant():
+    """
+    Junta as invalidações feitas dentro do bloco em uma por empresa, no fim.
+    Útil em exclusões em massa, que disparam os sinais objeto a objeto.
+    """
+    pendentes = set()
+    token = _invalidacoes_adiadas.set(pendentes)
+    try:
+        yield
+    finally:
+        _invalidacoes_adiadas.reset(token)
+        cache.set_many(
+            {_tenant_cache_versao_key(empresa_id): uuid.uuid4().hex for empresa_id in pendentes},
+            None,
+        )
+
+
+# =========================================================
+# QUERYSET / MANAGER ESCOPADOS
+# =========================================================
+
+class TenantQuerySet(models.QuerySet):
+    """
+    QuerySet de um model com `tenant_field` (ex.: "company" ou "empresa").
+    """
+
+    def for_empresa(self, empresa):
+        return self.filter(**{self.model.tenant_field: empresa})
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._tenant_empresa_id = getattr(self, "_tenant_empresa_id", None)
+        return clone
+
+    def cached(self, timeout=TENANT_QUERY_CACHE_TIMEOUT):
+        """
+        Avalia a consulta e guarda o resultado no cache da empresa.
+        O cache é invalidado a cada save/delete de qualquer model escopado
+        da mesma empresa (update()/delete() em massa não disparam sinais).
+        """
+        empresa_id = getattr(self, "_tenant_empresa_id", None)
+        if empresa_id is None:
+            return list(self)
+
+        versao = cache.get(_tenant_cache_versao_key(empresa_id)) or ""
+        sql, params = self.query.sql_with_params()
+        digest = hashlib.md5(f"{sql}|{params!r}".encode()).hexdigest()
+        key = f"core:tenant_qcache:{empresa_id}:{versao}:{self.model._meta.label_lower}:{digest}"
+
+        resultado = cache.get(key)
+        if resultado is None:
+            # Sempre do primário: a versão acima é a do primário, e um
+            # resultado atrasado da réplica ficaria no cache até a próxima
+            # alteração da empresa
+            resultado = list(self.using(DEFAULT_DB_ALIAS))
+            cache.set(key, resultado, timeout)
+        return resultado
+
+
+class TenantManager(models.Manager.from_queryset(TenantQuerySet)):
+    """
+    Manager que filtra automaticamente pelo tenant ativo.
+
+    Usado como `Model.tenant_objects`; `Model.objects` continua sem escopo
+    (admin, links públicos por token, comandos de manutenção). É uma
+    conveniência para as views, não uma barreira: consulta feita por
+    `objects` não passa por aqui e precisa filtrar a empresa por conta própria.
+    """
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        empresa_id = get_current_empresa_id()
+        if empresa_id is None:
+            return qs.none()
+        qs = qs.filter(**{f"{self.model.tenant_field}_id": empresa_id})
+        qs._tenant_empresa_id = empresa_id
+        return qs
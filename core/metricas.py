@@ -0,0 +1,253 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.template.backends.django import DjangoTemplates
+
+
+# =========================================================
+# MEDIÇÃO DA REQUISIÇÃO
+# =========================================================
+
+# Medição da requisição em andamento (definida pelo MetricasMiddleware)
+_medicao_atual = ContextVar("medicao_atual", default=None)
+
+# Quantas das consultas mais lentas guardar para o log
+CONSULTAS_MAIS_LENTAS = 5
+
+
+class Medicao:
+    """
+    Números de uma requisição: consultas e tempo no banco (todas as
+    conexões), tempo de template (sem o banco consultado durante a
+    renderização, ex.: querysets preguiçosos) e as consultas mais lentas.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.mais_lentas = []
+        self._renderizando = 0
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+    def executar_consulta(self, execute, sql, params, many, context):
+        """
+        Wrapper de connection.execute_wrapper().
+        """
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracao = (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+            self.db_ms += duracao
+            alias = context["connection"].alias
+            if len(self.mais_lentas) < CONSULTAS_MAIS_LENTAS:
+                self.mais_lentas.append((duracao, alias, sql))
+                self.mais_lentas.sort(reverse=True)
+            elif duracao > self.mais_lentas[-1][0]:
+                self.mais_lentas[-1] = (duracao, alias, sql)
+                self.mais_lentas.sort(reverse=True)
+
+    def server_timing(self, total_ms):
+        return ", ".join(
+            [
+                f'db;dur={self.db_ms:.1f};desc="{self.consultas} consultas"',
+                f"tpl;dur={self.template_ms:.1f}",
+                f"total;dur={total_ms:.1f}",
+            ]
+        )
+
+
+def medicao_atual():
+    return _medicao_atual.get()
+
+
+def iniciar_medicao():
+    medicao = Medicao()
+    return medicao, _medicao_atual.set(medicao)
+
+
+def encerrar_medicao(token):
+    _medicao_atual.reset(token)
+
+
+# =========================================================
+# TEMPO DE TEMPLATE
+# =========================================================
+
+class _TemplateMedido:
+    """
+    Embrulha o Template do backend e soma o tempo de render() na medição
+    da requisição (renders aninhados contam uma vez só).
+    """
+
+    def __init__(self, template):
+        self._template = template
+
+    def __getattr__(self, nome):
+        return getattr(self._template, nome)
+
+    def render(self, context=None, request=None):
+        medicao = _medicao_atual.get()
+        if medicao is None or medicao._renderizando:
+            return self._template.render(context, request)
+
+        medicao._renderizando += 1
+        inicio = time.perf_counter()
+        db_antes = medicao.db_ms
+        try:
+            return self._template.render(context, request)
+        finally:
+            medicao._renderizando -= 1
+            decorrido = (time.perf_counter() - inicio) * 1000
+            medicao.template_ms += decorrido - (medicao.db_ms - db_antes)
+
+
+class TemplatesInstrumentados(DjangoTemplates):
+    """
+    Backend de templates do Django que mede o tempo de renderização.
+    Usado no lugar do DjangoTemplates quando METRICAS_ATIVAS.
+    """
+
+    def from_string(self, template_code):
+        return _TemplateMedido(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TemplateMedido(super().get_template(template_name))
+
+
+# =========================================================
+# HISTOGRAMAS POR VIEW (formato Prometheus)
+# =========================================================
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class _Histograma:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.contagens = [0] * (len(buckets) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect.bisect_left(self.buckets, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+def _rotulos(**rotulos):
+    pares = []
+    for nome, valor in rotulos.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pares.append(f'{nome}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+class FamiliaHistograma:
+    """
+    Uma métrica do tipo histograma, com um histograma por combinação de
+    rótulos (ex.: view; empresa + páginas).
+    """
+
+    def __init__(self, nome, ajuda, buckets, rotulos):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = buckets
+        self.rotulos = rotulos
+        self._series = {}
+
+    def observar(self, valor, **rotulos):
+        chave = tuple(str(rotulos[nome]) for nome in self.rotulos)
+        serie = self._series.get(chave)
+        if serie is None:
+            serie = self._series[chave] = _Histograma(self.buckets)
+        serie.observar(valor)
+
+    def linhas(self):
+        yield f"# HELP {self.nome} {self.ajuda}"
+        yield f"# TYPE {self.nome} histogram"
+        for chave, serie in sorted(self._series.items()):
+            rotulos = dict(zip(self.rotulos, chave))
+            acumulado = 0
+            for limite, qtd in zip(self.buckets + ("+Inf",), serie.contagens):
+                acumulado += qtd
+                yield f"{self.nome}_bucket{_rotulos(**rotulos, le=limite)} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(**rotulos)} {serie.soma:.6f}"
+            yield f"{self.nome}_count{_rotulos(**rotulos)} {serie.total}"
+
+
+class RegistroMetricas:
+    """
+    Métricas deste processo: cada worker tem as suas (como as estatísticas
+    do pool em core.db). Outros módulos registram as próprias famílias com
+    histograma() (ex.: propostas.pdf).
+    """
+
+    PREFIXO = "gestiospro_"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._familias = []
+        self._respostas = defaultdict(int)
+
+        self._duracao = self.histograma(
+            "http_request_duration_seconds", "Tempo total da requisição.", BUCKETS_SEGUNDOS, ("view",)
+        )
+        self._db = self.histograma(
+            "http_request_db_seconds", "Tempo em consultas SQL por requisição.", BUCKETS_SEGUNDOS, ("view",)
+        )
+        self._template = self.histograma(
+            "http_request_template_seconds",
+            "Tempo de renderização de templates por requisição.",
+            BUCKETS_SEGUNDOS,
+            ("view",),
+        )
+        self._consultas = self.histograma(
+            "http_request_db_queries", "Consultas SQL por requisição.", BUCKETS_CONSULTAS, ("view",)
+        )
+
+    def histograma(self, nome, ajuda, buckets, rotulos):
+        familia = FamiliaHistograma(self.PREFIXO + nome, ajuda, buckets, rotulos)
+        self._familias.append(familia)
+        return familia
+
+    def observar_histograma(self, familia, valor, **rotulos):
+        with self._lock:
+            familia.observar(valor, **rotulos)
+
+    def observar(self, view, status, medicao, total_ms):
+        with self._lock:
+            self._duracao.observar(total_ms / 1000, view=view)
+            self._db.observar(medicao.db_ms / 1000, view=view)
+            self._template.observar(medicao.template_ms / 1000, view=view)
+            self._consultas.observar(medicao.consultas, view=view)
+            self._respostas[(view, status)] += 1
+
+    def exportar(self):
+        """
+        Texto no formato de exposição do Prometheus (version=0.0.4).
+        """
+        linhas = []
+        with self._lock:
+            for familia in self._familias:
+                linhas.extend(familia.linhas())
+
+            metrica = self.PREFIXO + "http_responses_total"
+            linhas.append(f"# HELP {metrica} Respostas por view e código HTTP.")
+            linhas.append(f"# TYPE {metrica} counter")
+            for (view, status), qtd in sorted(self._respostas.items()):
+                linhas.append(f"{metrica}{_rotulos(view=view, status=status)} {qtd}")
+        return "\n".join(linhas) + "\n"
+
+
+registro = RegistroMetricas()
@@ -0,0 +1,166 @@
+import logging
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from .db import (
+    leitura_fixada_no_primario,
+    marcar_primario,
+    replica_configurada,
+    reset_usar_replica,
+    set_usar_replica,
+)
+from .managers import reset_current_tenant, set_current_tenant
+from .metricas import encerrar_medicao, iniciar_medicao, registro
+from .tenant import get_tenant
+
+
+logger = logging.getLogger(__name__)
+
+
+class _TenantDaRequisicao:
+    """
+    Valor guardado na ContextVar do tenant durante a requisição.
+
+    Não é o próprio SimpleLazyObject: sob ASGI o asgiref inspeciona os
+    valores das ContextVars a cada troca entre thread e event loop, o que
+    resolveria o tenant (consulta ao banco) dentro do event loop.
+    """
+
+    __slots__ = ("request",)
+
+    def __init__(self, request):
+        self.request = request
+
+    @property
+    def empresa_id(self):
+        return self.request.tenant.empresa_id
+
+
+class TenantMiddleware:
+    """
+    Expõe request.tenant (empresa ativa + permissões efetivas do usuário).
+
+    Resolvido sob demanda, uma vez por requisição; deve vir depois do
+    AuthenticationMiddleware. Também ativa o tenant para os managers
+    `tenant_objects` (core.managers) durante a requisição.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = SimpleLazyObject(lambda: get_tenant(request))
+        token = set_current_tenant(_TenantDaRequisicao(request))
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_tenant(token)
+
+
+class ReplicaMiddleware:
+    """
+    Direciona as leituras das views marcadas com @usa_replica (ou
+    `usa_replica = True` em CBVs) para a réplica, inclusive durante a
+    renderização do template.
+
+    Toda requisição de escrita de um usuário logado grava um cookie que
+    mantém as leituras daquele navegador no primário por
+    REPLICA_STICKY_SECONDS. POSTs anônimos (rastreamento e resposta na
+    página pública) não levam o cookie: a confirmação da resposta sai da
+    própria requisição e o UPDATE condicional recusa um reenvio feito a
+    partir de uma página desatualizada.
+    """
+
+    METODOS_SEGUROS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            token = getattr(request, "_replica_token", None)
+            if token is not None:
+                reset_usar_replica(token)
+
+        user = getattr(request, "user", None)
+        if (
+            replica_configurada()
+            and request.method not in self.METODOS_SEGUROS
+            and response.status_code < 500
+            and user is not None
+            and user.is_authenticated
+        ):
+            marcar_primario(response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not replica_configurada():
+            return None
+        view_class = getattr(view_func, "view_class", None)
+        marcada = getattr(view_func, "usa_replica", False) or getattr(
+            view_class, "usa_replica", False
+        )
+        if marcada and not leitura_fixada_no_primario(request):
+            request._replica_token = set_usar_replica(True)
+        return None
+
+
+class MetricasMiddleware:
+    """
+    Instrumentação opcional (METRICAS_ATIVAS): consultas e tempo no banco,
+    tempo de template e tempo total de cada requisição.
+
+    Devolve os números no cabeçalho Server-Timing, registra no log as
+    requisições acima de METRICAS_LIMITE_MS / METRICAS_LIMITE_CONSULTAS
+    (com as consultas mais lentas) e alimenta os histogramas por view de
+    core.metricas, expostos em core:metricas_prometheus.
+    """
+
+    SEM_ROTA = "<sem_rota>"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicao, token = iniciar_medicao()
+        try:
+            with ExitStack() as stack:
+                for conexao in connections.all():
+                    stack.enter_context(conexao.execute_wrapper(medicao.executar_consulta))
+                response = self.get_response(request)
+        finally:
+            encerrar_medicao(token)
+
+        total_ms = medicao.total_ms
+        match = request.resolver_match
+        view = match.view_name if match else self.SEM_ROTA
+
+        response["Server-Timing"] = medicao.server_timing(total_ms)
+        registro.observar(view, response.status_code, medicao, total_ms)
+
+        if (
+            total_ms >= settings.METRICAS_LIMITE_MS
+            or medicao.consultas >= settings.METRICAS_LIMITE_CONSULTAS
+        ):
+            lentas = "\n".join(
+                f"  {duracao:.1f}ms [{alias}] {sql[:500]}"
+                for duracao, alias, sql in medicao.mais_lentas
+            )
+            logger.warning(
+                "Requisição lenta: %s %s (%s) %.1fms total, %d consultas em %.1fms, "
+                "template %.1fms\n%s",
+                request.method,
+                request.path,
+                view,
+                total_ms,
+                medicao.consultas,
+                medicao.db_ms,
+                medicao.template_ms,
+                lentas,
+            )
+        return response
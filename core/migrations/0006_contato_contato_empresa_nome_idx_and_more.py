@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_remove_propostaconfiguracao_padrao_numero_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contato',
+            index=models.Index(fields=['empresa', 'nome_fantasia'], name='contato_empresa_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='servico',
+            index=models.Index(fields=['empresa', 'ativo', 'descricao'], name='servico_empresa_ativo_idx'),
+        ),
+    ]
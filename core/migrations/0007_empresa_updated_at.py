@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_contato_contato_empresa_nome_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_empresa_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propostaconfiguracao',
+            name='expirar_apos_dias',
+            field=models.PositiveIntegerField(default=0, help_text='Quantos dias depois da validade a proposta ainda fica no quadro.', verbose_name='Dias de tolerância após a validade'),
+        ),
+        migrations.AddField(
+            model_name='propostaconfiguracao',
+            name='expirar_rascunhos',
+            field=models.BooleanField(default=False, verbose_name='Arquivar também rascunhos vencidos'),
+        ),
+        migrations.AddField(
+            model_name='propostaconfiguracao',
+            name='expirar_vencidas',
+            field=models.BooleanField(default=False, help_text='Propostas em andamento com a validade vencida vão para o histórico (arquivadas).', verbose_name='Arquivar propostas vencidas automaticamente'),
+        ),
+    ]
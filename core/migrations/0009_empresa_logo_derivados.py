@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_propostaconfiguracao_expiracao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='empresa',
+            name='logo_derivados',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Derivados da logo'),
+        ),
+    ]
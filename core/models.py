@@ -1,7 +1,9 @@
 from decimal import Decimal
 from django.db import models
 from django.utils import timezone
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
+
+from .managers import TenantManager
 
 UF_CHOICES = [
     ("AC", "AC"), ("AL", "AL"), ("AP", "AP"), ("AM", "AM"), ("BA", "BA"),
@@ -32,6 +34,8 @@ class Empresa(models.Model):
     observacao = models.TextField("Observações", blank=True, null=True)
 
     logo = models.ImageField("Logo", upload_to="logos/", blank=True, null=True)
+    # Versões redimensionadas da logo (core.logos): {"origem": logo.name, "sidebar": ..., ...}
+    logo_derivados = models.JSONField("Derivados da logo", default=dict, blank=True, editable=False)
     tema = models.CharField("Tema", max_length=50, blank=True, null=True)
 
     # Textos padrão das propostas
@@ -46,6 +50,10 @@ class Empresa(models.Model):
     ativo = models.BooleanField("Ativo", default=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Campos JSON com nomes de arquivos do storage (core.armazenamento)
+    campos_arquivos_json = ("logo_derivados",)
 
     class Meta:
         verbose_name = "Empresa"
@@ -90,6 +98,11 @@ class User(AbstractUser):
     can_manage_propostas = models.BooleanField("Pode gerenciar propostas", default=False)
     can_manage_usuarios = models.BooleanField("Pode gerenciar usuários", default=False)
 
+    tenant_field = "empresa"
+
+    objects = UserManager()
+    tenant_objects = TenantManager()
+
     def is_owner(self) -> bool:
         return self.user_type == "owner"
 
@@ -138,10 +151,18 @@ class Contato(models.Model):
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    tenant_field = "empresa"
+
+    objects = models.Manager()
+    tenant_objects = TenantManager()
+
     class Meta:
         verbose_name = "Contato"
         verbose_name_plural = "Contatos"
         ordering = ["nome_fantasia"]
+        indexes = [
+            models.Index(fields=["empresa", "nome_fantasia"], name="contato_empresa_nome_idx"),
+        ]
 
     def __str__(self):
         return self.nome_fantasia
@@ -172,6 +193,11 @@ class CategoriaServico(models.Model):
     )
     nome = models.CharField("Nome da categoria", max_length=100)
 
+    tenant_field = "empresa"
+
+    objects = models.Manager()
+    tenant_objects = TenantManager()
+
     class Meta:
         verbose_name = "Categoria de serviço"
         verbose_name_plural = "Categorias de serviço"
@@ -216,10 +242,18 @@ class Servico(models.Model):
 
     created_at = models.DateTimeField(default=timezone.now)
 
+    tenant_field = "empresa"
+
+    objects = models.Manager()
+    tenant_objects = TenantManager()
+
     class Meta:
         verbose_name = "Serviço"
         verbose_name_plural = "Serviços"
         ordering = ["descricao"]
+        indexes = [
+            models.Index(fields=["empresa", "ativo", "descricao"], name="servico_empresa_ativo_idx"),
+        ]
 
     def __str__(self):
         return self.descricao
@@ -297,6 +331,22 @@ class PropostaConfiguracao(models.Model):
         help_text="Margem direita do texto no PDF (mm).",
     )
 
+    # Expiração automática (comando expirar_propostas)
+    expirar_vencidas = models.BooleanField(
+        "Arquivar propostas vencidas automaticamente",
+        default=False,
+        help_text="Propostas em andamento com a validade vencida vão para o histórico (arquivadas).",
+    )
+    expirar_apos_dias = models.PositiveIntegerField(
+        "Dias de tolerância após a validade",
+        default=0,
+        help_text="Quantos dias depois da validade a proposta ainda fica no quadro.",
+    )
+    expirar_rascunhos = models.BooleanField(
+        "Arquivar também rascunhos vencidos",
+        default=False,
+    )
+
     class Meta:
         verbose_name = "Definições de propostas"
         verbose_name_plural = "Definições de propostas"
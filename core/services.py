@@ -0,0 +1,173 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import Empresa, PropostaConfiguracao
+
+
+# =========================================================
+# PADRÕES DE PROPOSTA DA EMPRESA (cacheado por empresa)
+# =========================================================
+
+# O cache padrão (LocMem) é por processo: a invalidação pelos sinais só
+# chega ao worker que salvou. Nos outros, o padrão antigo dura no máximo
+# isto (o mesmo prazo de core.tenant.TENANT_SESSION_TTL).
+PROPOSTA_DEFAULTS_CACHE_TIMEOUT = 5 * 60
+
+
+# Margens do @page no CSS base do PDF (propostas.views._renderizar_pdf)
+MARGENS_PDF_PADRAO = {
+    "margem_superior": Decimal("20.0"),
+    "margem_inferior": Decimal("20.0"),
+    "margem_esquerda": Decimal("15.0"),
+    "margem_direita": Decimal("15.0"),
+}
+
+
+def _proposta_defaults_cache_key(empresa_id):
+    return f"core:proposta_defaults:{empresa_id}"
+
+
+@dataclass(frozen=True)
+class PropostaDefaults:
+    """
+    Padrões de proposta já resolvidos para uma empresa:
+    PropostaConfiguracao tem prioridade e, campo a campo, cai nos
+    Empresa.*_padrao quando o texto da configuração estiver vazio.
+    """
+
+    empresa_id: int
+    tem_configuracao: bool = False
+    # Muda a cada save da PropostaConfiguracao (entra em chaves de cache de PDF)
+    versao: str = ""
+
+    exclusoes: str = ""
+    declaracoes: str = ""
+    termo_confidencialidade: str = ""
+    prazo_inicio: str = ""
+    prazo_entrega: str = ""
+    agradecimentos: str = ""
+
+    numero_auto_iniciar: int = 1
+    numero_config: list = field(default_factory=list)
+
+    margem_superior: Decimal = MARGENS_PDF_PADRAO["margem_superior"]
+    margem_inferior: Decimal = MARGENS_PDF_PADRAO["margem_inferior"]
+    margem_esquerda: Decimal = MARGENS_PDF_PADRAO["margem_esquerda"]
+    margem_direita: Decimal = MARGENS_PDF_PADRAO["margem_direita"]
+
+    papel_timbrado: str = ""
+
+    def textos_iniciais(self):
+        """
+        Valores iniciais dos textos de finalização no formulário de proposta.
+        """
+        return {
+            "exclusos_texto": self.exclusoes,
+            "declaracoes_texto": self.declaracoes,
+            "confidencialidade_texto": self.termo_confidencialidade,
+            "prazo_inicio_texto": self.prazo_inicio,
+            "prazo_entrega_texto": self.prazo_entrega,
+            "assinatura_texto": self.agradecimentos,
+        }
+
+    def margens_pdf(self):
+        """
+        Margens do @page no formato CSS (superior direita inferior esquerda).
+        """
+        lados = ("margem_superior", "margem_direita", "margem_inferior", "margem_esquerda")
+        # Lado sem valor fica com a margem do CSS base do PDF
+        return " ".join(
+            f"{MARGENS_PDF_PADRAO[lado] if getattr(self, lado) is None else getattr(self, lado)}mm"
+            for lado in lados
+        )
+
+
+def _resolver_proposta_defaults(empresa):
+    config = PropostaConfiguracao.objects.filter(empresa_id=empresa.pk).first()
+
+    # A empresa recebida pode ser a projeção enxuta do tenant: carrega os
+    # textos padrão de uma vez em vez de um campo adiado por vez.
+    empresa = Empresa.objects.only(
+        "exclusoes_padrao",
+        "declaracoes_padrao",
+        "termo_confidencialidade_padrao",
+        "prazo_inicio_padrao",
+        "prazo_entrega_padrao",
+        "agradecimentos_padrao",
+        "papel_timbrado",
+    ).get(pk=empresa.pk)
+
+    if not config:
+        return PropostaDefaults(
+            empresa_id=empresa.pk,
+            exclusoes=empresa.exclusoes_padrao or "",
+            declaracoes=empresa.declaracoes_padrao or "",
+            termo_confidencialidade=empresa.termo_confidencialidade_padrao or "",
+            prazo_inicio=empresa.prazo_inicio_padrao or "",
+            prazo_entrega=empresa.prazo_entrega_padrao or "",
+            agradecimentos=empresa.agradecimentos_padrao or "",
+            papel_timbrado=empresa.papel_timbrado.name if empresa.papel_timbrado else "",
+        )
+
+    papel_timbrado = config.papel_timbrado or empresa.papel_timbrado
+
+    return PropostaDefaults(
+        empresa_id=empresa.pk,
+        tem_configuracao=True,
+        versao=config.updated_at.isoformat(),
+        exclusoes=config.exclusoes or empresa.exclusoes_padrao or "",
+        declaracoes=config.declaracoes or empresa.declaracoes_padrao or "",
+        termo_confidencialidade=(
+            config.termo_confi or empresa.termo_confidencialidade_padrao or ""
+        ),
+        prazo_inicio=config.prazo_inicio or empresa.prazo_inicio_padrao or "",
+        prazo_entrega=config.prazo_entrega or empresa.prazo_entrega_padrao or "",
+        agradecimentos=config.agradecimentos or empresa.agradecimentos_padrao or "",
+        numero_auto_iniciar=config.numero_auto_iniciar or 1,
+        numero_config=config.numero_config or [],
+        margem_superior=config.margem_superior,
+        margem_inferior=config.margem_inferior,
+        margem_esquerda=config.margem_esquerda,
+        margem_direita=config.margem_direita,
+        papel_timbrado=papel_timbrado.name if papel_timbrado else "",
+    )
+
+
+def get_proposta_defaults(empresa):
+    """
+    Retorna os PropostaDefaults da empresa, calculados uma vez e mantidos
+    em cache até a Empresa ou a PropostaConfiguracao serem salvas
+    (ver core.signals) ou por PROPOSTA_DEFAULTS_CACHE_TIMEOUT.
+    """
+    key = _proposta_defaults_cache_key(empresa.pk)
+    defaults = cache.get(key)
+    if defaults is None:
+        defaults = _resolver_proposta_defaults(empresa)
+        cache.set(key, defaults, PROPOSTA_DEFAULTS_CACHE_TIMEOUT)
+    return defaults
+
+
+def invalidate_proposta_defaults(empresa_id):
+    cache.delete(_proposta_defaults_cache_key(empresa_id))
+
+
+# =========================================================
+# VALORES DO CATÁLOGO DE SERVIÇOS
+# =========================================================
+
+def valores_servicos(servicos):
+    """
+    {id: {valor, descricao, entregaveis}} a partir de Servico.values(
+    "id", "descricao", "valor", "entregaveis"). Formato usado pelo
+    formulário de proposta (json_script) e por core:servicos_valores_json.
+    """
+    return {
+        str(s["id"]): {
+            "valor": str(s["valor"] or 0),
+            "descricao": s["descricao"],
+            "entregaveis": s["entregaveis"] or "",
+        }
+        for s in servicos
+    }
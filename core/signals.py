@@ -0,0 +1,45 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .logos import atualizar_derivados_logo
+from .managers import invalidate_tenant_query_cache
+from .models import Empresa, PropostaConfiguracao
+from .services import invalidate_proposta_defaults
+from .tenant import invalidate_tenant
+
+
+@receiver(post_save, sender=Empresa)
+def empresa_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Logo nova (ou removida): gera os derivados antes de invalidar o tenant
+    if not raw and (update_fields is None or "logo" in update_fields):
+        atualizar_derivados_logo(instance)
+    invalidate_proposta_defaults(instance.pk)
+    invalidate_tenant(empresa_id=instance.pk)
+
+
+@receiver(post_save, sender=PropostaConfiguracao)
+@receiver(post_delete, sender=PropostaConfiguracao)
+def proposta_configuracao_changed(sender, instance, **kwargs):
+    invalidate_proposta_defaults(instance.empresa_id)
+
+
+# Saves que não mudam nada exibido nas consultas cacheadas (login)
+CAMPOS_SEM_INVALIDACAO = {"last_login"}
+
+
+def tenant_model_changed(sender, instance, update_fields=None, **kwargs):
+    # Alteração em model escopado invalida o cache de consultas da empresa
+    if update_fields and set(update_fields) <= CAMPOS_SEM_INVALIDACAO:
+        return
+    # __dict__: não recarrega campo adiado (instância pode já ter sido excluída)
+    empresa_id = instance.__dict__.get(f"{sender.tenant_field}_id")
+    if empresa_id:
+        invalidate_tenant_query_cache(empresa_id)
+
+
+# Só os models com tenant_field (ex.: Proposta, Contato, User), e não todo save
+for _model in apps.get_models():
+    if getattr(_model, "tenant_field", None):
+        post_save.connect(tenant_model_changed, sender=_model, dispatch_uid=f"tenant_model_changed:{_model._meta.label}")
+        post_delete.connect(tenant_model_changed, sender=_model, dispatch_uid=f"tenant_model_changed:{_model._meta.label}")
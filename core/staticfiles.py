@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from rcssmin import cssmin
+from rjsmin import jsmin
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+# =========================================================
+# MINIFICAÇÃO (rcssmin / rjsmin)
+# =========================================================
+# Tokenizadores completos (strings, regex, template literals, comentários):
+# nada de heurística própria. Comentários /*! ... */ (licenças) ficam.
+
+def minificar(nome, texto):
+    if nome.endswith(".css"):
+        return cssmin(texto, keep_bang_comments=True)
+    if nome.endswith(".js"):
+        return jsmin(texto, keep_bang_comments=True)
+    return texto
+
+
+# =========================================================
+# BUNDLES (settings.STATIC_BUNDLES)
+# =========================================================
+
+def montar_bundle(nome, abrir):
+    """
+    Conteúdo do bundle `nome`: os arquivos de STATIC_BUNDLES[nome] na ordem,
+    cada um minificado. `abrir(caminho)` retorna o texto de um arquivo.
+    """
+    partes = [minificar(nome, abrir(caminho)) for caminho in settings.STATIC_BUNDLES[nome]]
+    return ("\n;\n" if nome.endswith(".js") else "\n").join(partes)
+
+
+class BundledStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    Storage do collectstatic: monta os bundles de STATIC_BUNDLES antes do
+    pós-processamento do WhiteNoise, que então gera o nome com hash (cache
+    imutável), reescreve os url() do CSS e grava as versões .br e .gz.
+
+    Cada bundle fica na mesma pasta dos seus arquivos, para os url()
+    relativos do CSS continuarem valendo.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            for nome in settings.STATIC_BUNDLES:
+
+                def abrir(caminho):
+                    storage, origem = paths[caminho]
+                    with storage.open(origem) as arquivo:
+                        return arquivo.read().decode("utf-8")
+
+                conteudo = montar_bundle(nome, abrir).encode("utf-8")
+                if self.exists(nome):
+                    self.delete(nome)
+                self._save(nome, ContentFile(conteudo))
+                paths[nome] = (self, nome)
+        yield from super().post_process(paths, dry_run, **options)
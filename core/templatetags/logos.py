@@ -0,0 +1,14 @@
+from django import template
+
+from core.logos import url_logo
+
+register = template.Library()
+
+
+@register.filter
+def logo_url(empresa, derivado):
+    """
+    URL da logo da empresa no tamanho do derivado ("sidebar", "publica",
+    "pdf"); a original enquanto o derivado não existir.
+    """
+    return url_logo(empresa, derivado)
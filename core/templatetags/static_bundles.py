@@ -0,0 +1,24 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+register = template.Library()
+
+
+def _tag(caminho):
+    if caminho.endswith(".css"):
+        return format_html('<link rel="stylesheet" href="{}">', static(caminho))
+    return format_html('<script src="{}"></script>', static(caminho))
+
+
+@register.simple_tag
+def static_bundle(nome):
+    """
+    <link>/<script> do bundle de STATIC_BUNDLES (montado no collectstatic)
+    ou, com STATIC_BUNDLES_ATIVOS desligado (desenvolvimento), um por
+    arquivo do bundle.
+    """
+    if settings.STATIC_BUNDLES_ATIVOS:
+        return _tag(nome)
+    return format_html_join("\n", "{}", ((_tag(caminho),) for caminho in settings.STATIC_BUNDLES[nome]))
@@ -0,0 +1,120 @@
+import time
+import uuid
+
+from django.core.cache import cache
+
+from .models import Empresa
+
+
+# =========================================================
+# CONTEXTO DO TENANT (empresa + permissões do usuário)
+# =========================================================
+
+TENANT_SESSION_KEY = "_tenant"
+
+# Tempo máximo que a projeção da empresa fica na sessão sem ser recarregada do banco.
+# Limita a defasagem quando o cache não é compartilhado entre workers.
+TENANT_SESSION_TTL = 5 * 60
+
+# Projeção enxuta da empresa: nada dos textos padrão de proposta
+EMPRESA_CAMPOS_TENANT = ("id", "nome_fantasia", "razao_social", "logo", "logo_derivados", "ativo")
+
+PERMISSOES_TENANT = (
+    "can_manage_contatos",
+    "can_manage_servicos",
+    "can_manage_definicoes",
+    "can_manage_propostas_definicoes",
+    "can_manage_propostas",
+    "can_manage_usuarios",
+)
+
+
+def _tenant_versao_key(empresa_id):
+    return f"core:tenant_versao:empresa:{empresa_id}"
+
+
+class Tenant:
+    """
+    Empresa ativa da requisição e permissões efetivas do usuário.
+
+    As permissões vêm do próprio request.user (carregado do banco a cada
+    requisição pelo AuthenticationMiddleware), então uma permissão revogada
+    vale já na próxima requisição, em qualquer worker. O proprietário
+    (owner) tem acesso total.
+
+    `empresa` é uma instância de Empresa carregada só com os campos de
+    EMPRESA_CAMPOS_TENANT (os demais ficam adiados, como em .only()).
+    """
+
+    def __init__(self, user=None, empresa=None):
+        self.user_id = user.pk if user is not None else None
+        self.empresa_id = user.empresa_id if user is not None else None
+        self.is_owner = user is not None and user.user_type == "owner"
+
+        for perm in PERMISSOES_TENANT:
+            setattr(
+                self,
+                perm,
+                bool(self.empresa_id) and (self.is_owner or bool(getattr(user, perm, False))),
+            )
+
+        self.empresa = None
+        if self.empresa_id and empresa:
+            self.empresa = Empresa.from_db(
+                "default",
+                EMPRESA_CAMPOS_TENANT,
+                # .get(): contexto salvo na sessão antes de um campo novo entrar na projeção
+                [empresa.get(campo) for campo in EMPRESA_CAMPOS_TENANT],
+            )
+
+    def __bool__(self):
+        return self.empresa is not None
+
+    def __repr__(self):
+        return f"<Tenant user={self.user_id} empresa={self.empresa_id}>"
+
+
+def _carregar_empresa(empresa_id):
+    return Empresa.objects.filter(pk=empresa_id).values(*EMPRESA_CAMPOS_TENANT).first()
+
+
+def get_tenant(request):
+    """
+    Resolve o Tenant do usuário autenticado. Só a projeção da empresa fica
+    na sessão, reaproveitada enquanto a versão da empresa no cache não mudar
+    (e por no máximo TENANT_SESSION_TTL). Usuários anônimos recebem um Tenant
+    vazio (sem empresa e sem permissões).
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return Tenant()
+    if not user.empresa_id:
+        return Tenant(user)
+
+    session = request.session
+    versao = cache.get(_tenant_versao_key(user.empresa_id))
+    cached = session.get(TENANT_SESSION_KEY)
+    if (
+        cached
+        and cached.get("empresa_id") == user.empresa_id
+        and cached.get("versao") == versao
+        and time.time() - cached.get("carregado_em", 0) < TENANT_SESSION_TTL
+    ):
+        return Tenant(user, cached["empresa"])
+
+    empresa = _carregar_empresa(user.empresa_id)
+    session[TENANT_SESSION_KEY] = {
+        "empresa_id": user.empresa_id,
+        "empresa": empresa,
+        "versao": versao,
+        "carregado_em": time.time(),
+    }
+    return Tenant(user, empresa)
+
+
+def invalidate_tenant(empresa_id):
+    """
+    Marca como obsoleta a projeção da empresa guardada nas sessões.
+    Chamado pelo sinal de Empresa (ver core.signals).
+    """
+    cache.set(_tenant_versao_key(empresa_id), uuid.uuid4().hex, None)
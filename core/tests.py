@@ -1,3 +1,655 @@
-from django.test import TestCase
+import os
+import re
+import runpy
+import shutil
+import subprocess
+import tempfile
+import time
+import warnings
+from collections import Counter
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, storages
+from django.core.management import call_command
+from django.db import connections, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from propostas.models import Proposta
+
+from .armazenamento import ArmazenamentoDeduplicado, contar_referencias
+from .db import REPLICA_STICKY_COOKIE, ReplicaRouter, reset_usar_replica, set_usar_replica, usa_replica
+from .logos import gerar_derivados_logo
+from .managers import _tenant_cache_versao_key, tenant_context
+from .metricas import BUCKETS_SEGUNDOS, RegistroMetricas
+from .middleware import ReplicaMiddleware
+from .models import Contato, Empresa, PropostaConfiguracao, Servico, User
+from .services import PROPOSTA_DEFAULTS_CACHE_TIMEOUT, PropostaDefaults, get_proposta_defaults
+from .staticfiles import minificar, montar_bundle
+from .tenant import TENANT_SESSION_KEY, TENANT_SESSION_TTL, get_tenant
+from .views import SERVICOS_VALORES_MAX_IDS
+
+
+# =========================================================
+# PADRÕES DE PROPOSTA
+# =========================================================
+
+class MargensPdfTests(SimpleTestCase):
+    def test_margens_padrao(self):
+        self.assertEqual(PropostaDefaults(empresa_id=1).margens_pdf(), "20.0mm 15.0mm 20.0mm 15.0mm")
+
+    def test_lado_sem_valor_usa_margem_do_css_base(self):
+        defaults = PropostaDefaults(
+            empresa_id=1,
+            margem_superior=None,
+            margem_direita=Decimal("7.5"),
+            margem_inferior=Decimal("25.0"),
+            margem_esquerda=None,
+        )
+        self.assertEqual(defaults.margens_pdf(), "20.0mm 7.5mm 25.0mm 15.0mm")
+        self.assertNotIn("None", defaults.margens_pdf())
+
+
+class PropostaDefaultsCacheTests(TestCase):
+    def test_alteracao_feita_em_outro_processo_vale_depois_do_timeout(self):
+        cache.clear()
+        empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        PropostaConfiguracao.objects.create(empresa=empresa, numero_auto_iniciar=1)
+        self.assertEqual(get_proposta_defaults(empresa).numero_auto_iniciar, 1)
+
+        # update(): sem sinais, como um save atendido por outro worker
+        PropostaConfiguracao.objects.filter(empresa=empresa).update(numero_auto_iniciar=50)
+        self.assertEqual(get_proposta_defaults(empresa).numero_auto_iniciar, 1)
+
+        depois = time.time() + PROPOSTA_DEFAULTS_CACHE_TIMEOUT + 1
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=depois):
+            self.assertEqual(get_proposta_defaults(empresa).numero_auto_iniciar, 50)
+        self.assertLessEqual(PROPOSTA_DEFAULTS_CACHE_TIMEOUT, TENANT_SESSION_TTL)
+
+
+# =========================================================
+# TENANT
+# =========================================================
+
+class TenantTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        self.user = User.objects.create_user("ana", password="x", empresa=self.empresa, can_manage_propostas=True)
+        self.session = SessionStore()
+
+    def _tenant(self):
+        request = RequestFactory().get("/")
+        # Como o AuthenticationMiddleware: usuário recarregado a cada requisição
+        request.user = User.objects.get(pk=self.user.pk)
+        request.session = self.session
+        return get_tenant(request)
+
+    def test_sessao_guarda_so_a_empresa(self):
+        tenant = self._tenant()
+        self.assertTrue(tenant.can_manage_propostas)
+        self.assertEqual(tenant.empresa.nome_fantasia, "Empresa A")
+        cached = self.session[TENANT_SESSION_KEY]
+        self.assertEqual(set(cached), {"empresa_id", "empresa", "versao", "carregado_em"})
+        self.assertNotIn("can_manage_propostas", cached["empresa"])
+
+    def test_permissao_revogada_vale_na_proxima_requisicao(self):
+        self._tenant()
+        User.objects.filter(pk=self.user.pk).update(can_manage_propostas=False)
+        self.assertFalse(self._tenant().can_manage_propostas)
+
+    def test_owner_tem_todas_as_permissoes(self):
+        User.objects.filter(pk=self.user.pk).update(user_type="owner", can_manage_usuarios=False)
+        self.assertTrue(self._tenant().can_manage_usuarios)
+
+    def test_empresa_alterada_recarrega_projecao(self):
+        self._tenant()
+        self.empresa.nome_fantasia = "Empresa B"
+        self.empresa.save()
+        self.assertEqual(self._tenant().empresa.nome_fantasia, "Empresa B")
+
+
+# =========================================================
+# ISOLAMENTO ENTRE EMPRESAS
+# =========================================================
+
+class IsolamentoTenantTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        self.outra = Empresa.objects.create(nome_fantasia="Empresa B")
+        self.user = User.objects.create_user("ana", password="x", empresa=self.empresa, user_type="owner")
+        self.contato_outra = Contato.objects.create(empresa=self.outra, nome_fantasia="Cliente B")
+        self.proposta_outra = Proposta.objects.create(
+            company=self.outra, numero="B-1", titulo_servico="Obra B", cliente=self.contato_outra
+        )
+        self.usuario_outra = User.objects.create_user("bia", password="x", empresa=self.outra)
+        self.client.force_login(self.user)
+
+    def test_registros_de_outra_empresa_retornam_404(self):
+        urls = [
+            reverse("core:contatos_update", args=[self.contato_outra.pk]),
+            reverse("core:contatos_delete", args=[self.contato_outra.pk]),
+            reverse("core:contato_detail_json", args=[self.contato_outra.pk]),
+            reverse("propostas:proposta_edit", args=[self.proposta_outra.pk]),
+            reverse("propostas:proposta_public_pdf", args=[self.proposta_outra.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_post_em_registro_de_outra_empresa_nao_altera(self):
+        url = reverse("core:contatos_delete", args=[self.contato_outra.pk])
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertTrue(Contato.objects.filter(pk=self.contato_outra.pk).exists())
+
+    def test_consultas_em_massa_ficam_na_empresa(self):
+        with tenant_context(self.empresa):
+            self.assertEqual(Contato.tenant_objects.count(), 0)
+            self.assertFalse(Proposta.tenant_objects.filter(pk=self.proposta_outra.pk).exists())
+            self.assertEqual(Proposta.tenant_objects.update(status="arquivado"), 0)
+        self.proposta_outra.refresh_from_db()
+        self.assertEqual(self.proposta_outra.status, "rascunho")
+
+    def test_login_nao_invalida_cache_da_empresa(self):
+        chave = _tenant_cache_versao_key(self.empresa.pk)
+        versao = cache.get(chave)
+        self.client.logout()
+        self.client.login(username="ana", password="x")
+        self.assertEqual(cache.get(chave), versao)
+        Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+        self.assertNotEqual(cache.get(chave), versao)
+
+
+# =========================================================
+# RÉPLICA DE LEITURA
+# =========================================================
+
+class ReplicaTests(SimpleTestCase):
+    # Só o roteamento é conferido (QuerySet.db): nenhuma consulta vai à réplica
+    databases = {"default"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pasta = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cls.pasta.cleanup)
+        cls.bancos = {
+            "default": {**settings.DATABASES["default"]},
+            "replica": {"ENGINE": "django.db.backends.sqlite3", "NAME": f"{cls.pasta.name}/replica.sqlite3"},
+        }
+
+    def setUp(self):
+        override = override_settings(DATABASES=self.bancos, DATABASE_ROUTERS=["core.db.ReplicaRouter"])
+        with warnings.catch_warnings():
+            # Só replica_configurada() lê DATABASES; as conexões abertas não mudam
+            warnings.simplefilter("ignore")
+            override.enable()
+        self.addCleanup(override.disable)
+
+    def _requisicao(self, metodo="get", cookies=None, user=None):
+        request = getattr(RequestFactory(), metodo)("/")
+        request.COOKIES.update(cookies or {})
+        request.user = user or User(pk=1)
+        return request
+
+    def _executar(self, view, request):
+        lido = {}
+
+        def get_response(req):
+            lido["banco"] = Contato.objects.all().db
+            return view(req)
+
+        middleware = ReplicaMiddleware(get_response)
+        middleware.process_view(request, view, (), {})
+        return middleware(request), lido["banco"]
+
+    def test_leitura_vai_para_a_replica(self):
+        token = set_usar_replica(True)
+        try:
+            self.assertEqual(Contato.objects.all().db, "replica")
+            # Sessões e usuários sempre no primário
+            self.assertEqual(User.objects.all().db, "default")
+        finally:
+            reset_usar_replica(token)
+
+    def test_escrita_vai_para_o_primario(self):
+        token = set_usar_replica(True)
+        try:
+            self.assertEqual(router.db_for_write(Contato), "default")
+            self.assertEqual(ReplicaRouter().db_for_write(Contato), "default")
+        finally:
+            reset_usar_replica(token)
+
+    def test_dentro_de_atomic_le_do_primario(self):
+        token = set_usar_replica(True)
+        try:
+            with transaction.atomic():
+                self.assertEqual(Contato.objects.all().db, "default")
+            self.assertEqual(Contato.objects.all().db, "replica")
+        finally:
+            reset_usar_replica(token)
+
+    def test_consulta_cacheada_e_preenchida_pelo_primario(self):
+        token = set_usar_replica(True)
+        try:
+            with tenant_context(999_999):
+                consulta = Contato.tenant_objects.all()
+                self.assertEqual(consulta.db, "replica")
+                # A réplica não existe de fato: ir até ela levantaria erro
+                self.assertEqual(consulta.cached(), [])
+        finally:
+            reset_usar_replica(token)
+
+    def test_middleware_so_usa_replica_em_view_marcada(self):
+        view = usa_replica(lambda request: HttpResponse())
+        _, banco = self._executar(view, self._requisicao())
+        self.assertEqual(banco, "replica")
+
+        _, banco = self._executar(lambda request: HttpResponse(), self._requisicao())
+        self.assertEqual(banco, "default")
+        # Fora da requisição, volta ao primário
+        self.assertEqual(Contato.objects.all().db, "default")
+
+    def test_cookie_apos_post_fixa_o_primario(self):
+        view = usa_replica(lambda request: HttpResponse())
+        response, _ = self._executar(view, self._requisicao("post"))
+        self.assertIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+        cookies = {REPLICA_STICKY_COOKIE: response.cookies[REPLICA_STICKY_COOKIE].value}
+        response, banco = self._executar(view, self._requisicao(cookies=cookies))
+        self.assertEqual(banco, "default")
+        self.assertNotIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_post_anonimo_nao_fixa_o_primario(self):
+        view = usa_replica(lambda request: HttpResponse())
+        response, _ = self._executar(view, self._requisicao("post", user=AnonymousUser()))
+        self.assertNotIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_sem_replica_configurada_tudo_no_primario(self):
+        bancos = {"default": self.bancos["default"]}
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            with override_settings(DATABASES=bancos, DATABASE_ROUTERS=[]):
+                view = usa_replica(lambda request: HttpResponse())
+                response, banco = self._executar(view, self._requisicao("post"))
+        self.assertEqual(banco, "default")
+        self.assertNotIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+
+class ReplicaBancosSeparadosTests(TransactionTestCase):
+    """
+    Primário e réplica em arquivos SQLite diferentes (sem TEST MIRROR): a
+    réplica fica parada, como uma réplica atrasada.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # O alias entra só aqui, depois de o runner montar os bancos de teste:
+        # a réplica é um arquivo à parte, migrado pela própria classe
+        cls.pasta = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cls.pasta.cleanup)
+        replica = {"ENGINE": "django.db.backends.sqlite3", "NAME": f"{cls.pasta.name}/replica.sqlite3"}
+        connections.settings["replica"] = connections.configure_settings({"default": replica})["default"]
+        cls.addClassCleanup(connections.settings.pop, "replica")
+        cls.addClassCleanup(connections.__delitem__, "replica")
+        cls.addClassCleanup(lambda: connections["replica"].close())
+        cls.bancos = {**settings.DATABASES, "replica": replica}
+        cls.databases = {"default", "replica"}
+        call_command("migrate", database="replica", verbosity=0)
+        super().setUpClass()
+
+    def setUp(self):
+        override = override_settings(DATABASES=self.bancos, DATABASE_ROUTERS=["core.db.ReplicaRouter"])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            override.enable()
+        self.addCleanup(override.disable)
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        self.user = User.objects.create_user("ana", empresa=self.empresa, user_type="owner")
+
+    def _executar(self, view, metodo="get", cookies=None):
+        request = getattr(RequestFactory(), metodo)("/")
+        request.COOKIES.update(cookies or {})
+        request.user = self.user
+        middleware = ReplicaMiddleware(view)
+        middleware.process_view(request, view, (), {})
+        return middleware(request)
+
+    def test_leitura_depois_da_escrita_vem_do_primario(self):
+        def criar(request):
+            Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente novo")
+            return HttpResponse()
+
+        @usa_replica
+        def listar(request):
+            return HttpResponse(",".join(Contato.objects.values_list("nome_fantasia", flat=True)))
+
+        response = self._executar(criar, "post")
+        cookies = {REPLICA_STICKY_COOKIE: response.cookies[REPLICA_STICKY_COOKIE].value}
+
+        # Com o cookie: primário, já com a linha nova
+        self.assertEqual(self._executar(listar, cookies=cookies).content, b"Cliente novo")
+        # Sem o cookie: réplica, que ainda não recebeu a escrita
+        self.assertEqual(self._executar(listar).content, b"")
+        self.assertFalse(Contato.objects.using("replica").exists())
+
+
+class ReplicaSettingsTests(SimpleTestCase):
+    ARQUIVO_SETTINGS = Path(settings.BASE_DIR) / "gestiospro" / "settings.py"
+
+    def _settings(self, **env):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        env = {"DJANGO_DEBUG": "True", "DATABASE_URL": f"sqlite:///{pasta.name}/primario.sqlite3", **env}
+        with mock.patch.dict(os.environ, env):
+            return runpy.run_path(str(self.ARQUIVO_SETTINGS))
+
+    def test_sem_database_replica_url(self):
+        valores = self._settings(DATABASE_REPLICA_URL="")
+        self.assertEqual(list(valores["DATABASES"]), ["default"])
+        self.assertNotIn("DATABASE_ROUTERS", valores)
+
+    def test_com_database_replica_url(self):
+        valores = self._settings(DATABASE_REPLICA_URL="sqlite:////tmp/replica.sqlite3")
+        self.assertEqual(valores["DATABASES"]["replica"]["NAME"], "/tmp/replica.sqlite3")
+        self.assertEqual(valores["DATABASES"]["replica"]["TEST"], {"MIRROR": "default"})
+        self.assertEqual(valores["DATABASE_ROUTERS"], ["core.db.ReplicaRouter"])
+
+
+# =========================================================
+# MÉTRICAS POR VIEW (PROMETHEUS)
+# =========================================================
+
+@override_settings(
+    METRICAS_ATIVAS=True,
+    METRICAS_TOKEN="segredo",
+    METRICAS_LIMITE_MS=10_000,
+    METRICAS_LIMITE_CONSULTAS=10_000,
+    MIDDLEWARE=[*settings.MIDDLEWARE, "core.middleware.MetricasMiddleware"],
+)
+class MetricasTests(TestCase):
+    def setUp(self):
+        # Registro novo por teste: o do módulo acumula o processo inteiro
+        self.registro = RegistroMetricas()
+        for alvo in ("core.middleware.registro", "core.views.registro_metricas"):
+            patcher = mock.patch(alvo, self.registro)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.url = reverse("core:metricas_prometheus")
+
+    def _get(self, token=None):
+        extra = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token is not None else {}
+        return self.client.get(self.url, **extra)
+
+    def test_acesso_com_token_ou_staff(self):
+        self.assertEqual(self._get().status_code, 403)
+        self.assertEqual(self._get("outro").status_code, 403)
+        self.assertEqual(self._get("segredo").status_code, 200)
+
+        self.client.force_login(User.objects.create_user("ana", user_type="owner"))
+        self.assertEqual(self._get().status_code, 403)
+        self.client.force_login(User.objects.create_user("bia", user_type="owner", is_staff=True))
+        self.assertEqual(self._get().status_code, 200)
+
+    def test_token_vazio_nao_libera(self):
+        with override_settings(METRICAS_TOKEN=""):
+            self.assertEqual(self._get("").status_code, 403)
+
+    def test_desligadas_404(self):
+        self.client.force_login(User.objects.create_user("bia", user_type="owner", is_staff=True))
+        with override_settings(METRICAS_ATIVAS=False):
+            self.assertEqual(self._get("segredo").status_code, 404)
+
+    def test_formato_de_exposicao(self):
+        response = self._get("segredo")
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self._get("negado")
+
+        response = self._get("segredo")
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        linhas = response.content.decode().splitlines()
+        view = 'view="core:metricas_prometheus"'
+
+        metrica = "gestiospro_http_request_duration_seconds"
+        self.assertIn(f"# HELP {metrica} Tempo total da requisição.", linhas)
+        self.assertIn(f"# TYPE {metrica} histogram", linhas)
+        buckets = [linha for linha in linhas if linha.startswith(f"{metrica}_bucket{{{view}")]
+        self.assertEqual(len(buckets), len(BUCKETS_SEGUNDOS) + 1)
+        self.assertTrue(buckets[-1].startswith(f'{metrica}_bucket{{{view},le="+Inf"}} '))
+        # Buckets acumulados: o último é o total
+        contagens = [int(linha.rsplit(" ", 1)[1]) for linha in buckets]
+        self.assertEqual(contagens, sorted(contagens))
+        self.assertEqual(contagens[-1], 2)
+        self.assertIn(f"{metrica}_count{{{view}}} 2", linhas)
+        self.assertTrue(any(linha.startswith(f"{metrica}_sum{{{view}}} ") for linha in linhas))
+
+        self.assertIn("# TYPE gestiospro_http_request_db_queries histogram", linhas)
+        self.assertIn("# TYPE gestiospro_http_responses_total counter", linhas)
+        self.assertIn(f'gestiospro_http_responses_total{{{view},status="200"}} 1', linhas)
+        self.assertIn(f'gestiospro_http_responses_total{{{view},status="403"}} 1', linhas)
+
+    def test_rotulos_escapados(self):
+        familia = self.registro.histograma("teste", "Ajuda.", (1,), ("view",))
+        familia.observar(0.5, view='a"b\\c')
+        familia.observar(2, view='a"b\\c')
+        self.assertEqual(
+            list(familia.linhas())[2:],
+            [
+                'gestiospro_teste_bucket{view="a\\"b\\\\c",le="1"} 1',
+                'gestiospro_teste_bucket{view="a\\"b\\\\c",le="+Inf"} 2',
+                'gestiospro_teste_sum{view="a\\"b\\\\c"} 2.500000',
+                'gestiospro_teste_count{view="a\\"b\\\\c"} 2',
+            ],
+        )
+
+
+# =========================================================
+# ESTÁTICOS (bundles minificados)
+# =========================================================
+
+class MinificacaoTests(SimpleTestCase):
+    PASTA_STATIC = Path(settings.BASE_DIR) / "static"
+
+    def test_divisao_depois_de_parenteses_nao_vira_regex(self):
+        self.assertEqual(minificar("a.js", "x = (a) / 2 / b; // fim\n"), "x=(a)/2/b;")
+
+    @skipUnless(shutil.which("node"), "node não instalado")
+    def test_cada_js_minificado_continua_valido(self):
+        for arquivo in sorted((self.PASTA_STATIC / "js").glob("*.js")):
+            with self.subTest(arquivo=arquivo.name):
+                original = arquivo.read_text(encoding="utf-8")
+                minificado = minificar(arquivo.name, original)
+                self.assertLess(len(minificado), len(original))
+                with tempfile.NamedTemporaryFile("w", suffix=".js", encoding="utf-8") as saida:
+                    saida.write(minificado)
+                    saida.flush()
+                    resultado = subprocess.run(["node", "--check", saida.name], capture_output=True, text=True)
+                self.assertEqual(resultado.returncode, 0, resultado.stderr)
+
+    def test_bundles_montam_todos_os_arquivos(self):
+        def abrir(caminho):
+            return (self.PASTA_STATIC / caminho).read_text(encoding="utf-8")
+
+        for nome, arquivos in settings.STATIC_BUNDLES.items():
+            with self.subTest(bundle=nome):
+                conteudo = montar_bundle(nome, abrir)
+                self.assertTrue(conteudo.strip())
+                self.assertLess(len(conteudo), sum(len(abrir(caminho)) for caminho in arquivos) + len(arquivos) * 3)
+
+
+class FolhasDeEstiloTests(SimpleTestCase):
+    def test_templates_nao_repetem_arquivos_dos_bundles(self):
+        # Arquivo que já está em um bundle não volta a ser incluído avulso
+        nos_bundles = {caminho for arquivos in settings.STATIC_BUNDLES.values() for caminho in arquivos}
+        for template in sorted(Path(settings.BASE_DIR).glob("*/templates/**/*.html")):
+            with self.subTest(template=str(template.relative_to(settings.BASE_DIR))):
+                texto = template.read_text(encoding="utf-8")
+                avulsos = re.findall(r"{% static ['\"]([^'\"]+)['\"] %}", texto)
+                self.assertFalse(nos_bundles & set(avulsos))
+
+
+# =========================================================
+# LOGO DA EMPRESA
+# =========================================================
+
+class DerivadosLogoTests(SimpleTestCase):
+    def test_logo_sumida_do_storage_fica_so_com_a_origem(self):
+        empresa = Empresa(pk=1, logo="logos/nao-existe-no-storage.png")
+        with self.assertLogs("core.logos", "WARNING"):
+            self.assertEqual(gerar_derivados_logo(empresa), {"origem": "logos/nao-existe-no-storage.png"})
+
+
+# =========================================================
+# VALORES DOS SERVIÇOS (catálogo do formulário de proposta)
+# =========================================================
+
+class ServicosValoresTests(TestCase):
+    def setUp(self):
+        empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        outra = Empresa.objects.create(nome_fantasia="Empresa B")
+        self.servico = Servico.objects.create(empresa=empresa, descricao="Projeto", valor=Decimal("150.00"))
+        self.outro = Servico.objects.create(empresa=empresa, descricao="Laudo", valor=Decimal("80.00"))
+        self.servico_outra = Servico.objects.create(empresa=outra, descricao="Secreto", valor=Decimal("999.00"))
+        self.url = reverse("core:servicos_valores_json")
+        self.client.force_login(User.objects.create_user("ana", empresa=empresa, user_type="owner"))
+
+    def _servicos(self, **extra):
+        response = self.client.get(self.url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["servicos"]
+
+    def test_ids_separados_por_virgula_ou_repetidos(self):
+        servicos = self._servicos(data={"ids": [f"{self.servico.pk}, x,", str(self.outro.pk)]})
+        self.assertEqual(set(servicos), {str(self.servico.pk), str(self.outro.pk)})
+        self.assertEqual(
+            servicos[str(self.servico.pk)], {"valor": "150.00", "descricao": "Projeto", "entregaveis": ""}
+        )
+        self.assertEqual(self._servicos(data={"ids": "abc,-1"}), {})
+
+    def test_limite_de_ids(self):
+        ids = ",".join(str(pk) for pk in range(1, SERVICOS_VALORES_MAX_IDS + 2))
+        self.assertEqual(self.client.get(self.url, {"ids": ids}).status_code, 400)
+        ids = ",".join(str(pk) for pk in range(1, SERVICOS_VALORES_MAX_IDS + 1))
+        self.assertEqual(self.client.get(self.url, {"ids": ids}).status_code, 200)
+
+    def test_etag_responde_304_ate_o_servico_mudar(self):
+        dados = {"ids": str(self.servico.pk)}
+        etag = self.client.get(self.url, dados)["ETag"]
+        response = self.client.get(self.url, dados, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Servico.objects.filter(pk=self.servico.pk).update(valor=Decimal("175.00"))
+        response = self.client.get(self.url, dados, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_servico_de_outra_empresa_nao_aparece(self):
+        servicos = self._servicos(data={"ids": f"{self.servico.pk},{self.servico_outra.pk}"})
+        self.assertEqual(list(servicos), [str(self.servico.pk)])
+
+
+# =========================================================
+# ARMAZENAMENTO DEDUPLICADO E LIMPEZA DE ÓRFÃOS
+# =========================================================
+
+class ArmazenamentoDeduplicadoTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(
+            MEDIA_ROOT=pasta.name,
+            STORAGES={
+                "default": {"BACKEND": "core.armazenamento.ArmazenamentoDeduplicado"},
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+
+    def _salvar(self, conteudo, nome="logo.PNG"):
+        return default_storage.save(nome, ContentFile(conteudo))
+
+    def _envelhecer(self, nome, horas=48):
+        antigo = time.time() - horas * 3600
+        os.utime(default_storage.path(nome), (antigo, antigo))
+
+    def _limpar(self, **opcoes):
+        saida = StringIO()
+        call_command("limpar_arquivos_orfaos", stdout=saida, **opcoes)
+        return saida.getvalue()
+
+    def test_nome_pelo_hash_e_reenvio_sem_copia(self):
+        self.assertIsInstance(storages["default"], ArmazenamentoDeduplicado)
+        nome = self._salvar(b"logo")
+        self.assertRegex(nome, r"^arquivos/[0-9a-f]{2}/[0-9a-f]{64}\.png$")
+        self.assertEqual(self._salvar(b"logo", "outro.png"), nome)
+        self.assertNotEqual(self._salvar(b"outra logo"), nome)
+
+    def test_reenvio_renova_a_data_do_arquivo(self):
+        nome = self._salvar(b"logo")
+        self._envelhecer(nome)
+        self._salvar(b"logo")
+        idade = timezone.now() - default_storage.get_modified_time(nome)
+        self.assertLess(idade.total_seconds(), 60)
+
+    def test_delete_so_apaga_sem_referencias(self):
+        nome = self._salvar(b"logo")
+        Empresa.objects.filter(pk=self.empresa.pk).update(logo=nome)
+        outra = Empresa.objects.create(nome_fantasia="Empresa B")
+        Empresa.objects.filter(pk=outra.pk).update(logo_derivados={"origem": "x", "pdf": nome})
+        self.assertEqual(contar_referencias(nome), 2)
+
+        default_storage.delete(nome)
+        self.assertTrue(default_storage.exists(nome))
+
+        Empresa.objects.filter(pk=self.empresa.pk).update(logo="")
+        outra.delete()
+        default_storage.delete(nome)
+        self.assertFalse(default_storage.exists(nome))
+
+    def test_limpar_apaga_so_orfaos_antigos(self):
+        usado = self._salvar(b"usado")
+        Empresa.objects.filter(pk=self.empresa.pk).update(papel_timbrado=usado)
+        antigo = self._salvar(b"antigo")
+        recente = self._salvar(b"recente")
+        for nome in (usado, antigo):
+            self._envelhecer(nome)
+
+        self.assertIn(f"órfão: {antigo}", self._limpar(simular=True))
+        self.assertTrue(default_storage.exists(antigo))
+
+        saida = self._limpar()
+        self.assertIn("1 apagado(s)", saida)
+        self.assertFalse(default_storage.exists(antigo))
+        self.assertTrue(default_storage.exists(usado))
+        self.assertTrue(default_storage.exists(recente))
+
+    def test_orfao_reenviado_nao_e_apagado(self):
+        nome = self._salvar(b"logo")
+        self._envelhecer(nome)
+        # Reenvio do mesmo arquivo: o registro ainda não foi salvo
+        self.assertEqual(self._salvar(b"logo"), nome)
+        self._limpar()
+        self.assertTrue(default_storage.exists(nome))
+
+    def test_limpar_confere_referencias_antes_de_apagar(self):
+        nome = self._salvar(b"logo")
+        self._envelhecer(nome)
+        # Registro salvo depois da leitura inicial das referências
+        with mock.patch(
+            "core.management.commands.limpar_arquivos_orfaos.referencias_por_arquivo",
+            return_value=Counter(),
+        ):
+            Empresa.objects.filter(pk=self.empresa.pk).update(logo=nome)
+            self._limpar()
+        self.assertTrue(default_storage.exists(nome))
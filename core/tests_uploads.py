@@ -0,0 +1,200 @@
+import importlib.util
+import tempfile
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .models import User
+from .uploads import confirmar_upload_direto, iniciar_upload_direto, storage_real
+
+TEM_MOTO = all(importlib.util.find_spec(nome) for nome in ("moto", "boto3", "requests", "storages"))
+
+if TEM_MOTO:
+    import boto3
+    import requests
+    from moto import mock_aws
+
+BUCKET = "media-teste"
+
+STORAGES_S3 = {
+    "default": {
+        "BACKEND": "core.armazenamento.ArmazenamentoDeduplicado",
+        "OPTIONS": {
+            "backend": "storages.backends.s3.S3Storage",
+            "opcoes": {
+                "bucket_name": BUCKET,
+                "access_key": "teste",
+                "secret_key": "teste",
+                "region_name": "us-east-1",
+                "default_acl": None,
+                "querystring_auth": False,
+            },
+        },
+    },
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+PDF = b"%PDF-1.7\n" + b"0" * 100
+PDF_MB = 1024 * 1024
+
+
+def _request(usuario_id):
+    return SimpleNamespace(user=SimpleNamespace(pk=usuario_id))
+
+
+# =========================================================
+# UPLOAD DIRETO PARA O S3 (moto)
+# =========================================================
+
+@skipUnless(TEM_MOTO, "moto/boto3/django-storages não instalados")
+@override_settings(STORAGES=STORAGES_S3, UPLOAD_DIRETO_VALIDADE=60)
+class UploadDiretoS3Tests(SimpleTestCase):
+    def setUp(self):
+        self.aws = mock_aws()
+        self.aws.start()
+        self.addCleanup(self.aws.stop)
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        self.request = _request(1)
+
+    def _iniciar(self, nome="proposta.pdf", tamanho=len(PDF), escopo="proposta:1"):
+        return iniciar_upload_direto(self.request, escopo, nome, tamanho, {".pdf"}, PDF_MB)
+
+    def _enviar(self, autorizacao, conteudo):
+        # Mesmo POST multipart que o navegador faz: campos e o arquivo por último
+        response = requests.post(
+            autorizacao["url"], data=autorizacao["campos"], files={"file": ("proposta.pdf", conteudo)}
+        )
+        self.assertLess(response.status_code, 300, response.text)
+
+    def _chave(self, autorizacao):
+        return autorizacao["campos"]["key"]
+
+    def test_pre_assinado_e_confirmado(self):
+        autorizacao = self._iniciar()
+        self.assertFalse(autorizacao["local"])
+        self._enviar(autorizacao, PDF)
+
+        chave = confirmar_upload_direto(self.request, autorizacao["token"], "proposta:1")
+        self.assertEqual(chave, self._chave(autorizacao))
+        with storage_real().open(chave, "rb") as arquivo:
+            self.assertEqual(arquivo.read(), PDF)
+
+    def test_token_de_outro_usuario_ou_escopo(self):
+        autorizacao = self._iniciar()
+        self._enviar(autorizacao, PDF)
+
+        with self.assertRaises(ValidationError):
+            confirmar_upload_direto(_request(2), autorizacao["token"], "proposta:1")
+        with self.assertRaises(ValidationError):
+            confirmar_upload_direto(self.request, autorizacao["token"], "proposta:2")
+        with self.assertRaises(ValidationError):
+            confirmar_upload_direto(self.request, autorizacao["token"] + "x", "proposta:1")
+        # Recusado pelo token: o arquivo continua lá para o dono confirmar
+        self.assertTrue(storage_real().exists(self._chave(autorizacao)))
+
+    def test_conteudo_que_nao_e_pdf_e_apagado(self):
+        autorizacao = self._iniciar()
+        self._enviar(autorizacao, b"MZ\x90\x00" + b"0" * 100)
+
+        with self.assertRaisesMessage(ValidationError, "não corresponde"):
+            confirmar_upload_direto(self.request, autorizacao["token"], "proposta:1")
+        self.assertFalse(storage_real().exists(self._chave(autorizacao)))
+
+    def test_maior_que_o_limite_e_apagado(self):
+        with self.assertRaises(ValidationError):
+            self._iniciar(tamanho=PDF_MB + 1)
+
+        # O navegador declarou um tamanho e enviou outro (o limite do POST
+        # é do S3; aqui a confirmação é que barra)
+        autorizacao = self._iniciar()
+        self._enviar(autorizacao, PDF + b"0" * PDF_MB)
+        with self.assertRaisesMessage(ValidationError, "limite"):
+            confirmar_upload_direto(self.request, autorizacao["token"], "proposta:1")
+        self.assertFalse(storage_real().exists(self._chave(autorizacao)))
+
+    def test_arquivo_que_nao_chegou(self):
+        autorizacao = self._iniciar()
+        with self.assertRaisesMessage(ValidationError, "não chegou"):
+            confirmar_upload_direto(self.request, autorizacao["token"], "proposta:1")
+
+
+@skipUnless(TEM_MOTO, "moto/boto3/django-storages não instalados")
+@override_settings(STORAGES=STORAGES_S3)
+class ArmazenamentoS3Tests(SimpleTestCase):
+    def setUp(self):
+        self.aws = mock_aws()
+        self.aws.start()
+        self.addCleanup(self.aws.stop)
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+
+    def test_reenvio_renova_o_objeto_sem_perder_o_tipo(self):
+        storage = storages["default"]
+        nome = storage.save("logo.pdf", ContentFile(PDF))
+        objeto = storage.bucket.Object(nome)
+        antes = objeto.last_modified
+
+        with mock.patch.object(storage.backend, "_save") as regravar:
+            self.assertEqual(storage.save("outro.pdf", ContentFile(PDF)), nome)
+        regravar.assert_not_called()
+
+        objeto.reload()
+        self.assertGreaterEqual(objeto.last_modified, antes)
+        self.assertEqual(objeto.content_type, "application/pdf")
+        self.assertEqual(objeto.get()["Body"].read(), PDF)
+
+
+# =========================================================
+# UPLOAD DIRETO LOCAL (sem S3)
+# =========================================================
+
+class UploadDiretoLocalTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        configuracao = override_settings(
+            MEDIA_ROOT=pasta.name,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+            },
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+        self.usuario = User.objects.create_user("ana", user_type="owner")
+        self.client.force_login(self.usuario)
+
+    def _iniciar(self, usuario=None):
+        request = _request((usuario or self.usuario).pk)
+        return iniciar_upload_direto(request, "logo", "logo.pdf", len(PDF), {".pdf"}, PDF_MB)
+
+    def _enviar(self, autorizacao, conteudo=PDF):
+        return self.client.post(autorizacao["url"], {"file": ContentFile(conteudo, name="logo.pdf")})
+
+    def test_envio_local_e_confirmado(self):
+        autorizacao = self._iniciar()
+        self.assertTrue(autorizacao["local"])
+        self.assertEqual(autorizacao["url"], reverse("core:upload_direto_local", args=[autorizacao["token"]]))
+        self.assertEqual(self._enviar(autorizacao).status_code, 201)
+
+        chave = confirmar_upload_direto(_request(self.usuario.pk), autorizacao["token"], "logo")
+        with storage_real().open(chave, "rb") as arquivo:
+            self.assertEqual(arquivo.read(), PDF)
+
+        # O mesmo token não grava duas vezes
+        self.assertEqual(self._enviar(autorizacao).status_code, 400)
+
+    def test_envio_local_com_token_de_outro_usuario(self):
+        outro = User.objects.create_user("bia", user_type="owner")
+        response = self._enviar(self._iniciar(outro))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()["ok"])
+
+    def test_envio_local_maior_que_o_limite(self):
+        response = self._enviar(self._iniciar(), PDF + b"0" * PDF_MB)
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,179 @@
+import mimetypes
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.storage import storages
+from django.urls import reverse
+from django.utils.text import get_valid_filename
+
+
+# =========================================================
+# UPLOAD DIRETO PARA O STORAGE
+# =========================================================
+# Arquivos grandes não passam pelo Django: o navegador pede uma autorização
+# (iniciar_upload_direto), envia o arquivo direto ao bucket com um POST
+# pré-assinado e depois o formulário traz só o token, que o servidor confere
+# (confirmar_upload_direto): objeto existe, tamanho e assinatura do tipo.
+#
+# Sem S3 (desenvolvimento), o mesmo POST vai para core:upload_direto_local,
+# que grava no disco. O bucket precisa de uma regra de CORS liberando POST
+# a partir do domínio do sistema.
+#
+# Os objetos ficam em PASTA_UPLOADS_DIRETOS/<uuid>/<nome>; os que nunca forem
+# confirmados (ou forem substituídos) saem no limpar_arquivos_orfaos.
+
+PASTA_UPLOADS_DIRETOS = "diretos"
+
+SALT_UPLOAD = "core.uploads.direto"
+
+# Início do arquivo esperado para cada extensão: [(posição, bytes), ...]
+ASSINATURAS = {
+    ".pdf": [(0, b"%PDF-")],
+    ".doc": [(0, b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")],
+    ".docx": [(0, b"PK\x03\x04")],
+    ".png": [(0, b"\x89PNG\r\n\x1a\n")],
+    ".jpg": [(0, b"\xff\xd8\xff")],
+    ".jpeg": [(0, b"\xff\xd8\xff")],
+    ".webp": [(0, b"RIFF"), (8, b"WEBP")],
+}
+
+BYTES_ASSINATURA = 16
+
+
+def storage_real():
+    """Storage que grava de fato (o de dentro do ArmazenamentoDeduplicado)."""
+    storage = storages["default"]
+    return getattr(storage, "backend", storage)
+
+
+def _usa_s3(storage):
+    try:
+        from storages.backends.s3 import S3Storage
+    except ImportError:
+        return False
+    return isinstance(storage, S3Storage)
+
+
+def _chave_s3(storage, nome):
+    from storages.utils import clean_name
+
+    return storage._normalize_name(clean_name(nome))
+
+
+def _primeiros_bytes(storage, nome):
+    if _usa_s3(storage):
+        # Só o começo do objeto (Range), sem baixar o arquivo inteiro
+        objeto = storage.bucket.Object(_chave_s3(storage, nome))
+        return objeto.get(Range=f"bytes=0-{BYTES_ASSINATURA - 1}")["Body"].read()
+    with storage.open(nome, "rb") as arquivo:
+        return arquivo.read(BYTES_ASSINATURA)
+
+
+def _nome_do_objeto(nome_original, max_length):
+    nome = get_valid_filename(posixpath.basename(nome_original.replace("\\", "/"))) or "arquivo"
+    raiz, extensao = posixpath.splitext(nome)
+    pasta = f"{PASTA_UPLOADS_DIRETOS}/{uuid.uuid4().hex}/"
+    sobra = max_length - len(pasta) - len(extensao)
+    return pasta + raiz[: max(sobra, 1)] + extensao.lower()
+
+
+def iniciar_upload_direto(request, escopo, nome, tamanho, extensoes, max_bytes, max_length=100):
+    """
+    Autoriza o envio de um arquivo e retorna o que o navegador precisa:
+    {"url", "campos", "local", "token"}. O navegador faz um POST
+    multipart em `url` com `campos` e o arquivo no campo "file" (por último).
+
+    `escopo` identifica onde o arquivo vai ser usado (ex.: "proposta:12") e
+    é conferido na confirmação, junto com o usuário.
+    """
+    extensao = posixpath.splitext(nome or "")[1].lower()
+    if extensao not in extensoes:
+        raise ValidationError(f"Tipo de arquivo não permitido. Use: {', '.join(sorted(extensoes))}.")
+    if tamanho <= 0:
+        raise ValidationError("Arquivo vazio.")
+    if tamanho > max_bytes:
+        raise ValidationError(f"Arquivo maior que o limite de {max_bytes // (1024 * 1024)} MB.")
+
+    chave = _nome_do_objeto(nome, max_length)
+    token = signing.dumps(
+        {"chave": chave, "escopo": escopo, "usuario": request.user.pk, "max": max_bytes},
+        salt=SALT_UPLOAD,
+    )
+    content_type = mimetypes.guess_type(chave)[0] or "application/octet-stream"
+
+    storage = storage_real()
+    if not _usa_s3(storage):
+        return {
+            "url": reverse("core:upload_direto_local", args=[token]),
+            "campos": {},
+            "local": True,
+            "token": token,
+        }
+
+    campos = {"Content-Type": content_type}
+    condicoes = [{"Content-Type": content_type}, ["content-length-range", 1, max_bytes]]
+    if storage.default_acl:
+        # Mesma ACL dos arquivos gravados pelo servidor
+        campos["acl"] = storage.default_acl
+        condicoes.append({"acl": storage.default_acl})
+    presigned = storage.bucket.meta.client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=_chave_s3(storage, chave),
+        Fields=campos,
+        Conditions=condicoes,
+        ExpiresIn=settings.UPLOAD_DIRETO_VALIDADE,
+    )
+    return {"url": presigned["url"], "campos": presigned["fields"], "local": False, "token": token}
+
+
+def ler_token_upload(token, usuario_id):
+    try:
+        dados = signing.loads(token, salt=SALT_UPLOAD, max_age=settings.UPLOAD_DIRETO_VALIDADE)
+    except signing.BadSignature:
+        raise ValidationError("Envio do arquivo expirado ou inválido. Selecione o arquivo de novo.")
+    if dados["usuario"] != usuario_id:
+        raise ValidationError("Envio do arquivo inválido. Selecione o arquivo de novo.")
+    return dados
+
+
+def confirmar_upload_direto(request, token, escopo):
+    """
+    Confere o arquivo enviado com o token de iniciar_upload_direto e retorna
+    o nome dele no storage (para atribuir ao FileField). Arquivo inválido é
+    apagado e vira ValidationError.
+    """
+    dados = ler_token_upload(token, request.user.pk)
+    if dados["escopo"] != escopo:
+        raise ValidationError("Envio do arquivo inválido. Selecione o arquivo de novo.")
+
+    chave = dados["chave"]
+    storage = storage_real()
+    if not storage.exists(chave):
+        raise ValidationError("O arquivo não chegou ao armazenamento. Envie de novo.")
+
+    tamanho = storage.size(chave)
+    extensao = posixpath.splitext(chave)[1]
+    inicio = _primeiros_bytes(storage, chave)
+    erro = None
+    if not 0 < tamanho <= dados["max"]:
+        erro = "Arquivo vazio ou maior que o limite."
+    elif not all(inicio[pos : pos + len(sig)] == sig for pos, sig in ASSINATURAS.get(extensao, [])):
+        erro = "O conteúdo do arquivo não corresponde ao tipo informado."
+    if erro:
+        storage.delete(chave)
+        raise ValidationError(erro)
+    return chave
+
+
+def gravar_upload_local(token, usuario_id, arquivo):
+    """Recebe o POST do navegador quando o storage não é S3 (desenvolvimento)."""
+    dados = ler_token_upload(token, usuario_id)
+    if arquivo.size > dados["max"]:
+        raise ValidationError("Arquivo maior que o limite.")
+    storage = storage_real()
+    if storage.exists(dados["chave"]):
+        raise ValidationError("Envio já realizado.")
+    storage.save(dados["chave"], arquivo)
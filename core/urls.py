@@ -26,6 +26,7 @@ urlpatterns = [
     ),
 
     path("servicos/<int:pk>/valor/", views.servico_valor_json, name="servico_valor_json"),
+    path("servicos/valores/", views.servicos_valores_json, name="servicos_valores_json"),
     
     # DEFINIÇÕES / EM BREVE
     path("definicoes/empresa/", views.definicoes_empresa, name="definicoes_empresa"),
@@ -40,4 +41,11 @@ urlpatterns = [
     path("usuarios/novo/", views.usuarios_create, name="usuarios_create"),
     path("usuarios/<int:pk>/editar/", views.usuarios_update, name="usuarios_update"),
     path("usuarios/<int:pk>/remover/", views.usuarios_delete, name="usuarios_delete"),
+
+    # INTERNO
+    path("interno/db-pool/", views.db_pool_stats_json, name="db_pool_stats_json"),
+    path("interno/metricas/", views.metricas_prometheus, name="metricas_prometheus"),
+
+    # Upload direto sem S3 (desenvolvimento)
+    path("uploads/local/<str:token>/", views.upload_direto_local, name="upload_direto_local"),
 ]
\ No newline at end of file
@@ -1,11 +1,22 @@
+import hmac
+
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseForbidden
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseForbidden
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import ListView, CreateView, UpdateView
 
+from .db import pool_stats, usa_replica
+from .metricas import registro as registro_metricas
+from .services import valores_servicos
+from .uploads import gravar_upload_local
 from .forms import (
     ContatoForm,
     ServicoForm,
@@ -23,49 +34,24 @@ from .models import (
     User,
 )
 
-# =========================================================
-# HELPERS DE PERMISSÃO / UTIL
-# =========================================================
-
-def user_has_empresa(user):
-    return user.is_authenticated and getattr(user, "empresa", None) is not None
-
-
-def user_can_manage_usuarios(user):
-    return (
-        user.is_authenticated
-        and user_has_empresa(user)
-        and (getattr(user, "user_type", "") == "owner" or getattr(user, "can_manage_usuarios", False))
-    )
-
-
-def user_can_manage_propostas(user):
-    return (
-        user.is_authenticated
-        and user_has_empresa(user)
-        and (getattr(user, "user_type", "") == "owner" or getattr(user, "can_manage_propostas", False))
-    )
-
-
-def user_can_manage_definicoes_propostas(user):
-    return (
-        user.is_authenticated
-        and user_has_empresa(user)
-        and (
-            getattr(user, "user_type", "") == "owner"
-            or getattr(user, "can_manage_propostas_definicoes", False)
-        )
-    )
-
-
 # =========================================================
 # HOME
 # =========================================================
 
 @login_required
+@usa_replica
 def home(request):
-    empresa = request.user.empresa
-    return render(request, "core/home.html", {"empresa": empresa})
+    # Import tardio: core não importa propostas ao carregar
+    from propostas.services import dashboard_empresa
+
+    empresa = request.tenant.empresa
+    # Dashboard lido só do rollup diário (propostas.rollups)
+    dashboard = dashboard_empresa(empresa)
+    return render(
+        request,
+        "core/home.html",
+        {"empresa": empresa, "dashboard": dashboard},
+    )
 
 
 # =========================================================
@@ -77,9 +63,10 @@ class ContatoListView(ListView):
     model = Contato
     template_name = "core/contatos_list.html"
     context_object_name = "contatos"
+    usa_replica = True
 
     def get_queryset(self):
-        return Contato.objects.filter(empresa=self.request.user.empresa)
+        return Contato.tenant_objects.all()
 
 
 @method_decorator(login_required, name="dispatch")
@@ -91,11 +78,11 @@ class ContatoCreateView(CreateView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs["empresa"] = self.request.user.empresa
+        kwargs["empresa"] = self.request.tenant.empresa
         return kwargs
 
     def form_valid(self, form):
-        form.instance.empresa = self.request.user.empresa
+        form.instance.empresa = self.request.tenant.empresa
         return super().form_valid(form)
 
 
@@ -107,17 +94,17 @@ class ContatoUpdateView(UpdateView):
     success_url = reverse_lazy("core:contatos_list")
 
     def get_queryset(self):
-        return Contato.objects.filter(empresa=self.request.user.empresa)
+        return Contato.tenant_objects.all()
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs["empresa"] = self.request.user.empresa
+        kwargs["empresa"] = self.request.tenant.empresa
         return kwargs
 
 
 @login_required
 def contato_delete(request, pk):
-    contato = get_object_or_404(Contato, pk=pk, empresa=request.user.empresa)
+    contato = get_object_or_404(Contato.tenant_objects, pk=pk)
     if request.method == "POST":
         nome = contato.nome_fantasia or contato.razao_social or contato.pk
         contato.delete()
@@ -135,9 +122,10 @@ class ServicoListView(ListView):
     model = Servico
     template_name = "core/servicos_list.html"
     context_object_name = "servicos"
+    usa_replica = True
 
     def get_queryset(self):
-        return Servico.objects.filter(empresa=self.request.user.empresa)
+        return Servico.tenant_objects.all()
 
 
 @method_decorator(login_required, name="dispatch")
@@ -149,11 +137,11 @@ class ServicoCreateView(CreateView):
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs["empresa"] = self.request.user.empresa
+        kwargs["empresa"] = self.request.tenant.empresa
         return kwargs
 
     def form_valid(self, form):
-        form.instance.empresa = self.request.user.empresa
+        form.instance.empresa = self.request.tenant.empresa
         return super().form_valid(form)
 
 
@@ -165,17 +153,17 @@ class ServicoUpdateView(UpdateView):
     success_url = reverse_lazy("core:servicos_list")
 
     def get_queryset(self):
-        return Servico.objects.filter(empresa=self.request.user.empresa)
+        return Servico.tenant_objects.all()
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
-        kwargs["empresa"] = self.request.user.empresa
+        kwargs["empresa"] = self.request.tenant.empresa
         return kwargs
 
 
 @login_required
 def servico_delete(request, pk):
-    servico = get_object_or_404(Servico, pk=pk, empresa=request.user.empresa)
+    servico = get_object_or_404(Servico.tenant_objects, pk=pk)
     if request.method == "POST":
         descricao = servico.descricao
         servico.delete()
@@ -194,7 +182,7 @@ def categoria_servico_create_ajax(request):
         return JsonResponse({"error": "Informe o nome da categoria."}, status=400)
 
     categoria, created = CategoriaServico.objects.get_or_create(
-        empresa=request.user.empresa,
+        empresa=request.tenant.empresa,
         nome=nome,
     )
 
@@ -208,16 +196,68 @@ def categoria_servico_create_ajax(request):
 
 @login_required
 def servico_valor_json(request, pk):
-    servico = get_object_or_404(Servico, pk=pk, empresa=request.user.empresa)
+    servico = get_object_or_404(Servico.tenant_objects, pk=pk)
     return JsonResponse({"valor": str(servico.valor or 0)})
 
+
+# Limite de ids aceitos por requisição no endpoint em lote
+SERVICOS_VALORES_MAX_IDS = 500
+
+
+@login_required
+@require_GET
+def servicos_valores_json(request):
+    """
+    Versão em lote de servico_valor_json. O formulário de proposta já vem
+    com os valores (json_script); isto só atualiza o catálogo depois.
+
+    Recebe ?ids=1,2,3 (ou ids repetidos: ?ids=1&ids=2) e devolve
+    valor/descrição/entregáveis de todos os serviços da empresa em uma única
+    consulta. A resposta leva ETag, então o navegador revalida com
+    If-None-Match e recebe 304 quando nada mudou.
+    """
+    ids = []
+    for raw in request.GET.getlist("ids"):
+        for parte in raw.split(","):
+            parte = parte.strip()
+            if parte.isdigit():
+                ids.append(int(parte))
+
+    if len(ids) > SERVICOS_VALORES_MAX_IDS:
+        return JsonResponse(
+            {"error": f"Informe no máximo {SERVICOS_VALORES_MAX_IDS} serviços."},
+            status=400,
+        )
+
+    servicos = {}
+    if ids:
+        servicos = valores_servicos(
+            Servico.tenant_objects.filter(pk__in=set(ids)).values(
+                "id",
+                "descricao",
+                "valor",
+                "entregaveis",
+            )
+        )
+
+    response = JsonResponse({"servicos": servicos})
+    # Sempre revalidar: o valor pode mudar a qualquer momento no cadastro
+    patch_cache_control(response, private=True, no_cache=True)
+    set_response_etag(response)
+    return get_conditional_response(
+        request,
+        etag=response["ETag"],
+        response=response,
+    )
+
 # =========================================================
 # DEFINIÇÕES DA EMPRESA
 # =========================================================
 
 @login_required
 def definicoes_empresa(request):
-    empresa = request.user.empresa
+    # O tenant só carrega a projeção enxuta; aqui o formulário precisa da empresa completa
+    empresa = Empresa.objects.filter(pk=request.tenant.empresa_id).first()
     if request.method == "POST":
         form = EmpresaForm(request.POST, request.FILES, instance=empresa)
         if form.is_valid():
@@ -235,11 +275,15 @@ def definicoes_empresa(request):
 
 @login_required
 def definicoes_propostas(request):
-    if not user_can_manage_definicoes_propostas(request.user):
+    if not request.tenant.can_manage_propostas_definicoes:
         return HttpResponseForbidden("Você não tem permissão para acessar esta página.")
 
-    empresa = request.user.empresa
-    config, _ = PropostaConfiguracao.objects.get_or_create(empresa=empresa)
+    empresa = request.tenant.empresa
+    # Só grava a configuração quando o formulário é salvo
+    config = (
+        PropostaConfiguracao.objects.filter(empresa=empresa).first()
+        or PropostaConfiguracao(empresa=empresa)
+    )
 
     if request.method == "POST":
         form = PropostaConfiguracaoForm(request.POST, request.FILES, instance=config)
@@ -276,17 +320,17 @@ def em_breve(request, secao):
 
 @login_required
 def usuarios_list(request):
-    if not user_can_manage_usuarios(request.user):
+    if not request.tenant.can_manage_usuarios:
         messages.error(request, "Você não tem permissão para gerenciar usuários.")
         return redirect("core:home")
 
-    usuarios = User.objects.filter(empresa=request.user.empresa).order_by("first_name", "username")
+    usuarios = User.tenant_objects.order_by("first_name", "username")
     return render(request, "core/usuarios_list.html", {"usuarios": usuarios})
 
 
 @login_required
 def usuarios_create(request):
-    if not user_can_manage_usuarios(request.user):
+    if not request.tenant.can_manage_usuarios:
         messages.error(request, "Você não tem permissão para gerenciar usuários.")
         return redirect("core:home")
 
@@ -294,7 +338,7 @@ def usuarios_create(request):
         form = UserForm(request.POST)
         if form.is_valid():
             usuario = form.save(commit=False)
-            usuario.empresa = request.user.empresa
+            usuario.empresa = request.tenant.empresa
             usuario.first_name = request.POST.get("first_name", "").strip()
             usuario.last_name = request.POST.get("last_name", "").strip()
 
@@ -317,11 +361,11 @@ def usuarios_create(request):
 
 @login_required
 def usuarios_update(request, pk):
-    if not user_can_manage_usuarios(request.user):
+    if not request.tenant.can_manage_usuarios:
         messages.error(request, "Você não tem permissão para gerenciar usuários.")
         return redirect("core:home")
 
-    usuario = get_object_or_404(User, pk=pk, empresa=request.user.empresa)
+    usuario = get_object_or_404(User.tenant_objects, pk=pk)
 
     if usuario.user_type == "owner" and request.user.pk != usuario.pk:
         messages.error(request, "Somente o proprietário pode editar seus próprios dados.")
@@ -344,11 +388,11 @@ def usuarios_update(request, pk):
 
 @login_required
 def usuarios_delete(request, pk):
-    if not user_can_manage_usuarios(request.user):
+    if not request.tenant.can_manage_usuarios:
         messages.error(request, "Você não tem permissão para gerenciar usuários.")
         return redirect("core:home")
 
-    usuario = get_object_or_404(User, pk=pk, empresa=request.user.empresa)
+    usuario = get_object_or_404(User.tenant_objects, pk=pk)
 
     if usuario.user_type == "owner":
         messages.error(request, "O usuário proprietário não pode ser removido.")
@@ -369,7 +413,7 @@ def usuarios_delete(request, pk):
 
 @login_required
 def contato_detail_json(request, pk):
-    contato = get_object_or_404(Contato, pk=pk, empresa=request.user.empresa)
+    contato = get_object_or_404(Contato.tenant_objects, pk=pk)
     nome = contato.nome_fantasia or contato.razao_social or ""
     email = contato.email or ""
     partes = nome.strip().split()
@@ -385,3 +429,63 @@ def contato_detail_json(request, pk):
     )
 
 
+# =========================================================
+# INTERNO: MÉTRICAS DO POOL DE CONEXÕES
+# =========================================================
+
+@staff_member_required
+def db_pool_stats_json(request):
+    """
+    Estatísticas do pool psycopg3 do worker que atendeu a requisição.
+    """
+    return JsonResponse({"pool": pool_stats()})
+
+
+# =========================================================
+# INTERNO: MÉTRICAS POR VIEW (PROMETHEUS)
+# =========================================================
+
+def _token_metricas_valido(request):
+    esperado = settings.METRICAS_TOKEN
+    if not esperado:
+        return False
+    recebido = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    return hmac.compare_digest(recebido.encode(), esperado.encode())
+
+
+@require_GET
+def metricas_prometheus(request):
+    """
+    Histogramas por view do worker que atendeu a requisição, no formato
+    texto do Prometheus. Acesso: staff logado ou o token METRICAS_TOKEN
+    (para o coletor). 404 quando a instrumentação está desligada.
+    """
+    if not settings.METRICAS_ATIVAS:
+        raise Http404
+    if not (_token_metricas_valido(request) or request.user.is_staff):
+        return HttpResponseForbidden("Acesso restrito.")
+    return HttpResponse(
+        registro_metricas.exportar(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# =========================================================
+# UPLOAD DIRETO (FALLBACK LOCAL, SEM S3)
+# =========================================================
+
+@login_required
+@require_POST
+def upload_direto_local(request, token):
+    """
+    Destino do upload direto quando o storage é o disco local: recebe o
+    mesmo POST multipart que iria para o bucket (core.uploads).
+    """
+    arquivo = request.FILES.get("file")
+    if arquivo is None:
+        return JsonResponse({"ok": False, "error": "Arquivo não enviado."}, status=400)
+    try:
+        gravar_upload_local(token, request.user.pk, arquivo)
+    except ValidationError as erro:
+        return JsonResponse({"ok": False, "error": erro.messages[0]}, status=400)
+    return JsonResponse({"ok": True}, status=201)
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+O kanban ao vivo (propostas:propostas_ao_vivo, Server-Sent Events) só
+funciona servido por aqui, com um servidor ASGI, por exemplo:
+
+    gunicorn gestiospro.asgi:application -k uvicorn.workers.UvicornWorker
 """
 
 import os
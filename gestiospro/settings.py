@@ -36,6 +36,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.TenantMiddleware",
+    "core.middleware.ReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -53,24 +55,121 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.tenant",
             ],
         },
     },
 ]
 
+# Instrumentação por requisição (opt-in): consultas/tempo de banco, tempo de
+# template e total no cabeçalho Server-Timing, log das requisições acima dos
+# limites e histogramas por view em /interno/metricas/ (formato Prometheus;
+# acesso de staff ou com "Authorization: Bearer <METRICAS_TOKEN>").
+METRICAS_ATIVAS = os.getenv("METRICAS_ATIVAS", "false").lower() == "true"
+METRICAS_LIMITE_MS = float(os.getenv("METRICAS_LIMITE_MS", "500"))
+METRICAS_LIMITE_CONSULTAS = int(os.getenv("METRICAS_LIMITE_CONSULTAS", "30"))
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+
+# PDFs de proposta: tempo por etapa em histogramas (com METRICAS_ATIVAS) e
+# log dos PDFs que levaram mais que PDF_LIMITE_MS.
+PDF_LIMITE_MS = float(os.getenv("PDF_LIMITE_MS", "3000"))
+
+if METRICAS_ATIVAS:
+    # Depois do WhiteNoise: arquivos estáticos ficam de fora
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index("whitenoise.middleware.WhiteNoiseMiddleware") + 1,
+        "core.middleware.MetricasMiddleware",
+    )
+    TEMPLATES[0]["BACKEND"] = "core.metricas.TemplatesInstrumentados"
+
 WSGI_APPLICATION = "gestiospro.wsgi.application"
 
 # Banco:
 # - Local sem DATABASE_URL: cai em SQLite
 # - Render com DATABASE_URL: usa Postgres persistente
+# - DB_POOL=true (só Postgres): pool de conexões do psycopg3 por processo.
+#   O pool substitui conexões persistentes (CONN_MAX_AGE precisa ser 0).
+#   Com CONN_HEALTH_CHECKS o Django liga o health check do pool
+#   (ConnectionPool.check_connection) antes de entregar cada conexão.
+DB_POOL = os.getenv("DB_POOL", "false").lower() == "true"
+
 DATABASES = {
     "default": dj_database_url.config(
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600,
+        conn_max_age=0 if DB_POOL else 600,
+        conn_health_checks=True,
         ssl_require=not DEBUG,
     )
 }
 
+DB_POOL_OPTIONS = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    # segundos esperando uma conexão livre antes de erro
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+    # conexões ociosas acima do min_size são fechadas após max_idle
+    "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+    # recicla conexões antigas (evita cortes do servidor/proxy)
+    "max_lifetime": float(os.getenv("DB_POOL_MAX_LIFETIME", "3600")),
+    "name": os.getenv("DB_POOL_NAME", "gestiospro"),
+}
+
+# Réplica de leitura (opcional): listas, histórico e página pública leem
+# dela; escritas e leituras logo após uma escrita ficam no primário.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+if DATABASE_REPLICA_URL:
+    DATABASES["replica"] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=0 if DB_POOL else 600,
+        conn_health_checks=True,
+        ssl_require=not DEBUG,
+    )
+    # Nos testes a réplica aponta para o mesmo banco do primário
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["core.db.ReplicaRouter"]
+
+if DB_POOL:
+    for _db in DATABASES.values():
+        if _db["ENGINE"] == "django.db.backends.postgresql":
+            _db.setdefault("OPTIONS", {})["pool"] = dict(DB_POOL_OPTIONS)
+
+# Cache:
+# - Sem REDIS_URL: cache em memória do processo (dev / um único worker)
+# - Com REDIS_URL: cache compartilhado entre workers (invalidação vale para todos)
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Página pública da proposta: por quantos segundos um CDN/proxy pode servir
+# a cópia sem revalidar (o navegador sempre revalida via ETag).
+PROPOSTA_PUBLICA_CDN_MAX_AGE = int(os.getenv("PROPOSTA_PUBLICA_CDN_MAX_AGE", "60"))
+
+# Rastreamento do link público das propostas: os eventos ficam em buffer
+# na memória do processo e são gravados em lote (segundos entre gravações /
+# tamanho máximo do buffer). O histórico das propostas é gravado na hora.
+PROPOSTA_TRACKING_FLUSH_INTERVAL = float(os.getenv("PROPOSTA_TRACKING_FLUSH_INTERVAL", "5"))
+PROPOSTA_TRACKING_MAX_BUFFER = int(os.getenv("PROPOSTA_TRACKING_MAX_BUFFER", "500"))
+
+# Kanban ao vivo (Server-Sent Events, só sob ASGI): intervalo entre as
+# verificações de mudanças, intervalo do heartbeat e duração máxima de uma
+# conexão (o navegador reconecta sozinho), em segundos.
+PROPOSTA_AO_VIVO_INTERVALO = float(os.getenv("PROPOSTA_AO_VIVO_INTERVALO", "2"))
+PROPOSTA_AO_VIVO_HEARTBEAT = float(os.getenv("PROPOSTA_AO_VIVO_HEARTBEAT", "15"))
+PROPOSTA_AO_VIVO_DURACAO_MAXIMA = float(os.getenv("PROPOSTA_AO_VIVO_DURACAO_MAXIMA", "300"))
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -87,7 +186,39 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]  # se você tem essa pasta
 STATIC_ROOT = BASE_DIR / "staticfiles"    # para o collectstatic no deploy
-STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+
+# O collectstatic monta os bundles abaixo (arquivos concatenados e
+# minificados) e o WhiteNoise gera nomes com hash (servidos com cache
+# imutável) e as versões .br/.gz. Nos templates: {% static_bundle "nome" %},
+# que com STATIC_BUNDLES_ATIVOS=false inclui os arquivos separados.
+STATIC_BUNDLES = {
+    "css/base.min.css": [
+        "css/main.css",
+        "css/sidebar.css",
+        "css/global.css",
+        "css/configuracoes.css",
+        "css/cadastros.css",
+        "css/proposta.css",
+    ],
+    "css/login.min.css": ["css/global.css", "css/accounts_login.css"],
+    "js/main.min.js": ["js/main.js"],
+    "js/propostas.min.js": ["js/propostas.js"],
+    "js/contato.min.js": ["js/contato.js"],
+    "js/servico.min.js": ["js/servico.js"],
+    "js/usuarios.min.js": ["js/usuarios.js"],
+    "js/funcoes_gerais.min.js": ["js/funcoes_gerais.js"],
+}
+STATIC_BUNDLES_ATIVOS = os.getenv("STATIC_BUNDLES_ATIVOS", str(not DEBUG)).lower() == "true"
+
+# Uploads: nome pelo hash do conteúdo (core.armazenamento), sem gravar de
+# novo um arquivo que já existe. MEDIA_DEDUPLICADA=false usa o storage direto.
+MEDIA_DEDUPLICADA = os.getenv("MEDIA_DEDUPLICADA", "true").lower() == "true"
+MEDIA_BACKEND = "django.core.files.storage.FileSystemStorage"
+
+STORAGES = {
+    "default": {"BACKEND": MEDIA_BACKEND},
+    "staticfiles": {"BACKEND": "core.staticfiles.BundledStaticFilesStorage"},
+}
 
 # Media (uploads)
 MEDIA_URL = "/media/"
@@ -101,6 +232,11 @@ LOGIN_URL = "accounts:login"
 LOGIN_REDIRECT_URL = "core:home"
 LOGOUT_REDIRECT_URL = "accounts:login"
 
+# Upload direto do navegador para o storage (core.uploads): validade da
+# autorização e limite do modelo próprio de proposta
+UPLOAD_DIRETO_VALIDADE = 60 * 60
+MODELO_PROPRIO_MAX_MB = int(os.getenv("MODELO_PROPRIO_MAX_MB", "50"))
+
 # Spaces (DigitalOcean Spaces) / S3
 USE_S3 = os.getenv("USE_S3", "false").lower() == "true"
 
@@ -120,10 +256,8 @@ if USE_S3:
 
     # Storage padrão para uploads
     # Django 5+ (recomendado): configura o storage padrão via STORAGES
-    STORAGES = {
-        "default": {"BACKEND": "storages.backends.s3.S3Storage"},
-        "staticfiles": {"BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"},
-    }
+    MEDIA_BACKEND = "storages.backends.s3.S3Storage"
+    STORAGES["default"] = {"BACKEND": MEDIA_BACKEND}
 
     # (Opcional mas recomendado para evitar AccessDenied em objetos)
     AWS_DEFAULT_ACL = "public-read"
@@ -132,6 +266,12 @@ if USE_S3:
     # URLs públicas dos arquivos
     MEDIA_URL = f"https://{AWS_S3_CUSTOM_DOMAIN}/"
 
+if MEDIA_DEDUPLICADA:
+    STORAGES["default"] = {
+        "BACKEND": "core.armazenamento.ArmazenamentoDeduplicado",
+        "OPTIONS": {"backend": MEDIA_BACKEND},
+    }
+
 # (Opcional) Segurança extra em produção
 if not DEBUG:
     SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
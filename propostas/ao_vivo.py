@@ -0,0 +1,274 @@
+import asyncio
+import json
+import logging
+import weakref
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Max
+from django.template.loader import render_to_string
+
+from .models import Proposta
+
+
+logger = logging.getLogger(__name__)
+
+# Colunas do kanban (os demais status ficam no histórico)
+STATUS_QUADRO = ("rascunho", "em_andamento")
+
+# Janela relida a cada verificação: cobre transações que gravaram um
+# updated_at anterior ao cursor, mas só ficaram visíveis depois
+SOBREPOSICAO = timedelta(seconds=10)
+
+# Máximo de propostas enviadas por verificação (o resto vai na seguinte)
+MUDANCAS_POR_LOTE = 200
+
+# Lotes acumulados por conexão lenta antes de pedir para recarregar a página
+FILA_MAXIMA = 50
+
+
+# =========================================================
+# CONSULTAS (síncronas, chamadas via sync_to_async)
+# =========================================================
+
+def item_quadro(proposta):
+    """
+    {"id", "status", "versao"} da proposta e, se ela está no kanban, o card
+    já renderizado ("html").
+    """
+    item = {"id": proposta.pk, "status": proposta.status, "versao": proposta.updated_at.isoformat()}
+    if proposta.status in STATUS_QUADRO:
+        item["html"] = render_to_string("propostas/kanban_card.html", {"p": proposta})
+    return item
+
+
+def _alteradas_desde(empresa_id, desde):
+    qs = Proposta.objects.filter(company_id=empresa_id)
+    if desde is not None:
+        qs = qs.filter(updated_at__gt=desde)
+    return list(qs.select_related("cliente").order_by("updated_at", "pk")[:MUDANCAS_POR_LOTE])
+
+
+def _ids_no_quadro(empresa_id):
+    return set(
+        Proposta.objects.filter(company_id=empresa_id, status__in=STATUS_QUADRO).values_list(
+            "pk", flat=True
+        )
+    )
+
+
+def versoes_quadros(empresa_ids):
+    """
+    {empresa_id: (último updated_at, total de propostas)} em uma consulta ao
+    banco, para todas as empresas. Muda quando uma proposta é criada,
+    alterada (save() ou update em lote, que também grava updated_at) ou
+    excluída, em qualquer processo.
+    """
+    versoes = dict.fromkeys(empresa_ids)
+    linhas = (
+        Proposta.objects.filter(company_id__in=empresa_ids)
+        .values("company_id")
+        .annotate(ultima=Max("updated_at"), total=Count("pk"))
+        .order_by()
+    )
+    for linha in linhas:
+        versoes[linha["company_id"]] = (linha["ultima"], linha["total"])
+    return versoes
+
+
+def estado_inicial(empresa_id, versao):
+    ultima = (
+        Proposta.objects.filter(company_id=empresa_id)
+        .order_by("-updated_at")
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+    return {
+        "versao": versao,
+        "cursor": ultima,
+        "ids": _ids_no_quadro(empresa_id),
+        # pk -> updated_at já enviado (dentro da janela de sobreposição)
+        "enviados": {},
+    }
+
+
+def mudancas_quadro(empresa_id, estado):
+    """
+    Propostas da empresa alteradas desde a última verificação e as que
+    saíram do quadro (excluídas). Atualiza `estado` e retorna o lote a
+    publicar (ou None). Uma consulta por empresa, qualquer que seja o número
+    de quadros abertos.
+    """
+    cursor = estado["cursor"]
+    alteradas = _alteradas_desde(empresa_id, cursor - SOBREPOSICAO if cursor else None)
+
+    enviados = estado["enviados"]
+    novas = [p for p in alteradas if enviados.get(p.pk) != p.updated_at]
+    for proposta in novas:
+        enviados[proposta.pk] = proposta.updated_at
+    if alteradas:
+        estado["cursor"] = max(cursor or alteradas[-1].updated_at, alteradas[-1].updated_at)
+        limite = estado["cursor"] - SOBREPOSICAO
+        estado["enviados"] = {pk: quando for pk, quando in enviados.items() if quando > limite}
+
+    ids = _ids_no_quadro(empresa_id)
+    removidas = estado["ids"] - ids - {p.pk for p in novas}
+    estado["ids"] = ids
+
+    if not novas and not removidas:
+        return None
+    return {
+        "propostas": [item_quadro(p) for p in novas],
+        "removidas": sorted(removidas),
+        "cursor": estado["cursor"].isoformat() if estado["cursor"] else None,
+    }
+
+
+def mudancas_desde(empresa_id, desde):
+    """
+    Recuperação ao (re)conectar: tudo que mudou depois de `desde`
+    (Last-Event-ID). Exclusões nesse intervalo não são recuperadas.
+    """
+    alteradas = _alteradas_desde(empresa_id, desde)
+    if not alteradas:
+        return None
+    return {
+        "propostas": [item_quadro(p) for p in alteradas],
+        "removidas": [],
+        "cursor": alteradas[-1].updated_at.isoformat(),
+    }
+
+
+# =========================================================
+# CANAL (um por processo / event loop)
+# =========================================================
+
+class CanalPropostas:
+    """
+    Distribui as mudanças do kanban para os quadros abertos no processo.
+
+    Uma única tarefa verifica, a cada PROPOSTA_AO_VIVO_INTERVALO, a versão
+    das propostas de cada empresa com quadro aberto (versoes_quadros: uma
+    consulta agregada para todas). Vem do banco, e não do cache, para ver
+    também o que outros processos gravaram mesmo sem cache compartilhado.
+    Só as empresas cuja versão mudou buscam as propostas, e o resultado é
+    repassado a todas as conexões da empresa: mudanças no mesmo intervalo
+    chegam juntas, em um lote.
+    """
+
+    def __init__(self):
+        self._filas = defaultdict(set)
+        self._estado = {}
+        self._tarefa = None
+
+    async def assinar(self, empresa_id):
+        fila = asyncio.Queue(maxsize=FILA_MAXIMA)
+        if empresa_id not in self._estado:
+            versao = (await sync_to_async(versoes_quadros)([empresa_id]))[empresa_id]
+            estado = await sync_to_async(estado_inicial)(empresa_id, versao)
+            self._estado.setdefault(empresa_id, estado)
+        self._filas[empresa_id].add(fila)
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._rodar())
+        return fila
+
+    def cancelar(self, empresa_id, fila):
+        filas = self._filas.get(empresa_id)
+        if filas is None:
+            return
+        filas.discard(fila)
+        if not filas:
+            del self._filas[empresa_id]
+            self._estado.pop(empresa_id, None)
+
+    async def _rodar(self):
+        while self._filas:
+            await asyncio.sleep(settings.PROPOSTA_AO_VIVO_INTERVALO)
+            try:
+                await self._verificar()
+            except Exception:
+                logger.exception("Falha ao verificar mudanças do kanban")
+
+    async def _verificar(self):
+        empresas = list(self._filas)
+        if not empresas:
+            return
+        versoes = await sync_to_async(versoes_quadros)(empresas)
+        for empresa_id in empresas:
+            estado = self._estado.get(empresa_id)
+            if estado is None or versoes[empresa_id] == estado["versao"]:
+                continue
+            estado["versao"] = versoes[empresa_id]
+            lote = await sync_to_async(mudancas_quadro)(empresa_id, estado)
+            if lote is not None:
+                self._publicar(empresa_id, lote)
+
+    def _publicar(self, empresa_id, lote):
+        for fila in list(self._filas.get(empresa_id, ())):
+            try:
+                fila.put_nowait(lote)
+            except asyncio.QueueFull:
+                # Conexão não está consumindo: descarta o acumulado e pede recarga
+                while not fila.empty():
+                    fila.get_nowait()
+                fila.put_nowait({"recarregar": True})
+
+
+_canais = weakref.WeakKeyDictionary()
+
+
+def canal_atual():
+    """
+    Canal do event loop atual (cada worker ASGI tem o seu).
+    """
+    loop = asyncio.get_running_loop()
+    canal = _canais.get(loop)
+    if canal is None:
+        canal = _canais[loop] = CanalPropostas()
+    return canal
+
+
+# =========================================================
+# STREAM SSE
+# =========================================================
+
+def _evento_sse(lote):
+    linhas = []
+    if lote.get("cursor"):
+        linhas.append(f"id: {lote['cursor']}")
+    linhas.append("event: propostas")
+    linhas.append(f"data: {json.dumps(lote, ensure_ascii=False)}")
+    return "\n".join(linhas) + "\n\n"
+
+
+async def stream_quadro(empresa_id, desde=None):
+    """
+    Gerador assíncrono de eventos SSE do kanban da empresa. Termina depois
+    de PROPOSTA_AO_VIVO_DURACAO_MAXIMA segundos; o EventSource reconecta
+    enviando o Last-Event-ID.
+    """
+    canal = canal_atual()
+    fila = await canal.assinar(empresa_id)
+    loop = asyncio.get_running_loop()
+    fim = loop.time() + settings.PROPOSTA_AO_VIVO_DURACAO_MAXIMA
+    try:
+        yield "retry: 3000\n\n"
+        if desde is not None:
+            lote = await sync_to_async(mudancas_desde)(empresa_id, desde)
+            if lote is not None:
+                yield _evento_sse(lote)
+
+        while (restante := fim - loop.time()) > 0:
+            try:
+                lote = await asyncio.wait_for(
+                    fila.get(), timeout=min(settings.PROPOSTA_AO_VIVO_HEARTBEAT, restante)
+                )
+            except asyncio.TimeoutError:
+                # Comentário SSE: mantém a conexão viva em proxies
+                yield ": ping\n\n"
+                continue
+            yield _evento_sse(lote)
+    finally:
+        canal.cancelar(empresa_id, fila)
@@ -0,0 +1,95 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Proposta
+
+
+logger = logging.getLogger(__name__)
+
+# Lotes cheios que podem esperar no buffer enquanto o banco falha
+BUFFER_MAX_PENDENTES = 10
+
+
+class EventBuffer:
+    """
+    Buffer em memória (por processo) de eventos a gravar em lote.
+
+    `registrar` só adiciona o objeto à lista; uma thread em segundo plano
+    chama `gravar(eventos)` a cada PROPOSTA_TRACKING_FLUSH_INTERVAL segundos
+    ou quando o buffer atinge PROPOSTA_TRACKING_MAX_BUFFER eventos.
+
+    Se a gravação falhar, o lote volta para o buffer e é tentado de novo no
+    próximo ciclo (até BUFFER_MAX_PENDENTES lotes cheios; além disso os mais
+    antigos são descartados). Eventos ainda no buffer se perdem se o processo
+    morrer sem encerrar normalmente (no encerramento normal há um flush via
+    atexit): serve para contadores, não para histórico.
+    """
+
+    def __init__(self, gravar, nome):
+        self._gravar = gravar
+        self._nome = nome
+        self._eventos = []
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def registrar(self, evento):
+        with self._lock:
+            self._eventos.append(evento)
+            cheio = len(self._eventos) >= settings.PROPOSTA_TRACKING_MAX_BUFFER
+            if self._thread is None:
+                self._iniciar_thread()
+        if cheio:
+            self._acordar.set()
+
+    def _iniciar_thread(self):
+        self._thread = threading.Thread(target=self._loop, name=self._nome, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._acordar.wait(settings.PROPOSTA_TRACKING_FLUSH_INTERVAL)
+            self._acordar.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Falha ao gravar eventos (%s)", self._nome)
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        with self._lock:
+            eventos, self._eventos = self._eventos, []
+        if not eventos:
+            return 0
+        try:
+            self._gravar(eventos)
+        except Exception:
+            self._devolver(eventos)
+            raise
+        return len(eventos)
+
+    def _devolver(self, eventos):
+        limite = settings.PROPOSTA_TRACKING_MAX_BUFFER * BUFFER_MAX_PENDENTES
+        with self._lock:
+            self._eventos[:0] = eventos
+            descartados = len(self._eventos) - limite
+            if descartados > 0:
+                del self._eventos[:descartados]
+        if descartados > 0:
+            logger.warning("Buffer %s cheio: %d eventos antigos descartados", self._nome, descartados)
+
+
+def apenas_propostas_existentes(eventos):
+    """
+    Descarta eventos de propostas excluídas enquanto estavam no buffer
+    (senão a chave estrangeira derruba o lote inteiro).
+    """
+    ids = {ev.proposta_id for ev in eventos}
+    existentes = set(Proposta.objects.filter(pk__in=ids).values_list("pk", flat=True))
+    return [ev for ev in eventos if ev.proposta_id in existentes]
@@ -0,0 +1,350 @@
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from core.managers import adiar_invalidacao_tenant
+from core.models import CategoriaServico, Contato, Empresa, PropostaConfiguracao, Servico, User
+
+from .models import Captacao, Proposta, PropostaItem
+from .rollups import recalcular_rollups, rollup_manual
+
+
+# =========================================================
+# DADOS DE TESTE DE CARGA (gerar_dados_carga / loadtest_endpoints)
+# =========================================================
+# Empresas geradas têm o nome começando com MARCADOR (é por ele que
+# --limpar as encontra) e um usuário owner "<prefixo><n>". O usuário só tem
+# senha se ela for informada na geração (--senha); sem ela não há como
+# entrar pelo login, e o loadtest_endpoints usa force_login.
+
+MARCADOR = "[carga] "
+PREFIXO_PADRAO = "carga"
+
+# Distribuição de status (pesos) das propostas geradas
+PESOS_STATUS = {
+    "rascunho": 15,
+    "em_andamento": 25,
+    "aprovado": 30,
+    "rejeitado": 15,
+    "arquivado": 15,
+}
+
+PALAVRAS = (
+    "serviço projeto execução entrega cliente prazo escopo etapa relatório "
+    "análise vistoria laudo técnico instalação manutenção preventiva corretiva "
+    "elétrica hidráulica estrutural documentação aprovação responsável obra "
+    "equipe material medição cronograma garantia suporte treinamento revisão "
+    "levantamento orçamento memorial descritivo especificação normas vigentes"
+).split()
+
+CIDADES = (
+    ("São Paulo", "SP"),
+    ("Campinas", "SP"),
+    ("Rio de Janeiro", "RJ"),
+    ("Belo Horizonte", "MG"),
+    ("Curitiba", "PR"),
+    ("Porto Alegre", "RS"),
+    ("Salvador", "BA"),
+    ("Recife", "PE"),
+    ("Goiânia", "GO"),
+    ("Florianópolis", "SC"),
+)
+
+CAPTACOES = ("Indicação", "Site", "Instagram", "Google", "Feira", "Parceiro", "Prospecção ativa", "WhatsApp")
+
+# Numeração configurada em parte das empresas (exercita _gerar_numero_proposta)
+NUMERO_CONFIG = [
+    {"prefixo": "P-", "param": "numero", "sufixo": ""},
+    {"prefixo": "/", "param": "ano", "sufixo": ""},
+]
+
+
+def texto_aleatorio(rnd, minimo, maximo):
+    """
+    Texto com tamanho entre `minimo` e `maximo` caracteres, em frases.
+    """
+    alvo = rnd.randint(minimo, maximo)
+    frases = []
+    tamanho = 0
+    while tamanho < alvo:
+        frase = " ".join(rnd.choice(PALAVRAS) for _ in range(rnd.randint(6, 18)))
+        frase = frase.capitalize() + "."
+        frases.append(frase)
+        tamanho += len(frase) + 1
+    return " ".join(frases)[:maximo]
+
+
+def _tamanho(rnd, media, minimo=1):
+    """
+    Tamanho com cauda longa (lognormal com a média pedida): poucas empresas
+    grandes, muitas pequenas.
+    """
+    sigma = 1.0
+    mu = math.log(max(media, 1)) - sigma**2 / 2
+    return max(minimo, int(rnd.lognormvariate(mu, sigma)))
+
+
+def _valor(rnd, minimo, maximo):
+    return Decimal(rnd.randint(minimo * 100, maximo * 100)) / 100
+
+
+def _itens(rnd, servicos):
+    """
+    Itens no formato gravado pelo formulário (static/js/propostas.js):
+    serviços do catálogo e alguns personalizados.
+    """
+    itens = []
+    for _ in range(min(1 + int(rnd.expovariate(1 / 3)), 25)):
+        if servicos and rnd.random() < 0.8:
+            servico = rnd.choice(servicos)
+            valor = (servico.valor * Decimal(rnd.uniform(0.8, 1.3))).quantize(Decimal("0.01"))
+            itens.append(
+                {
+                    "tipo": "catalogo",
+                    "servico_id": servico.pk,
+                    "nome": servico.descricao,
+                    "quantidade": 1,
+                    "valor_unit": float(valor),
+                    "valor": float(valor),
+                    "entregaveis_texto": servico.entregaveis or "",
+                }
+            )
+        else:
+            valor = _valor(rnd, 200, 20000)
+            itens.append(
+                {
+                    "tipo": "personalizado",
+                    "nome": texto_aleatorio(rnd, 20, 80),
+                    "quantidade": 1,
+                    "valor_unit": float(valor),
+                    "valor": float(valor),
+                    "entregaveis_texto": texto_aleatorio(rnd, 50, 400),
+                }
+            )
+    return itens
+
+
+def _parcelas(rnd, total):
+    qtd = rnd.choice((1, 1, 2, 3, 4, 6, 10))
+    valor = (total / qtd).quantize(Decimal("0.01"))
+    parcelas = []
+    for i in range(qtd):
+        parcela = valor if i < qtd - 1 else total - valor * (qtd - 1)
+        parcelas.append(
+            {
+                "numero": f"{i + 1}/{qtd}",
+                "percentual": round(100 / qtd, 2),
+                "valor": float(parcela),
+                "marco": "Na autorização para início dos serviços" if i == 0 else f"em {30 * i} dias",
+            }
+        )
+    return parcelas
+
+
+def gerar_empresa(indice, rnd, opts, senha_hash):
+    """
+    Cria uma empresa completa (usuário, catálogo, contatos, captações e
+    propostas) com bulk_create. Retorna a contagem do que foi criado.
+    """
+    prefixo = opts["prefixo"]
+    agora = timezone.now()
+    cidade, uf = rnd.choice(CIDADES)
+
+    with transaction.atomic():
+        empresa = Empresa.objects.create(
+            nome_fantasia=f"{MARCADOR}{prefixo} {indice}",
+            razao_social=f"{prefixo.title()} {indice} Serviços Técnicos Ltda",
+            email=f"{prefixo}{indice}@example.com",
+            cidade=cidade,
+            uf=uf,
+            exclusoes_padrao=texto_aleatorio(rnd, 300, 1200),
+            declaracoes_padrao=texto_aleatorio(rnd, 300, 1200),
+            termo_confidencialidade_padrao=texto_aleatorio(rnd, 500, 2000),
+            agradecimentos_padrao=texto_aleatorio(rnd, 100, 400),
+        )
+        if rnd.random() < 0.5:
+            PropostaConfiguracao.objects.create(
+                empresa=empresa,
+                numero_auto_iniciar=rnd.choice((1, 100, 1000)),
+                numero_config=NUMERO_CONFIG,
+                exclusoes=texto_aleatorio(rnd, 300, 1200),
+                declaracoes=texto_aleatorio(rnd, 300, 1200),
+            )
+        User.objects.create(
+            username=f"{prefixo}{indice}",
+            email=f"{prefixo}{indice}@example.com",
+            password=senha_hash,
+            empresa=empresa,
+            user_type="owner",
+            can_manage_propostas=True,
+            can_manage_definicoes=True,
+            can_manage_propostas_definicoes=True,
+            can_manage_usuarios=True,
+        )
+
+        n_propostas = _tamanho(rnd, opts["propostas"])
+        n_contatos = _tamanho(rnd, opts["contatos"]) + n_propostas // 10
+        n_servicos = _tamanho(rnd, opts["servicos"])
+
+        categorias = CategoriaServico.objects.bulk_create(
+            CategoriaServico(empresa=empresa, nome=f"Categoria {n + 1}")
+            for n in range(rnd.randint(2, 8))
+        )
+        servicos = Servico.objects.bulk_create(
+            (
+                Servico(
+                    empresa=empresa,
+                    descricao=texto_aleatorio(rnd, 15, 60),
+                    categoria=rnd.choice(categorias) if rnd.random() < 0.9 else None,
+                    entregaveis=texto_aleatorio(rnd, 100, 800),
+                    valor=_valor(rnd, 150, 25000),
+                )
+                for _ in range(n_servicos)
+            ),
+            batch_size=1000,
+        )
+        contatos = Contato.objects.bulk_create(
+            (
+                Contato(
+                    empresa=empresa,
+                    nome_fantasia=f"Cliente {n + 1} {rnd.choice(PALAVRAS).title()}",
+                    razao_social=f"Cliente {n + 1} Ltda",
+                    email=f"cliente{n + 1}@example.com",
+                    cidade=cidade,
+                    uf=uf,
+                    observacao=texto_aleatorio(rnd, 0, 300),
+                )
+                for n in range(n_contatos)
+            ),
+            batch_size=1000,
+        )
+        captacoes = Captacao.objects.bulk_create(
+            Captacao(company=empresa, nome=nome) for nome in rnd.sample(CAPTACOES, rnd.randint(2, len(CAPTACOES)))
+        )
+
+        # Clientes frequentes: metade das propostas vai para 10% dos contatos
+        frequentes = contatos[: max(1, len(contatos) // 10)]
+        status = list(PESOS_STATUS)
+        pesos = list(PESOS_STATUS.values())
+
+        propostas = []
+        for seq in range(1, n_propostas + 1):
+            criada = agora - timedelta(seconds=rnd.randint(0, opts["dias"] * 86400))
+            itens = _itens(rnd, servicos)
+            proposta = Proposta(
+                company=empresa,
+                numero=str(seq),
+                sequencia_int=seq,
+                titulo_servico=texto_aleatorio(rnd, 20, 120),
+                data_servico=criada.date(),
+                validade=criada.date() + timedelta(days=rnd.choice((15, 30, 60))),
+                captacao=rnd.choice(captacoes) if rnd.random() < 0.7 else None,
+                status=rnd.choices(status, pesos)[0],
+                cliente=rnd.choice(frequentes if rnd.random() < 0.5 else contatos),
+                cidade=cidade,
+                uf=uf,
+                itens=itens,
+                desconto_modo=rnd.choice(("valor", "percentual")),
+                desconto_input=Decimal(rnd.choice((0, 0, 0, 5, 10))),
+                objetivo_texto=texto_aleatorio(rnd, 200, 1500),
+                escopo_texto=texto_aleatorio(rnd, 500, 4000),
+                exclusos_texto=texto_aleatorio(rnd, 200, 1500),
+                declaracoes_texto=texto_aleatorio(rnd, 200, 1500),
+                confidencialidade_texto=texto_aleatorio(rnd, 300, 2000),
+                assinatura_texto=texto_aleatorio(rnd, 20, 100),
+                prazo_inicio_texto=texto_aleatorio(rnd, 20, 100),
+                prazo_entrega_texto=texto_aleatorio(rnd, 20, 100),
+                investimentos_texto=texto_aleatorio(rnd, 100, 600),
+                visualizacoes_count=rnd.randint(0, 30),
+            )
+            proposta.calcular_totais()
+            proposta.parcelas = _parcelas(rnd, proposta.total)
+            proposta._criada = criada
+            propostas.append(proposta)
+
+        # bulk_create não dispara os sinais: rollup e índice de itens são
+        # montados aqui, uma vez por empresa
+        with rollup_manual(), adiar_invalidacao_tenant():
+            Proposta.objects.bulk_create(propostas, batch_size=500)
+            # created_at é auto_now_add: a data espalhada entra depois
+            for proposta in propostas:
+                proposta.created_at = proposta._criada
+                proposta.updated_at = proposta._criada + timedelta(hours=rnd.randint(0, 240))
+            Proposta.objects.bulk_update(propostas, ["created_at", "updated_at"], batch_size=500)
+
+            categoria_por_servico = {s.pk: s.categoria_id for s in servicos}
+            PropostaItem.objects.bulk_create(
+                (
+                    PropostaItem(
+                        company=empresa,
+                        proposta=proposta,
+                        posicao=posicao,
+                        servico_id=item.get("servico_id"),
+                        categoria_id=categoria_por_servico.get(item.get("servico_id")),
+                        descricao=item["nome"][:255],
+                        valor=Decimal(str(item["valor"])),
+                    )
+                    for proposta in propostas
+                    for posicao, item in enumerate(proposta.itens)
+                ),
+                batch_size=1000,
+            )
+            recalcular_rollups(empresa.pk)
+
+    return {
+        "contatos": len(contatos),
+        "servicos": len(servicos),
+        "propostas": len(propostas),
+    }
+
+
+def gerar_dados_carga(opts, progresso=None):
+    """
+    Gera `opts["empresas"]` empresas a partir da semente `opts["seed"]`
+    (mesma semente e parâmetros = mesmos dados).
+    """
+    # Sem senha: make_password(None) gera uma senha inutilizável
+    senha_hash = make_password(opts.get("senha"))
+    inicio = Empresa.objects.filter(nome_fantasia__startswith=f"{MARCADOR}{opts['prefixo']} ").count()
+    totais = {"empresas": 0, "contatos": 0, "servicos": 0, "propostas": 0}
+    for n in range(opts["empresas"]):
+        indice = inicio + n + 1
+        # Uma semente por empresa: gerar mais empresas depois não muda as já geradas
+        rnd = random.Random(f"{opts['seed']}:{indice}")
+        criados = gerar_empresa(indice, rnd, opts, senha_hash)
+        totais["empresas"] += 1
+        for chave, qtd in criados.items():
+            totais[chave] += qtd
+        if progresso:
+            progresso(indice, criados)
+    return totais
+
+
+def limpar_dados_carga(prefixo):
+    """
+    Exclui as empresas geradas com `prefixo` (e tudo que é delas).
+    Retorna quantas empresas foram excluídas.
+    """
+    empresas = Empresa.objects.filter(nome_fantasia__startswith=f"{MARCADOR}{prefixo} ")
+    pks = list(empresas.values_list("pk", flat=True))
+    with transaction.atomic(), rollup_manual(), adiar_invalidacao_tenant():
+        # Propostas antes: Proposta.cliente protege os contatos da cascata.
+        # O rollup das empresas excluídas sai junto, em cascata
+        Proposta.objects.filter(company_id__in=pks).delete()
+        Empresa.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def usuarios_de_carga(prefixo):
+    return list(
+        User.objects.filter(
+            empresa__nome_fantasia__startswith=f"{MARCADOR}{prefixo} ", username__startswith=prefixo
+        )
+        .order_by("pk")
+        .values_list("username", "empresa_id")
+    )
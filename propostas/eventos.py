@@ -0,0 +1,47 @@
+from django.utils import timezone
+
+from .models import PropostaEvento
+from .revisoes import criar_revisao
+
+
+# Evento gerado quando a proposta entra em cada status
+EVENTO_POR_STATUS = {
+    "aprovado": "aprovada",
+    "rejeitado": "rejeitada",
+    "arquivado": "arquivada",
+}
+
+# Eventos que congelam o conteúdo atual da proposta em uma revisão
+EVENTOS_COM_REVISAO = {"enviada", "aprovada", "revisao_solicitada"}
+
+
+def registrar_evento_proposta(proposta, tipo, usuario=None, origem="interno"):
+    """
+    Acrescenta um evento ao histórico da proposta. Gravado na hora, na mesma
+    transação da alteração (como nas ações em lote): o funil depende de
+    nenhum evento se perder. A revisão (envio, aprovação, pedido de revisão)
+    vai junto, com o conteúdo de `proposta`.
+    """
+    PropostaEvento.objects.create(
+        company_id=proposta.company_id,
+        proposta_id=proposta.pk,
+        tipo=tipo,
+        origem=origem,
+        usuario_id=getattr(usuario, "pk", None),
+        created_at=timezone.now(),
+    )
+    if tipo in EVENTOS_COM_REVISAO:
+        criar_revisao(proposta, tipo, usuario)
+
+
+def eventos_mudanca_status(status_anterior, status_novo):
+    """
+    Eventos correspondentes a uma troca de status feita pela equipe
+    (formulário ou kanban). Rascunho -> em andamento conta como envio.
+    """
+    if status_anterior == status_novo:
+        return []
+    if status_novo == "em_andamento" and status_anterior == "rascunho":
+        return ["enviada"]
+    tipo = EVENTO_POR_STATUS.get(status_novo)
+    return [tipo] if tipo else []
@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.models import Empresa, PropostaConfiguracao
+
+from .lote import mudar_status_em_lote
+from .models import Proposta
+
+
+# Status de destino das propostas vencidas (aparecem no histórico)
+STATUS_EXPIRADA = "arquivado"
+
+EXPIRACAO_LOTE_PADRAO = 500
+
+
+def _padrao(campo):
+    return PropostaConfiguracao._meta.get_field(campo).default
+
+
+@dataclass(frozen=True)
+class PoliticaExpiracao:
+    empresa_id: int
+    ativa: bool
+    dias_tolerancia: int
+    incluir_rascunhos: bool
+
+    @property
+    def status_origem(self):
+        return ("em_andamento", "rascunho") if self.incluir_rascunhos else ("em_andamento",)
+
+    def limite(self, hoje):
+        """
+        Propostas com validade anterior a esta data estão vencidas.
+        """
+        return hoje - timedelta(days=self.dias_tolerancia)
+
+
+def politicas_expiracao(empresa_id=None):
+    """
+    Política de cada empresa (as que nunca salvaram as definições de
+    propostas usam os padrões do model).
+    """
+    configs = PropostaConfiguracao.objects.values(
+        "empresa_id", "expirar_vencidas", "expirar_apos_dias", "expirar_rascunhos"
+    )
+    empresas = Empresa.objects.order_by("pk").values_list("pk", flat=True)
+    if empresa_id is not None:
+        configs = configs.filter(empresa_id=empresa_id)
+        empresas = empresas.filter(pk=empresa_id)
+
+    por_empresa = {c["empresa_id"]: c for c in configs}
+    for pk in empresas:
+        config = por_empresa.get(pk, {})
+        yield PoliticaExpiracao(
+            empresa_id=pk,
+            ativa=config.get("expirar_vencidas", _padrao("expirar_vencidas")),
+            dias_tolerancia=config.get("expirar_apos_dias", _padrao("expirar_apos_dias")),
+            incluir_rascunhos=config.get("expirar_rascunhos", _padrao("expirar_rascunhos")),
+        )
+
+
+def propostas_vencidas(politica, hoje):
+    return Proposta.objects.filter(
+        company_id=politica.empresa_id,
+        status__in=politica.status_origem,
+        validade__lt=politica.limite(hoje),
+    )
+
+
+def expirar_propostas(politica, hoje=None, lote=EXPIRACAO_LOTE_PADRAO):
+    """
+    Arquiva todas as propostas vencidas da empresa, um UPDATE por lote (cada
+    lote na sua própria transação). Retorna o total arquivado.
+
+    Execuções simultâneas (cron sobreposto) dividem o trabalho: as linhas
+    travadas por uma ficam de fora do lote da outra (SKIP LOCKED).
+    """
+    if not politica.ativa:
+        return 0
+    hoje = hoje or timezone.localdate()
+
+    total = 0
+    while True:
+        arquivadas = mudar_status_em_lote(
+            propostas_vencidas(politica, hoje),
+            STATUS_EXPIRADA,
+            origem="sistema",
+            limite=lote,
+            pular_travadas=True,
+        )
+        if not arquivadas:
+            break
+        total += len(arquivadas)
+    return total
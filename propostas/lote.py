@@ -0,0 +1,129 @@
+import uuid
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.managers import adiar_invalidacao_tenant, invalidate_tenant_query_cache
+
+from .eventos import EVENTOS_COM_REVISAO, eventos_mudanca_status
+from .models import Proposta, PropostaEvento
+from .revisoes import criar_revisao
+from .rollups import CAMPOS_ROLLUP, chave_rollup, mover_rollups, rollup_manual
+
+
+# =========================================================
+# AÇÕES EM LOTE (kanban, expiração)
+# =========================================================
+# update()/delete() em massa não passam pelo save() nem pelos sinais de
+# save: updated_at, rollup, histórico e cache da empresa são mantidos aqui,
+# uma vez por lote.
+
+def _invalidar_apos_commit(empresas):
+    for empresa_id in empresas:
+        transaction.on_commit(lambda e=empresa_id: invalidate_tenant_query_cache(e))
+
+
+def mudar_status_em_lote(propostas, novo_status, usuario=None, origem="interno", limite=None, pular_travadas=False):
+    """
+    Passa as propostas do queryset para `novo_status` com um único UPDATE.
+    Retorna {pk: status_anterior} das que mudaram.
+
+    As linhas ficam travadas até o fim da transação (com `pular_travadas`,
+    as que outra transação já travou ficam de fora: SKIP LOCKED). O UPDATE
+    repete o filtro de `propostas`, então uma proposta que saiu dele no meio
+    do caminho não é tocada.
+    """
+    propostas = propostas.exclude(status=novo_status)
+    with transaction.atomic():
+        qs = propostas.order_by("pk")
+        if connection.features.has_select_for_update:
+            if pular_travadas and connection.features.has_select_for_update_skip_locked:
+                qs = qs.select_for_update(skip_locked=True)
+            else:
+                qs = qs.select_for_update()
+        qs = qs.values("pk", *CAMPOS_ROLLUP)
+        if limite is not None:
+            qs = qs[:limite]
+        chaves = {row.pop("pk"): chave_rollup(Proposta(**row)) for row in qs}
+        if not chaves:
+            return {}
+
+        agora = timezone.now()
+        alteradas = propostas.filter(pk__in=chaves).update(status=novo_status, updated_at=agora)
+        if alteradas != len(chaves):
+            # Sem trava de linha (SQLite): confere quais foram de fato alteradas
+            pks = set(
+                Proposta.objects.filter(
+                    pk__in=chaves, status=novo_status, updated_at=agora
+                ).values_list("pk", flat=True)
+            )
+            chaves = {pk: chave for pk, chave in chaves.items() if pk in pks}
+
+        mover_rollups(
+            (chave, chave[:2] + (novo_status,) + chave[3:])
+            for chave in chaves.values()
+            if chave is not None
+        )
+
+        eventos = []
+        com_revisao = {}
+        for pk, chave in chaves.items():
+            for tipo in eventos_mudanca_status(chave[2], novo_status):
+                eventos.append(
+                    PropostaEvento(
+                        company_id=chave[0],
+                        proposta_id=pk,
+                        tipo=tipo,
+                        origem=origem,
+                        usuario_id=getattr(usuario, "pk", None),
+                        created_at=agora,
+                    )
+                )
+                if tipo in EVENTOS_COM_REVISAO:
+                    com_revisao[pk] = tipo
+        PropostaEvento.objects.bulk_create(eventos, batch_size=500)
+
+        # Envio / aprovação congelam o conteúdo (já com o status novo)
+        for proposta in Proposta.objects.filter(pk__in=com_revisao):
+            criar_revisao(proposta, com_revisao[proposta.pk], usuario)
+
+        _invalidar_apos_commit({chave[0] for chave in chaves.values()})
+
+    return {pk: chave[2] for pk, chave in chaves.items()}
+
+
+def excluir_em_lote(propostas):
+    """
+    Exclui as propostas do queryset (e o que depende delas) em uma
+    transação. Retorna os pks excluídos.
+    """
+    with transaction.atomic():
+        chaves = {
+            row.pop("pk"): chave_rollup(Proposta(**row))
+            for row in propostas.values("pk", *CAMPOS_ROLLUP)
+        }
+        if not chaves:
+            return []
+        # O delete em cascata ainda dispara os sinais objeto a objeto: o
+        # rollup vai em um passo só e o cache da empresa é invalidado uma vez
+        with rollup_manual(), adiar_invalidacao_tenant():
+            Proposta.objects.filter(pk__in=chaves).delete()
+        mover_rollups((chave, None) for chave in chaves.values() if chave is not None)
+    return list(chaves)
+
+
+def regenerar_tokens_em_lote(propostas):
+    """
+    Novo link público para cada proposta do queryset (o anterior deixa de
+    funcionar). Um UPDATE por lote via bulk_update. Retorna {pk: token}.
+    """
+    with transaction.atomic():
+        agora = timezone.now()
+        objs = [
+            Proposta(pk=pk, company_id=company_id, public_token=uuid.uuid4(), updated_at=agora)
+            for pk, company_id in propostas.values_list("pk", "company_id")
+        ]
+        # updated_at junto: muda a versão da página pública e do kanban
+        Proposta.objects.bulk_update(objs, ["public_token", "updated_at"], batch_size=500)
+        _invalidar_apos_commit({p.company_id for p in objs})
+    return {p.pk: p.public_token for p in objs}
@@ -0,0 +1,305 @@
+import argparse
+import itertools
+import json
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from core.models import Contato, Empresa, PropostaConfiguracao
+from propostas.carga import PALAVRAS, texto_aleatorio
+from propostas.models import Proposta
+from propostas.pdf import ETAPAS_PDF, MedicaoPdf
+
+
+# Tamanho dos textos longos da proposta (escopo, declarações etc.), em caracteres
+TEXTOS = {
+    "curto": 500,
+    "longo": 30_000,
+}
+
+# Imagem da empresa: (campo, largura x altura em px); PNG de ruído, que não
+# comprime. O papel timbrado é o das Definições de propostas (A4 a 150 dpi).
+IMAGENS = {
+    "nenhuma": None,
+    "logo": ("logo", (400, 200)),
+    "logo_grande": ("logo", (3000, 1500)),
+    "papel_timbrado": ("papel_timbrado", (1240, 1754)),
+}
+
+CAMPOS_TEXTO = (
+    "objetivo_texto",
+    "escopo_texto",
+    "exclusos_texto",
+    "declaracoes_texto",
+    "confidencialidade_texto",
+    "investimentos_texto",
+)
+
+
+def _lista(texto, validos=None):
+    valores = [v.strip() for v in texto.split(",") if v.strip()]
+    if validos is not None:
+        invalidos = [v for v in valores if v not in validos]
+        if invalidos:
+            raise CommandError(f"Valores inválidos: {', '.join(invalidos)} (válidos: {', '.join(validos)}).")
+    return valores
+
+
+def _rss_mb():
+    # ru_maxrss: KB no Linux, bytes no macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _versao_weasyprint():
+    try:
+        import weasyprint
+    except ImportError:
+        return None
+    return getattr(weasyprint, "__version__", None)
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark do PDF da proposta (propostas/proposta_publica_pdf.html): "
+        "renderiza propostas sintéticas variando número de itens, tamanho dos "
+        "textos e imagens (logo, papel timbrado), e mede tempo (por etapa), pico de RSS e tamanho do "
+        "arquivo. Cada caso roda em um processo próprio (o pico de RSS é do "
+        "caso); nada fica gravado no banco. Resultados em JSON para comparar "
+        "entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--itens", default="1,10,100,500", help="Números de itens.")
+        parser.add_argument(
+            "--textos", default=",".join(TEXTOS), help=f"Tamanhos de texto ({', '.join(TEXTOS)})."
+        )
+        parser.add_argument(
+            "--imagens", default=",".join(IMAGENS), help=f"Variações de imagem ({', '.join(IMAGENS)})."
+        )
+        parser.add_argument("--repeticoes", type=int, default=3, help="Renderizações por caso.")
+        parser.add_argument("--seed", default="gestiospro")
+        parser.add_argument("--json", dest="saida_json", help="Grava os resultados neste arquivo.")
+        parser.add_argument(
+            "--comparar",
+            help="JSON de uma execução anterior: mostra a variação da mediana por caso.",
+        )
+        # Uso interno: executa um único caso e imprime o resultado em JSON
+        parser.add_argument("--caso", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **opts):
+        if opts["caso"]:
+            caso = json.loads(opts["caso"])
+            self.stdout.write(json.dumps(self._rodar_caso(caso, opts["repeticoes"], opts["seed"])))
+            return
+
+        itens = [int(v) for v in _lista(opts["itens"])]
+        casos = [
+            {"itens": n, "texto": texto, "imagem": imagem}
+            for n, texto, imagem in itertools.product(
+                itens, _lista(opts["textos"], TEXTOS), _lista(opts["imagens"], IMAGENS)
+            )
+        ]
+
+        resultados = []
+        self.stdout.write(
+            f"{'itens':>5} {'texto':<6} {'imagem':<14} {'pág':>4} {'mediana ms':>11} "
+            f"{'min ms':>8} {'1ª ms':>8} {'RSS MB':>7} {'+RSS MB':>8} {'KB':>8}"
+        )
+        for caso in casos:
+            resultado = self._em_subprocesso(caso, opts)
+            resultados.append(resultado)
+            self.stdout.write(
+                f"{caso['itens']:>5} {caso['texto']:<6} {caso['imagem']:<14} {resultado['paginas']:>4} "
+                f"{resultado['mediana_ms']:>11.1f} {resultado['min_ms']:>8.1f} "
+                f"{resultado['primeira_ms']:>8.1f} {resultado['pico_rss_mb']:>7.1f} "
+                f"{resultado['rss_render_mb']:>8.1f} {resultado['bytes'] / 1024:>8.1f}"
+            )
+
+        if opts["saida_json"]:
+            with open(opts["saida_json"], "w", encoding="utf-8") as arquivo:
+                json.dump(
+                    {
+                        "data": datetime.now().isoformat(timespec="seconds"),
+                        "commit": _commit_atual(),
+                        "python": platform.python_version(),
+                        "weasyprint": _versao_weasyprint(),
+                        "repeticoes": opts["repeticoes"],
+                        "seed": opts["seed"],
+                        "casos": resultados,
+                    },
+                    arquivo,
+                    indent=2,
+                    ensure_ascii=False,
+                )
+            self.stdout.write(f"Resultados gravados em {opts['saida_json']}.")
+
+        if opts["comparar"]:
+            self._comparar(resultados, opts["comparar"])
+
+    def _em_subprocesso(self, caso, opts):
+        comando = [
+            sys.executable,
+            str(Path(settings.BASE_DIR) / "manage.py"),
+            "benchmark_pdf",
+            "--caso",
+            json.dumps(caso),
+            "--repeticoes",
+            str(opts["repeticoes"]),
+            "--seed",
+            opts["seed"],
+        ]
+        processo = subprocess.run(comando, capture_output=True, text=True)
+        if processo.returncode != 0:
+            raise CommandError(f"Falha no caso {caso}:\n{processo.stderr}")
+        return json.loads(processo.stdout.strip().splitlines()[-1])
+
+    # =========================================================
+    # UM CASO (no processo filho)
+    # =========================================================
+
+    def _rodar_caso(self, caso, repeticoes, seed):
+        from propostas.views import _renderizar_pdf
+
+        rnd = random.Random(f"{seed}:{caso['itens']}:{caso['texto']}:{caso['imagem']}")
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            # Imagens gravadas em disco temporário e lidas de lá pelo WeasyPrint
+            # (file://), mesmo com USE_S3: sem servidor nem upload
+            STORAGES={
+                **settings.STORAGES,
+                "default": {
+                    "BACKEND": "django.core.files.storage.FileSystemStorage",
+                    "OPTIONS": {"location": media, "base_url": Path(media).as_uri() + "/"},
+                },
+            },
+        ), transaction.atomic():
+            proposta, empresa = self._dados(caso, rnd)
+            rss_antes = _rss_mb()
+
+            tempos = []
+            etapas = {nome: [] for nome in ETAPAS_PDF}
+            for _ in range(max(1, repeticoes)):
+                medicao = MedicaoPdf()
+                inicio = time.perf_counter()
+                pdf_file = _renderizar_pdf(request, proposta, empresa, medicao=medicao)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                for nome in ETAPAS_PDF:
+                    etapas[nome].append(medicao.etapas.get(nome, 0.0))
+
+            # Nada do caso fica no banco
+            transaction.set_rollback(True)
+
+        pico = _rss_mb()
+        return {
+            **caso,
+            "paginas": medicao.paginas,
+            "bytes": len(pdf_file),
+            "primeira_ms": round(tempos[0], 2),
+            "mediana_ms": round(statistics.median(tempos), 2),
+            "min_ms": round(min(tempos), 2),
+            "max_ms": round(max(tempos), 2),
+            "etapas_mediana_ms": {nome: round(statistics.median(v), 2) for nome, v in etapas.items()},
+            "pico_rss_mb": round(pico, 1),
+            "rss_render_mb": round(pico - rss_antes, 1),
+        }
+
+    def _dados(self, caso, rnd):
+        empresa = Empresa.objects.create(
+            nome_fantasia="[benchmark] PDF",
+            razao_social="Benchmark Serviços Técnicos Ltda",
+            cidade="São Paulo",
+            uf="SP",
+        )
+        if IMAGENS[caso["imagem"]]:
+            from PIL import Image
+
+            campo, (largura, altura) = IMAGENS[caso["imagem"]]
+            imagem = Image.frombytes("RGB", (largura, altura), rnd.randbytes(largura * altura * 3))
+            arquivo = tempfile.SpooledTemporaryFile()
+            imagem.save(arquivo, format="PNG")
+            arquivo.seek(0)
+            conteudo = ContentFile(arquivo.read())
+            if campo == "logo":
+                empresa.logo.save("logo.png", conteudo, save=True)
+            else:
+                config = PropostaConfiguracao(empresa=empresa)
+                config.papel_timbrado.save("papel_timbrado.png", conteudo, save=True)
+
+        cliente = Contato.objects.create(empresa=empresa, nome_fantasia="Cliente benchmark")
+        itens = [
+            {
+                "tipo": "personalizado",
+                "nome": " ".join(rnd.choice(PALAVRAS) for _ in range(rnd.randint(3, 10))),
+                "quantidade": 1,
+                "valor_unit": 1000 + n,
+                "valor": 1000 + n,
+            }
+            for n in range(caso["itens"])
+        ]
+        proposta = Proposta(
+            company=empresa,
+            cliente=cliente,
+            numero="BENCH-1",
+            titulo_servico="Benchmark de PDF",
+            itens=itens,
+            parcelas=[{"numero": "1/1", "percentual": 100, "valor": 0, "marco": "Na aprovação"}],
+            desconto_input=Decimal("0"),
+        )
+        tamanho = TEXTOS[caso["texto"]]
+        for campo in CAMPOS_TEXTO:
+            setattr(proposta, campo, texto_aleatorio(rnd, tamanho, tamanho))
+        proposta.calcular_totais()
+        proposta.save()
+        return proposta, empresa
+
+    def _comparar(self, resultados, caminho):
+        with open(caminho, encoding="utf-8") as arquivo:
+            anteriores = {
+                (c["itens"], c["texto"], c["imagem"]): c for c in json.load(arquivo)["casos"]
+            }
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'itens':>5} {'texto':<6} {'imagem':<14} {'antes ms':>9} {'agora ms':>9} {'variação':>9}"
+        )
+        for r in resultados:
+            antes = anteriores.get((r["itens"], r["texto"], r["imagem"]))
+            if not antes or not antes["mediana_ms"]:
+                continue
+            variacao = (r["mediana_ms"] - antes["mediana_ms"]) / antes["mediana_ms"] * 100
+            self.stdout.write(
+                f"{r['itens']:>5} {r['texto']:<6} {r['imagem']:<14} {antes['mediana_ms']:>9.1f} "
+                f"{r['mediana_ms']:>9.1f} {variacao:>+8.1f}%"
+            )
@@ -0,0 +1,56 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from propostas.expiracao import (
+    EXPIRACAO_LOTE_PADRAO,
+    expirar_propostas,
+    politicas_expiracao,
+    propostas_vencidas,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Arquiva as propostas com a validade vencida, conforme a política de "
+        "expiração de cada empresa (Definições de propostas). Pensado para "
+        "rodar diariamente (cron); pode rodar em paralelo com outra execução."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empresa", type=int, help="Só esta empresa.")
+        parser.add_argument("--lote", type=int, default=EXPIRACAO_LOTE_PADRAO, help="Propostas por UPDATE.")
+        parser.add_argument("--data", help="Data de referência (AAAA-MM-DD); padrão: hoje.")
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Só conta as propostas vencidas, sem arquivar.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["lote"] < 1:
+            raise CommandError("--lote precisa ser maior que zero.")
+        hoje = None
+        if opts["data"]:
+            try:
+                hoje = date.fromisoformat(opts["data"])
+            except ValueError:
+                raise CommandError("--data inválida (use AAAA-MM-DD).")
+
+        total = 0
+        for politica in politicas_expiracao(opts["empresa"]):
+            if not politica.ativa:
+                continue
+            if opts["simular"]:
+                qtd = propostas_vencidas(politica, hoje or timezone.localdate()).count()
+                verbo = "vencida(s)"
+            else:
+                qtd = expirar_propostas(politica, hoje=hoje, lote=opts["lote"])
+                verbo = "arquivada(s)"
+            if qtd:
+                self.stdout.write(f"Empresa {politica.empresa_id}: {qtd} proposta(s) {verbo}.")
+            total += qtd
+
+        verbo = "vencida(s)" if opts["simular"] else "arquivada(s)"
+        self.stdout.write(self.style.SUCCESS(f"{total} proposta(s) {verbo}."))
@@ -0,0 +1,67 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from propostas.carga import PREFIXO_PADRAO, gerar_dados_carga, limpar_dados_carga
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera empresas de teste de carga com contatos, serviços, captações e "
+        "propostas (itens/parcelas e textos longos), com tamanhos de cauda "
+        "longa entre as empresas. Reprodutível pela --seed. Cada empresa tem "
+        "um usuário '<prefixo><n>' para o loadtest_endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empresas", type=int, default=10)
+        parser.add_argument("--propostas", type=int, default=300, help="Média de propostas por empresa.")
+        parser.add_argument("--contatos", type=int, default=80, help="Média de contatos por empresa.")
+        parser.add_argument("--servicos", type=int, default=25, help="Média de serviços por empresa.")
+        parser.add_argument("--dias", type=int, default=365, help="Período coberto pelas datas de criação.")
+        parser.add_argument("--seed", default="gestiospro")
+        parser.add_argument("--prefixo", default=PREFIXO_PADRAO, help="Prefixo dos usuários gerados.")
+        parser.add_argument(
+            "--senha",
+            help="Senha dos usuários gerados (padrão: sem senha utilizável, não entram pelo login).",
+        )
+        parser.add_argument(
+            "--limpar",
+            action="store_true",
+            help="Exclui antes as empresas geradas com este prefixo.",
+        )
+        parser.add_argument(
+            "--forcar",
+            action="store_true",
+            help="Roda mesmo com DEBUG=False (grava no banco configurado).",
+        )
+
+    def handle(self, *args, **opts):
+        if not settings.DEBUG and not opts["forcar"]:
+            raise CommandError(
+                "DEBUG=False: o comando grava empresas e usuários de teste no banco configurado. "
+                "Use --forcar para rodar mesmo assim."
+            )
+        if opts["limpar"]:
+            excluidas = limpar_dados_carga(opts["prefixo"])
+            self.stdout.write(f"{excluidas} empresa(s) de carga excluída(s).")
+            if not opts["empresas"]:
+                return
+
+        def progresso(indice, criados):
+            self.stdout.write(
+                f"  {opts['prefixo']}{indice}: {criados['propostas']} propostas, "
+                f"{criados['contatos']} contatos, {criados['servicos']} serviços"
+            )
+
+        inicio = time.perf_counter()
+        totais = gerar_dados_carga(opts, progresso)
+        duracao = time.perf_counter() - inicio
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{totais['empresas']} empresas, {totais['propostas']} propostas, "
+                f"{totais['contatos']} contatos e {totais['servicos']} serviços em {duracao:.1f}s."
+            )
+        )
@@ -0,0 +1,349 @@
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.models import User
+from propostas.carga import PALAVRAS, PREFIXO_PADRAO, usuarios_de_carga
+from propostas.models import Proposta
+
+
+# Peso de cada operação no roteiro (ajustável com --pesos)
+PESOS_PADRAO = {
+    "kanban": 25,
+    "historico": 15,
+    "editar": 15,
+    "salvar": 10,
+    "numeracao": 10,
+    "publica": 20,
+    "pdf": 5,
+}
+
+# Respostas esperadas (o resto conta como erro)
+STATUS_ESPERADO = {
+    "login": 302,
+    "salvar": 302,
+}
+
+# Propostas de cada empresa sorteadas para o roteiro
+AMOSTRA_PROPOSTAS = 200
+
+
+def _percentis(latencias):
+    if len(latencias) < 2:
+        valor = latencias[0] if latencias else 0.0
+        return valor, valor, valor
+    quantis = statistics.quantiles(latencias, n=100, method="inclusive")
+    return quantis[49], quantis[94], quantis[98]
+
+
+def _dados_formulario(proposta):
+    """
+    POST do formulário de edição com os dados atuais da proposta (o mesmo
+    que o navegador envia ao salvar sem mudar nada).
+    """
+    dados = {
+        campo: getattr(proposta, campo) or ""
+        for campo in (
+            "numero",
+            "titulo_servico",
+            "status",
+            "cep",
+            "logradouro",
+            "numero_end",
+            "bairro",
+            "cidade",
+            "uf",
+            "complemento",
+            "desconto_modo",
+            "objetivo_texto",
+            "escopo_texto",
+            "exclusos_texto",
+            "declaracoes_texto",
+            "confidencialidade_texto",
+            "assinatura_texto",
+            "prazo_inicio_texto",
+            "prazo_entrega_texto",
+            "investimentos_texto",
+        )
+    }
+    dados.update(
+        {
+            "cliente": proposta.cliente_id,
+            "captacao": proposta.captacao_id or "",
+            "data_servico": proposta.data_servico.isoformat() if proposta.data_servico else "",
+            "validade": proposta.validade.isoformat() if proposta.validade else "",
+            "desconto_input": proposta.desconto_input,
+            "itens_json": json.dumps(proposta.itens),
+            "parcelas_json": json.dumps(proposta.parcelas),
+            "usar_modelo_sistema": "1" if proposta.usar_modelo_sistema else "0",
+        }
+    )
+    if proposta.exibir_apenas_total:
+        dados["exibir_apenas_total"] = "1"
+    return dados
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga dos principais endpoints (login, kanban, busca no "
+        "histórico, edição/salvamento, numeração, página pública e PDF) com "
+        "os usuários criados pelo gerar_dados_carga. Threads com o Client do "
+        "Django no próprio processo; reporta req/s e p50/p95/p99 por "
+        "endpoint e grava/compara resultados em JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--requisicoes", type=int, default=1000, help="Total de requisições (sem os logins).")
+        parser.add_argument(
+            "--acoes-por-sessao",
+            type=int,
+            default=25,
+            help="Requisições de cada usuário virtual antes de um novo login.",
+        )
+        parser.add_argument(
+            "--pesos",
+            default="",
+            help="Pesos das operações, ex.: 'pdf=0,kanban=40' (padrão: %s)."
+            % ",".join(f"{k}={v}" for k, v in PESOS_PADRAO.items()),
+        )
+        parser.add_argument("--seed", default="gestiospro")
+        parser.add_argument("--prefixo", default=PREFIXO_PADRAO)
+        parser.add_argument(
+            "--senha",
+            help="Senha usada no gerar_dados_carga: mede também o login. Sem ela, usa force_login.",
+        )
+        parser.add_argument("--json", dest="saida_json", help="Grava os resultados neste arquivo.")
+        parser.add_argument(
+            "--comparar",
+            help="JSON de uma execução anterior: mostra a variação do p95 por endpoint.",
+        )
+        parser.add_argument(
+            "--tolerancia",
+            type=float,
+            default=20.0,
+            help="Piora de p95 (%%) acima da qual --comparar aponta regressão.",
+        )
+
+    def handle(self, *args, **opts):
+        pesos = self._pesos(opts["pesos"])
+        usuarios = usuarios_de_carga(opts["prefixo"])
+        if not usuarios:
+            raise CommandError(
+                f"Nenhum usuário '{opts['prefixo']}*' encontrado. Rode antes o gerar_dados_carga."
+            )
+
+        # Amostra sorteada pela semente (não order_by("?")): mesmas propostas a cada execução
+        rnd = random.Random(opts["seed"])
+        amostras = {}
+        for _, empresa_id in usuarios:
+            propostas = list(
+                Proposta.objects.filter(company_id=empresa_id)
+                .order_by("pk")
+                .values_list("pk", "public_token")
+            )
+            amostras[empresa_id] = rnd.sample(propostas, min(len(propostas), AMOSTRA_PROPOSTAS))
+
+        latencias = defaultdict(list)
+        erros = defaultdict(int)
+        falhas = []
+        lock = threading.Lock()
+        n_threads = opts["threads"]
+        total = opts["requisicoes"]
+        por_thread = [total // n_threads + (1 if i < total % n_threads else 0) for i in range(n_threads)]
+        barreira = threading.Barrier(n_threads)
+
+        def worker(indice, qtd):
+            # Roteiro da thread definido pela semente: mesma semente = mesma sequência
+            rnd = random.Random(f"{opts['seed']}:{indice}")
+            operacoes = rnd.choices(list(pesos), list(pesos.values()), k=qtd)
+            locais = defaultdict(list)
+            erros_locais = defaultdict(int)
+            client = None
+            barreira.wait()
+            try:
+                for n, operacao in enumerate(operacoes):
+                    if n % opts["acoes_por_sessao"] == 0:
+                        username, empresa_id = usuarios[(indice + n) % len(usuarios)]
+                        client = Client()
+                        if opts["senha"] is None:
+                            # Usuários gerados sem senha (padrão do gerar_dados_carga)
+                            client.force_login(User.objects.get(username=username))
+                        else:
+                            self._medir(
+                                locais,
+                                erros_locais,
+                                "login",
+                                lambda: client.post(
+                                    reverse("accounts:login"),
+                                    {"username": username, "password": opts["senha"]},
+                                ),
+                            )
+                    propostas = amostras[empresa_id]
+                    if not propostas:
+                        operacao = "kanban"
+                    pk, token = rnd.choice(propostas) if propostas else (None, None)
+                    self._medir(
+                        locais,
+                        erros_locais,
+                        operacao,
+                        self._requisicao(client, operacao, pk, token, rnd),
+                    )
+            except Exception as exc:
+                with lock:
+                    falhas.append(repr(exc))
+            finally:
+                close_old_connections()
+                with lock:
+                    for operacao, valores in locais.items():
+                        latencias[operacao].extend(valores)
+                    for operacao, qtd_erros in erros_locais.items():
+                        erros[operacao] += qtd_erros
+
+        threads = [threading.Thread(target=worker, args=(i, qtd)) for i, qtd in enumerate(por_thread)]
+        inicio = time.perf_counter()
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        duracao = time.perf_counter() - inicio
+
+        resultados = self._resumir(latencias, erros, duracao)
+        self._imprimir(resultados, duracao)
+
+        if opts["saida_json"]:
+            with open(opts["saida_json"], "w", encoding="utf-8") as arquivo:
+                json.dump(
+                    {
+                        "data": datetime.now().isoformat(timespec="seconds"),
+                        "parametros": {
+                            "threads": n_threads,
+                            "requisicoes": total,
+                            "seed": opts["seed"],
+                            "pesos": pesos,
+                            "empresas": len(usuarios),
+                        },
+                        "duracao_s": round(duracao, 3),
+                        "endpoints": resultados,
+                    },
+                    arquivo,
+                    indent=2,
+                    ensure_ascii=False,
+                )
+            self.stdout.write(f"Resultados gravados em {opts['saida_json']}.")
+
+        regressoes = self._comparar(resultados, opts) if opts["comparar"] else []
+
+        for falha in falhas:
+            self.stderr.write(f"  - {falha}")
+        if falhas:
+            raise CommandError("Threads interrompidas por exceção.")
+        if regressoes:
+            raise CommandError(f"Regressão de p95 em: {', '.join(regressoes)}.")
+
+    def _pesos(self, texto):
+        pesos = dict(PESOS_PADRAO)
+        for parte in filter(None, (p.strip() for p in texto.split(","))):
+            nome, _, valor = parte.partition("=")
+            if nome not in PESOS_PADRAO or not valor.isdigit():
+                raise CommandError(f"Peso inválido: '{parte}' (operações: {', '.join(PESOS_PADRAO)}).")
+            pesos[nome] = int(valor)
+        pesos = {nome: peso for nome, peso in pesos.items() if peso > 0}
+        if not pesos:
+            raise CommandError("Todas as operações estão com peso 0.")
+        return pesos
+
+    def _requisicao(self, client, operacao, pk, token, rnd):
+        """
+        Função que faz a requisição da operação (só ela é cronometrada).
+        """
+        if operacao == "kanban":
+            return lambda: client.get(reverse("propostas:propostas_list"))
+        if operacao == "historico":
+            return lambda: client.get(
+                reverse("propostas:propostas_historico"),
+                {"q": rnd.choice(PALAVRAS), "status_hist": rnd.choice(("aprovado", "rejeitado", "arquivado"))},
+            )
+        if operacao == "editar":
+            return lambda: client.get(reverse("propostas:proposta_edit", args=[pk]))
+        if operacao == "salvar":
+            dados = _dados_formulario(Proposta.objects.get(pk=pk))
+            return lambda: client.post(reverse("propostas:proposta_edit", args=[pk]), dados)
+        if operacao == "numeracao":
+            return lambda: client.post(reverse("propostas:proposta_gerar_numero"))
+        if operacao == "publica":
+            return lambda: client.get(reverse("propostas:proposta_public_view", args=[token]))
+        if operacao == "pdf":
+            return lambda: client.get(reverse("propostas:proposta_public_pdf", args=[pk]))
+        raise CommandError(f"Operação desconhecida: {operacao}")
+
+    def _medir(self, latencias, erros, operacao, requisicao):
+        inicio = time.perf_counter()
+        resp = requisicao()
+        latencias[operacao].append((time.perf_counter() - inicio) * 1000)
+        if resp.status_code != STATUS_ESPERADO.get(operacao, 200):
+            erros[operacao] += 1
+
+    def _resumir(self, latencias, erros, duracao):
+        resultados = {}
+        for operacao in sorted(latencias):
+            valores = latencias[operacao]
+            p50, p95, p99 = _percentis(valores)
+            resultados[operacao] = {
+                "requisicoes": len(valores),
+                "erros": erros.get(operacao, 0),
+                "rps": round(len(valores) / duracao, 2),
+                "p50_ms": round(p50, 2),
+                "p95_ms": round(p95, 2),
+                "p99_ms": round(p99, 2),
+                "max_ms": round(max(valores), 2),
+            }
+        return resultados
+
+    def _imprimir(self, resultados, duracao):
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'endpoint':<11} {'req':>6} {'erros':>6} {'req/s':>8} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for operacao, r in resultados.items():
+            self.stdout.write(
+                f"{operacao:<11} {r['requisicoes']:>6} {r['erros']:>6} {r['rps']:>8.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['max_ms']:>8.1f}"
+            )
+        total = sum(r["requisicoes"] for r in resultados.values())
+        total_erros = sum(r["erros"] for r in resultados.values())
+        estilo = self.style.WARNING if total_erros else self.style.SUCCESS
+        self.stdout.write(
+            estilo(f"{total} requisições em {duracao:.2f}s ({total / duracao:.1f} req/s), {total_erros} erros.")
+        )
+
+    def _comparar(self, resultados, opts):
+        with open(opts["comparar"], encoding="utf-8") as arquivo:
+            anteriores = json.load(arquivo)["endpoints"]
+
+        self.stdout.write("")
+        self.stdout.write(f"{'endpoint':<11} {'p95 antes':>10} {'p95 agora':>10} {'variação':>9}")
+        regressoes = []
+        for operacao, r in resultados.items():
+            antes = anteriores.get(operacao)
+            if not antes or not antes["p95_ms"]:
+                continue
+            variacao = (r["p95_ms"] - antes["p95_ms"]) / antes["p95_ms"] * 100
+            regrediu = variacao > opts["tolerancia"]
+            if regrediu:
+                regressoes.append(operacao)
+            linha = f"{operacao:<11} {antes['p95_ms']:>10.1f} {r['p95_ms']:>10.1f} {variacao:>+8.1f}%"
+            self.stdout.write(self.style.ERROR(linha) if regrediu else linha)
+        return regressoes
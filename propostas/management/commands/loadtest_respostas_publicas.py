@@ -0,0 +1,187 @@
+import random
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.models import Contato, Empresa
+from propostas.models import Proposta, PropostaResposta
+
+
+STATUS_POR_ACAO = {
+    "aprovar": "aprovado",
+    "rejeitar": "rejeitado",
+    "revisao": "em_andamento",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do endpoint público de resposta: várias threads enviam "
+        "aprovar/rejeitar/revisão ao mesmo tempo (com reenvios do mesmo "
+        "request_id) e o comando verifica se o estado final é consistente."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--envios", type=int, default=200, help="Total de POSTs.")
+        parser.add_argument(
+            "--reenvios",
+            type=float,
+            default=0.3,
+            help="Fração dos POSTs que reutiliza um request_id já enviado.",
+        )
+        parser.add_argument(
+            "--empresa",
+            type=int,
+            help="Empresa usada para a proposta de teste (padrão: a primeira).",
+        )
+        parser.add_argument("--manter", action="store_true", help="Não apaga a proposta de teste.")
+        parser.add_argument(
+            "--forcar",
+            action="store_true",
+            help="Roda mesmo com DEBUG=False (grava no banco configurado).",
+        )
+
+    def handle(self, *args, **opts):
+        if not settings.DEBUG and not opts["forcar"]:
+            raise CommandError(
+                "DEBUG=False: o teste grava propostas e respostas no banco configurado. "
+                "Use --forcar para rodar mesmo assim."
+            )
+        empresa = (
+            Empresa.objects.filter(pk=opts["empresa"]).first()
+            if opts["empresa"]
+            else Empresa.objects.order_by("pk").first()
+        )
+        if empresa is None:
+            raise CommandError("Nenhuma empresa encontrada para criar a proposta de teste.")
+        cliente = Contato.objects.filter(empresa=empresa).order_by("pk").first()
+        if cliente is None:
+            raise CommandError("A empresa precisa de ao menos um contato.")
+
+        proposta = Proposta.objects.create(
+            company=empresa,
+            cliente=cliente,
+            numero=f"LOADTEST-{uuid.uuid4().hex[:8]}",
+            titulo_servico="[teste de carga]",
+            status="em_andamento",
+        )
+        url = reverse("propostas:proposta_public_responder", args=[proposta.public_token])
+        # Todos os envios partem da mesma página: mesmo status e mesma versão
+        versao = proposta.updated_at.isoformat()
+
+        envios = self._planejar_envios(opts["envios"], opts["reenvios"])
+        resultados = defaultdict(list)
+        erros = []
+        lock = threading.Lock()
+        barreira = threading.Barrier(opts["threads"])
+
+        def enviar(client, request_id, action):
+            # Erro em um envio (ex.: "database is locked" no SQLite) conta
+            # como erro daquele envio; a thread segue com os próximos
+            try:
+                resp = client.post(
+                    url,
+                    {
+                        "action": action,
+                        "request_id": request_id,
+                        "status_esperado": "em_andamento",
+                        "versao": versao,
+                    },
+                )
+            except Exception as exc:
+                return repr(exc)
+            return None if resp.status_code == 200 else resp.status_code
+
+        def worker(fatia):
+            client = Client()
+            barreira.wait()
+            try:
+                for request_id, action in fatia:
+                    erro = enviar(client, request_id, action)
+                    with lock:
+                        if erro is None:
+                            resultados[request_id].append(action)
+                        else:
+                            erros.append((request_id, erro))
+            finally:
+                close_old_connections()
+
+        fatias = [envios[i::opts["threads"]] for i in range(opts["threads"])]
+        threads = [threading.Thread(target=worker, args=(f,)) for f in fatias]
+
+        inicio = time.perf_counter()
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        duracao = time.perf_counter() - inicio
+
+        try:
+            falhas = self._verificar(proposta, resultados, erros)
+        finally:
+            if not opts["manter"]:
+                proposta.delete()
+
+        self.stdout.write(
+            f"{len(envios)} envios ({len(resultados)} request_ids) em {duracao:.2f}s "
+            f"({len(envios) / duracao:.1f} req/s); erros: {len(erros)}"
+        )
+        if falhas:
+            for falha in falhas:
+                self.stderr.write(f"  - {falha}")
+            raise CommandError("Estado final inconsistente.")
+        self.stdout.write(self.style.SUCCESS("Estado final consistente."))
+
+    def _planejar_envios(self, total, fracao_reenvios):
+        envios = []
+        for _ in range(total):
+            if envios and random.random() < fracao_reenvios:
+                # Reenvio: mesmo request_id e mesma ação (duplo clique / retry)
+                envios.append(random.choice(envios))
+            else:
+                envios.append((str(uuid.uuid4()), random.choice(list(STATUS_POR_ACAO))))
+        random.shuffle(envios)
+        return envios
+
+    def _verificar(self, proposta, resultados, erros):
+        falhas = [f"erro no envio {rid}: {detalhe}" for rid, detalhe in erros]
+
+        proposta.refresh_from_db()
+        respostas = list(PropostaResposta.objects.filter(proposta=proposta))
+        aplicadas = [r for r in respostas if r.aplicada]
+
+        # Envio com erro pode ou não ter gravado a resposta
+        gravados = {str(r.request_id) for r in respostas}
+        com_erro = {rid for rid, _ in erros}
+        if not set(resultados) <= gravados <= set(resultados) | com_erro:
+            falhas.append(
+                f"{len(respostas)} respostas gravadas para {len(resultados)} request_ids distintos"
+            )
+        if len(aplicadas) != 1:
+            falhas.append(f"{len(aplicadas)} respostas aplicadas (esperado: exatamente 1)")
+        elif proposta.status != STATUS_POR_ACAO[aplicadas[0].acao]:
+            falhas.append(
+                f"status final '{proposta.status}' não corresponde à resposta aplicada "
+                f"'{aplicadas[0].acao}'"
+            )
+
+        status_finais = Counter(r.status_final for r in respostas if not r.aplicada)
+        for status, qtd in status_finais.items():
+            if status != proposta.status:
+                falhas.append(f"{qtd} respostas recusadas registraram status '{status}'")
+
+        self.stdout.write(
+            f"Respostas: {len(respostas)} (aplicadas: {len(aplicadas)}); "
+            f"status final: {proposta.status}"
+        )
+        return falhas
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Empresa
+from propostas.rollups import divergencias_rollup, recalcular_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Confere o rollup diário de propostas (dashboard) com as propostas e "
+        "recalcula as empresas divergentes. Pensado para rodar periodicamente "
+        "(cron), cobrindo alterações feitas fora dos sinais (update() em massa, "
+        "SQL manual)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--empresa", type=int, help="Só esta empresa.")
+        parser.add_argument(
+            "--verificar",
+            action="store_true",
+            help="Só lista as divergências, sem recalcular.",
+        )
+        parser.add_argument(
+            "--forcar",
+            action="store_true",
+            help="Recalcula mesmo as empresas sem divergência.",
+        )
+
+    def handle(self, *args, **opts):
+        empresas = Empresa.objects.order_by("pk").values_list("pk", flat=True)
+        if opts["empresa"]:
+            empresas = empresas.filter(pk=opts["empresa"])
+
+        divergentes = 0
+        for empresa_id in empresas:
+            divergencias = divergencias_rollup(empresa_id)
+            if divergencias:
+                divergentes += 1
+                for chave, real, rollup in divergencias[:20]:
+                    self.stdout.write(
+                        f"Empresa {empresa_id} {chave}: propostas={real} rollup={rollup}"
+                    )
+                if len(divergencias) > 20:
+                    self.stdout.write(f"Empresa {empresa_id}: ... e mais {len(divergencias) - 20}.")
+
+            if opts["verificar"] or not (divergencias or opts["forcar"]):
+                continue
+
+            antes, depois = recalcular_rollups(empresa_id)
+            self.stdout.write(f"Empresa {empresa_id}: rollup recalculado ({antes} -> {depois} linhas).")
+
+        estilo = self.style.WARNING if divergentes else self.style.SUCCESS
+        self.stdout.write(estilo(f"{divergentes} empresa(s) com divergência."))
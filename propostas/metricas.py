@@ -0,0 +1,108 @@
+import statistics
+from datetime import timedelta
+
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import PropostaEvento
+
+
+# Etapas do funil, na ordem
+ETAPAS_FUNIL = ("criada", "enviada", "visualizada", "aprovada")
+
+FUNIL_PERIODO_PADRAO_DIAS = 90
+
+
+def _coorte(empresa_id, inicio, fim):
+    """
+    Propostas criadas no período (evento "criada"), como subconsulta.
+    """
+    return PropostaEvento.objects.filter(
+        company_id=empresa_id,
+        tipo="criada",
+        created_at__gte=inicio,
+        created_at__lt=fim,
+    ).values("proposta_id")
+
+
+def _horas(delta):
+    return round(delta.total_seconds() / 3600, 1)
+
+
+def funil_propostas(empresa_id, inicio=None, fim=None):
+    """
+    Métricas de funil calculadas a partir do histórico (PropostaEvento) das
+    propostas criadas no período, em duas consultas agregadas:
+
+    - por captação: propostas que chegaram a cada etapa e conversão
+      (aprovadas / criadas);
+    - tempo até aprovação (a partir do envio, ou da criação quando a
+      proposta não passou por "enviada"), em horas.
+    """
+    fim = fim or timezone.now()
+    inicio = inicio or fim - timedelta(days=FUNIL_PERIODO_PADRAO_DIAS)
+    coorte = _coorte(empresa_id, inicio, fim)
+
+    linhas = (
+        PropostaEvento.objects.filter(
+            company_id=empresa_id,
+            proposta_id__in=coorte,
+            tipo__in=ETAPAS_FUNIL,
+        )
+        .values("proposta__captacao_id", "proposta__captacao__nome", "tipo")
+        .annotate(total=Count("proposta_id", distinct=True))
+    )
+
+    por_captacao = {}
+    for linha in linhas:
+        captacao_id = linha["proposta__captacao_id"]
+        item = por_captacao.setdefault(
+            captacao_id,
+            {
+                "captacao_id": captacao_id,
+                "captacao": linha["proposta__captacao__nome"] or "Sem captação",
+                **{etapa: 0 for etapa in ETAPAS_FUNIL},
+            },
+        )
+        item[linha["tipo"]] = linha["total"]
+
+    totais = {etapa: 0 for etapa in ETAPAS_FUNIL}
+    for item in por_captacao.values():
+        item["conversao"] = round(item["aprovada"] / item["criada"], 4) if item["criada"] else None
+        for etapa in ETAPAS_FUNIL:
+            totais[etapa] += item[etapa]
+    totais["conversao"] = round(totais["aprovada"] / totais["criada"], 4) if totais["criada"] else None
+
+    marcos = (
+        PropostaEvento.objects.filter(
+            company_id=empresa_id,
+            proposta_id__in=coorte,
+            tipo__in=("criada", "enviada", "aprovada"),
+        )
+        .values("proposta_id")
+        .annotate(
+            criada_em=Min("created_at", filter=Q(tipo="criada")),
+            enviada_em=Min("created_at", filter=Q(tipo="enviada")),
+            aprovada_em=Min("created_at", filter=Q(tipo="aprovada")),
+        )
+        .filter(aprovada_em__isnull=False)
+    )
+    horas = sorted(
+        _horas(m["aprovada_em"] - (m["enviada_em"] or m["criada_em"]))
+        for m in marcos
+        if m["aprovada_em"] >= (m["enviada_em"] or m["criada_em"])
+    )
+
+    tempo_aprovacao = {"propostas": len(horas), "media_horas": None, "mediana_horas": None, "p90_horas": None}
+    if horas:
+        tempo_aprovacao["media_horas"] = round(statistics.fmean(horas), 1)
+        tempo_aprovacao["mediana_horas"] = round(statistics.median(horas), 1)
+        tempo_aprovacao["p90_horas"] = horas[min(len(horas) - 1, int(len(horas) * 0.9))]
+
+    return {
+        "inicio": inicio.isoformat(),
+        "fim": fim.isoformat(),
+        "totais": totais,
+        "por_captacao": sorted(por_captacao.values(), key=lambda i: -i["criada"]),
+        "tempo_ate_aprovacao": tempo_aprovacao,
+    }
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_contato_contato_empresa_nome_idx_and_more'),
+        ('propostas', '0005_proposta_sequencia_int'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proposta',
+            index=models.Index(fields=['company', 'status', '-created_at'], name='prop_comp_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposta',
+            index=models.Index(fields=['company', 'status', '-updated_at'], name='prop_comp_status_updated_idx'),
+        ),
+    ]
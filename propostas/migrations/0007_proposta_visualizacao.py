@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_empresa_updated_at'),
+        ('propostas', '0006_proposta_prop_comp_status_created_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='proposta',
+            name='downloads_pdf_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proposta',
+            name='tempo_visualizacao_segundos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proposta',
+            name='ultima_visualizacao_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='proposta',
+            name='visualizacoes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='PropostaVisualizacao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('abertura', 'Abertura'), ('pdf', 'Download do PDF'), ('tempo', 'Tempo na página')], max_length=10)),
+                ('duracao_segundos', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposta_visualizacoes', to='core.empresa')),
+                ('proposta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visualizacoes', to='propostas.proposta')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['company', '-created_at'], name='prop_visu_comp_created_idx'), models.Index(fields=['proposta', '-created_at'], name='prop_visu_prop_created_idx')],
+            },
+        ),
+    ]
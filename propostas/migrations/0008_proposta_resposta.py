@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_empresa_updated_at'),
+        ('propostas', '0007_proposta_visualizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropostaResposta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.UUIDField()),
+                ('acao', models.CharField(choices=[('aprovar', 'Aprovar'), ('rejeitar', 'Rejeitar'), ('revisao', 'Pedir revisão')], max_length=10)),
+                ('mensagem', models.TextField(blank=True, default='')),
+                ('status_anterior', models.CharField(max_length=20)),
+                ('status_final', models.CharField(max_length=20)),
+                ('aplicada', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposta_respostas', to='core.empresa')),
+                ('proposta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='respostas', to='propostas.proposta')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'constraints': [models.UniqueConstraint(fields=('proposta', 'request_id'), name='prop_resposta_request_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_empresa_updated_at'),
+        ('propostas', '0008_proposta_resposta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropostaEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('criada', 'Criada'), ('editada', 'Editada'), ('enviada', 'Enviada'), ('visualizada', 'Visualizada'), ('aprovada', 'Aprovada'), ('rejeitada', 'Rejeitada'), ('revisao_solicitada', 'Revisão solicitada'), ('arquivada', 'Arquivada')], max_length=20)),
+                ('origem', models.CharField(choices=[('interno', 'Equipe'), ('cliente', 'Cliente'), ('sistema', 'Sistema')], default='interno', max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposta_eventos', to='core.empresa')),
+                ('proposta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='propostas.proposta')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['company', '-created_at'], name='prop_evento_comp_created_idx'), models.Index(fields=['company', 'tipo', 'created_at'], name='prop_evento_comp_tipo_idx'), models.Index(fields=['proposta', 'created_at'], name='prop_evento_prop_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:25
+
+from django.db import migrations
+
+
+# Histórico inicial das propostas existentes a partir das datas já gravadas
+CAMPOS_EVENTO = (
+    ("created_at", "criada"),
+    ("aprovado_em", "aprovada"),
+    ("rejeitado_em", "rejeitada"),
+    ("revisao_solicitada_em", "revisao_solicitada"),
+)
+
+
+def backfill_eventos(apps, schema_editor):
+    Proposta = apps.get_model("propostas", "Proposta")
+    PropostaEvento = apps.get_model("propostas", "PropostaEvento")
+
+    campos = ["pk", "company_id"] + [campo for campo, _ in CAMPOS_EVENTO]
+    lote = []
+    for row in Proposta.objects.values(*campos).iterator(chunk_size=1000):
+        for campo, tipo in CAMPOS_EVENTO:
+            if row[campo]:
+                lote.append(
+                    PropostaEvento(
+                        company_id=row["company_id"],
+                        proposta_id=row["pk"],
+                        tipo=tipo,
+                        origem="sistema",
+                        created_at=row[campo],
+                    )
+                )
+        if len(lote) >= 1000:
+            PropostaEvento.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        PropostaEvento.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("propostas", "0009_proposta_evento"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_eventos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_empresa_updated_at'),
+        ('propostas', '0010_backfill_proposta_evento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropostaRevisao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField()),
+                ('motivo', models.CharField(choices=[('criada', 'Criada'), ('editada', 'Editada'), ('enviada', 'Enviada'), ('visualizada', 'Visualizada'), ('aprovada', 'Aprovada'), ('rejeitada', 'Rejeitada'), ('revisao_solicitada', 'Revisão solicitada'), ('arquivada', 'Arquivada')], max_length=20)),
+                ('completa', models.BooleanField(default=False)),
+                ('dados', models.BinaryField()),
+                ('conteudo_hash', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposta_revisoes', to='core.empresa')),
+                ('proposta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisoes', to='propostas.proposta')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['proposta', 'numero'],
+                'constraints': [models.UniqueConstraint(fields=('proposta', 'numero'), name='prop_revisao_numero_uniq')],
+            },
+        ),
+    ]
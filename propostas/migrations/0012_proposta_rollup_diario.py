@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_empresa_updated_at'),
+        ('propostas', '0011_proposta_revisao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropostaRollupDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('status', models.CharField(choices=[('rascunho', 'Rascunho'), ('em_andamento', 'Em andamento'), ('aprovado', 'Aprovado'), ('rejeitado', 'Rejeitado'), ('arquivado', 'Arquivado')], max_length=20)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('captacao', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='propostas.captacao')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.contato')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposta_rollups', to='core.empresa')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['company', 'dia', 'status', 'captacao', 'cliente'], name='prop_rollup_chave_idx')],
+            },
+        ),
+    ]
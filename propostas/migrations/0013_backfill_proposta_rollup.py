@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:40
+
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_rollup(apps, schema_editor):
+    Proposta = apps.get_model("propostas", "Proposta")
+    PropostaRollupDiario = apps.get_model("propostas", "PropostaRollupDiario")
+
+    agregados = (
+        Proposta.objects.annotate(dia=TruncDate("created_at"))
+        .values("company_id", "dia", "status", "captacao_id", "cliente_id")
+        .annotate(quantidade=Count("id"), valor_total=Coalesce(Sum("total"), Value(Decimal("0.00"))))
+        .order_by()
+    )
+    PropostaRollupDiario.objects.bulk_create(
+        (PropostaRollupDiario(**linha) for linha in agregados),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("propostas", "0012_proposta_rollup_diario"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
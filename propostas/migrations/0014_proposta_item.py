@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:31
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_empresa_updated_at'),
+        ('propostas', '0013_backfill_proposta_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropostaItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveIntegerField(default=0)),
+                ('descricao', models.CharField(blank=True, default='', max_length=255)),
+                ('valor', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.categoriaservico')),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proposta_itens', to='core.empresa')),
+                ('proposta', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itens_indice', to='propostas.proposta')),
+                ('servico', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.servico')),
+            ],
+            options={
+                'ordering': ['proposta', 'posicao'],
+                'indexes': [models.Index(fields=['company', 'categoria'], name='prop_item_comp_categoria_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-19 15:50
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+
+def _decimal(valor):
+    try:
+        return Decimal(str(valor or "0")).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        return Decimal("0.00")
+
+
+def backfill_itens(apps, schema_editor):
+    Proposta = apps.get_model("propostas", "Proposta")
+    PropostaItem = apps.get_model("propostas", "PropostaItem")
+    Servico = apps.get_model("core", "Servico")
+
+    servicos = {
+        pk: (empresa_id, categoria_id)
+        for pk, empresa_id, categoria_id in Servico.objects.values_list("pk", "empresa_id", "categoria_id")
+    }
+
+    lote = []
+    for proposta in Proposta.objects.only("pk", "company_id", "itens").iterator(chunk_size=500):
+        itens = proposta.itens if isinstance(proposta.itens, list) else []
+        for posicao, it in enumerate(i for i in itens if isinstance(i, dict)):
+            try:
+                servico_id = int(it.get("servico_id"))
+            except (TypeError, ValueError):
+                servico_id = None
+            empresa_id, categoria_id = servicos.get(servico_id, (None, None))
+            if empresa_id != proposta.company_id:
+                servico_id = categoria_id = None
+            lote.append(
+                PropostaItem(
+                    company_id=proposta.company_id,
+                    proposta_id=proposta.pk,
+                    posicao=posicao,
+                    servico_id=servico_id,
+                    categoria_id=categoria_id,
+                    descricao=str(it.get("nome") or it.get("descricao") or "")[:255],
+                    valor=_decimal(it.get("valor")),
+                )
+            )
+        if len(lote) >= 1000:
+            PropostaItem.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        PropostaItem.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("propostas", "0014_proposta_item"),
+        ("core", "0007_empresa_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_itens, migrations.RunPython.noop),
+    ]
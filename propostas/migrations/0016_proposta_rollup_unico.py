@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:19
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def juntar_linhas_repetidas(apps, schema_editor):
+    # Antes da constraint: soma as linhas repetidas na de menor id
+    PropostaRollupDiario = apps.get_model("propostas", "PropostaRollupDiario")
+    repetidas = (
+        PropostaRollupDiario.objects.values("company_id", "dia", "status", "captacao_id", "cliente_id")
+        .annotate(linhas=Count("id"), primeira=Min("id"), qtd=Sum("quantidade"), valor=Sum("valor_total"))
+        .filter(linhas__gt=1)
+        .order_by()
+    )
+    for grupo in repetidas:
+        PropostaRollupDiario.objects.filter(pk=grupo["primeira"]).update(
+            quantidade=grupo["qtd"], valor_total=grupo["valor"]
+        )
+        PropostaRollupDiario.objects.filter(
+            company_id=grupo["company_id"],
+            dia=grupo["dia"],
+            status=grupo["status"],
+            captacao_id=grupo["captacao_id"],
+            cliente_id=grupo["cliente_id"],
+        ).exclude(pk=grupo["primeira"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_empresa_logo_derivados'),
+        ('propostas', '0015_backfill_proposta_item'),
+    ]
+
+    operations = [
+        migrations.RunPython(juntar_linhas_repetidas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='propostarollupdiario',
+            constraint=models.UniqueConstraint(condition=models.Q(('captacao__isnull', False)), fields=('company', 'dia', 'status', 'captacao', 'cliente'), name='prop_rollup_chave_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='propostarollupdiario',
+            constraint=models.UniqueConstraint(condition=models.Q(('captacao__isnull', True)), fields=('company', 'dia', 'status', 'cliente'), name='prop_rollup_chave_sem_captacao_uniq'),
+        ),
+    ]
@@ -4,6 +4,8 @@ from django.db import models
 import uuid
 from django.utils import timezone
 
+from core.managers import TenantManager
+
 class Captacao(models.Model):
     company = models.ForeignKey(
         "core.Empresa",
@@ -12,6 +14,11 @@ class Captacao(models.Model):
     )
     nome = models.CharField(max_length=120)
 
+    tenant_field = "company"
+
+    objects = models.Manager()
+    tenant_objects = TenantManager()
+
     class Meta:
         ordering = ["nome"]
         unique_together = [("company", "nome")]
@@ -145,10 +152,25 @@ class Proposta(models.Model):
         help_text="Sequência interna de numeração por empresa (1, 2, 3...).",
     )
 
+    # Engajamento do link público (contadores atualizados em lote, ver propostas.tracking)
+    visualizacoes_count = models.PositiveIntegerField(default=0)
+    downloads_pdf_count = models.PositiveIntegerField(default=0)
+    tempo_visualizacao_segundos = models.PositiveIntegerField(default=0)
+    ultima_visualizacao_em = models.DateTimeField(null=True, blank=True)
+
+    tenant_field = "company"
+
+    objects = models.Manager()
+    tenant_objects = TenantManager()
 
     class Meta:
         unique_together = [("company", "numero")]
         ordering = ["-created_at"]
+        indexes = [
+            # Colunas do kanban/histórico: empresa + status, ordenado por data
+            models.Index(fields=["company", "status", "-created_at"], name="prop_comp_status_created_idx"),
+            models.Index(fields=["company", "status", "-updated_at"], name="prop_comp_status_updated_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.numero} • {self.titulo_servico}"
@@ -195,4 +217,304 @@ class Proposta(models.Model):
         self.subtotal = subtotal
         self.desconto_valor = desc_val
         self.total = total
-        return subtotal, total
\ No newline at end of file
+        return subtotal, total
+
+
+class PropostaVisualizacao(models.Model):
+    """
+    Evento de engajamento com o link público (somente inserção).
+    Gravado em lote pelo buffer de propostas.tracking.
+    """
+
+    TIPO_CHOICES = [
+        ("abertura", "Abertura"),
+        ("pdf", "Download do PDF"),
+        ("tempo", "Tempo na página"),
+    ]
+
+    company = models.ForeignKey(
+        "core.Empresa",
+        on_delete=models.CASCADE,
+        related_name="proposta_visualizacoes",
+    )
+    proposta = models.ForeignKey(
+        "propostas.Proposta",
+        on_delete=models.CASCADE,
+        related_name="visualizacoes",
+    )
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    duracao_segundos = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["company", "-created_at"], name="prop_visu_comp_created_idx"),
+            models.Index(fields=["proposta", "-created_at"], name="prop_visu_prop_created_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.proposta_id} • {self.tipo}"
+
+
+class PropostaResposta(models.Model):
+    """
+    Resposta do cliente pelo link público (aprovar / rejeitar / revisão).
+
+    Cada envio do formulário traz um `request_id` gerado no navegador: um
+    reenvio (duplo clique, F5, retry da rede) encontra o registro existente
+    e devolve o mesmo resultado em vez de aplicar a ação outra vez.
+    `aplicada=False` indica que a proposta já tinha mudado de status quando
+    a resposta chegou (outra pessoa respondeu antes).
+    """
+
+    ACAO_CHOICES = [
+        ("aprovar", "Aprovar"),
+        ("rejeitar", "Rejeitar"),
+        ("revisao", "Pedir revisão"),
+    ]
+
+    company = models.ForeignKey(
+        "core.Empresa",
+        on_delete=models.CASCADE,
+        related_name="proposta_respostas",
+    )
+    proposta = models.ForeignKey(
+        "propostas.Proposta",
+        on_delete=models.CASCADE,
+        related_name="respostas",
+    )
+    request_id = models.UUIDField()
+    acao = models.CharField(max_length=10, choices=ACAO_CHOICES)
+    mensagem = models.TextField(blank=True, default="")
+    status_anterior = models.CharField(max_length=20)
+    status_final = models.CharField(max_length=20)
+    aplicada = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["proposta", "request_id"],
+                name="prop_resposta_request_uniq",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.proposta_id} • {self.acao}"
+
+
+class PropostaEvento(models.Model):
+    """
+    Histórico da proposta (somente inserção): criação, edições, envio,
+    visualização e respostas. Base da linha do tempo e das métricas de funil
+    (propostas.metricas). Gravado na hora por propostas.eventos.
+    """
+
+    TIPO_CHOICES = [
+        ("criada", "Criada"),
+        ("editada", "Editada"),
+        ("enviada", "Enviada"),
+        ("visualizada", "Visualizada"),
+        ("aprovada", "Aprovada"),
+        ("rejeitada", "Rejeitada"),
+        ("revisao_solicitada", "Revisão solicitada"),
+        ("arquivada", "Arquivada"),
+    ]
+
+    ORIGEM_CHOICES = [
+        ("interno", "Equipe"),
+        ("cliente", "Cliente"),
+        ("sistema", "Sistema"),
+    ]
+
+    company = models.ForeignKey(
+        "core.Empresa",
+        on_delete=models.CASCADE,
+        related_name="proposta_eventos",
+    )
+    proposta = models.ForeignKey(
+        "propostas.Proposta",
+        on_delete=models.CASCADE,
+        related_name="eventos",
+    )
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    origem = models.CharField(max_length=10, choices=ORIGEM_CHOICES, default="interno")
+    usuario = models.ForeignKey(
+        "core.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            # Linha do tempo da empresa
+            models.Index(fields=["company", "-created_at"], name="prop_evento_comp_created_idx"),
+            # Funil: eventos de um tipo por período
+            models.Index(fields=["company", "tipo", "created_at"], name="prop_evento_comp_tipo_idx"),
+            # Histórico de uma proposta
+            models.Index(fields=["proposta", "created_at"], name="prop_evento_prop_created_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.proposta_id} • {self.tipo}"
+
+
+class PropostaRevisao(models.Model):
+    """
+    Retrato imutável do conteúdo da proposta em um envio/resposta.
+
+    `dados` guarda JSON comprimido (zlib): o conteúdo completo a cada
+    REVISAO_INTERVALO_COMPLETO revisões e, nas demais, só os campos que
+    mudaram desde a revisão anterior. Ver propostas.revisoes.
+    """
+
+    company = models.ForeignKey(
+        "core.Empresa",
+        on_delete=models.CASCADE,
+        related_name="proposta_revisoes",
+    )
+    proposta = models.ForeignKey(
+        "propostas.Proposta",
+        on_delete=models.CASCADE,
+        related_name="revisoes",
+    )
+    numero = models.PositiveIntegerField()
+    motivo = models.CharField(max_length=20, choices=PropostaEvento.TIPO_CHOICES)
+    completa = models.BooleanField(default=False)
+    dados = models.BinaryField()
+    # Hash do conteúdo completo: evita revisão nova quando nada mudou
+    conteudo_hash = models.CharField(max_length=64)
+    usuario = models.ForeignKey(
+        "core.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["proposta", "numero"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["proposta", "numero"],
+                name="prop_revisao_numero_uniq",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.proposta_id} • rev. {self.numero}"
+
+
+class PropostaRollupDiario(models.Model):
+    """
+    Agregado diário das propostas por empresa (data de criação), status,
+    captação e cliente: quantidade e soma de `total`.
+
+    Mantido incrementalmente a cada criação/alteração/exclusão de proposta
+    (propostas.rollups) e recalculado pelo comando reconciliar_rollups.
+    Uma linha por combinação (constraints abaixo; captação nula tem a sua,
+    já que NULL não conta como repetido em UNIQUE). Ao excluir uma captação,
+    as linhas dela são somadas às sem captação (rollups.soltar_captacao).
+    """
+
+    company = models.ForeignKey(
+        "core.Empresa",
+        on_delete=models.CASCADE,
+        related_name="proposta_rollups",
+    )
+    dia = models.DateField()
+    status = models.CharField(max_length=20, choices=Proposta.STATUS_CHOICES)
+    captacao = models.ForeignKey(
+        "propostas.Captacao",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    cliente = models.ForeignKey(
+        "core.Contato",
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+    quantidade = models.IntegerField(default=0)
+    valor_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["company", "dia", "status", "captacao", "cliente"],
+                name="prop_rollup_chave_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["company", "dia", "status", "captacao", "cliente"],
+                condition=models.Q(captacao__isnull=False),
+                name="prop_rollup_chave_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["company", "dia", "status", "cliente"],
+                condition=models.Q(captacao__isnull=True),
+                name="prop_rollup_chave_sem_captacao_uniq",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.company_id} • {self.dia} • {self.status}"
+
+
+class PropostaItem(models.Model):
+    """
+    Índice normalizado dos itens da proposta (cópia de Proposta.itens),
+    com a categoria do serviço já resolvida, para relatórios agregados no
+    banco. Reconstruído a cada save da proposta (propostas.relatorios).
+    """
+
+    tenant_field = "company"
+
+    company = models.ForeignKey(
+        "core.Empresa",
+        on_delete=models.CASCADE,
+        related_name="proposta_itens",
+    )
+    proposta = models.ForeignKey(
+        "propostas.Proposta",
+        on_delete=models.CASCADE,
+        related_name="itens_indice",
+    )
+    posicao = models.PositiveIntegerField(default=0)
+    servico = models.ForeignKey(
+        "core.Servico",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    categoria = models.ForeignKey(
+        "core.CategoriaServico",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+    descricao = models.CharField(max_length=255, blank=True, default="")
+    valor = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+
+    objects = models.Manager()
+    tenant_objects = TenantManager()
+
+    class Meta:
+        ordering = ["proposta", "posicao"]
+        indexes = [
+            models.Index(fields=["company", "categoria"], name="prop_item_comp_categoria_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.proposta_id} • {self.descricao}"
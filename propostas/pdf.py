@@ -0,0 +1,186 @@
+import cProfile
+import io
+import logging
+import pstats
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from weasyprint import default_url_fetcher
+
+from core.metricas import BUCKETS_SEGUNDOS, registro
+
+
+logger = logging.getLogger(__name__)
+
+# Etapas do PDF, na ordem em que acontecem:
+# - template: render_to_string do HTML
+# - css: parse das folhas de estilo
+# - parse: parse do HTML
+# - layout: estilos, paginação e layout (inclui buscar os assets)
+# - pdf: geração do arquivo (write_pdf)
+ETAPAS_PDF = ("template", "css", "parse", "layout", "pdf")
+
+BUCKETS_ASSETS = (0, 1, 2, 5, 10, 20, 50)
+BUCKETS_BYTES = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000)
+
+# Linhas do relatório do cProfile (?profile=1)
+PERFIL_LINHAS = 40
+
+
+def faixa_paginas(paginas):
+    """
+    Rótulo de páginas dos histogramas (faixas, para não criar uma série por
+    número de páginas).
+    """
+    if paginas <= 1:
+        return "1"
+    if paginas <= 3:
+        return "2-3"
+    if paginas <= 7:
+        return "4-7"
+    return "8+"
+
+
+# =========================================================
+# MEDIÇÃO DE UM PDF
+# =========================================================
+
+class MedicaoPdf:
+    """
+    Tempo de cada etapa de um PDF, páginas geradas e os assets (logo,
+    imagens) buscados pelo WeasyPrint: quantidade, bytes e tempo.
+    """
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.etapas = {}
+        self.paginas = 0
+        self.assets = 0
+        self.assets_bytes = 0
+        self.assets_ms = 0.0
+        self.total_ms = 0.0
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas[nome] = self.etapas.get(nome, 0.0) + (time.perf_counter() - inicio) * 1000
+
+    def url_fetcher(self, url, *args, **kwargs):
+        """
+        url_fetcher do WeasyPrint: o padrão, contando o que foi buscado.
+        """
+        inicio = time.perf_counter()
+        try:
+            resultado = default_url_fetcher(url, *args, **kwargs)
+            if isinstance(resultado, dict):
+                if resultado.get("file_obj") is not None:
+                    # Lido aqui para saber o tamanho (o WeasyPrint leria inteiro)
+                    resultado["string"] = resultado.pop("file_obj").read()
+                conteudo = resultado.get("string") or b""
+                self.assets_bytes += len(conteudo)
+            return resultado
+        finally:
+            self.assets += 1
+            self.assets_ms += (time.perf_counter() - inicio) * 1000
+
+    def encerrar(self):
+        self.total_ms = (time.perf_counter() - self.inicio) * 1000
+
+    def como_dict(self):
+        return {
+            "total_ms": round(self.total_ms, 1),
+            **{f"{nome}_ms": round(self.etapas.get(nome, 0.0), 1) for nome in ETAPAS_PDF},
+            "paginas": self.paginas,
+            "assets": self.assets,
+            "assets_bytes": self.assets_bytes,
+            "assets_ms": round(self.assets_ms, 1),
+        }
+
+    def tabela(self):
+        linhas = [f"{'etapa':<10} {'ms':>10}"]
+        for nome in ETAPAS_PDF:
+            linhas.append(f"{nome:<10} {self.etapas.get(nome, 0.0):>10.1f}")
+        linhas.append(f"{'total':<10} {self.total_ms:>10.1f}")
+        linhas.append("")
+        linhas.append(f"páginas: {self.paginas}")
+        linhas.append(
+            f"assets: {self.assets} ({self.assets_bytes} bytes em {self.assets_ms:.1f}ms, "
+            "dentro do layout)"
+        )
+        return "\n".join(linhas)
+
+
+# =========================================================
+# MÉTRICAS E LOG
+# =========================================================
+
+_rotulos_pdf = ("empresa", "paginas")
+
+_duracao_etapa = registro.histograma(
+    "pdf_etapa_seconds", "Tempo de cada etapa da geração do PDF.", BUCKETS_SEGUNDOS, ("etapa",) + _rotulos_pdf
+)
+_duracao_total = registro.histograma(
+    "pdf_duration_seconds", "Tempo total da geração do PDF.", BUCKETS_SEGUNDOS, _rotulos_pdf
+)
+_assets = registro.histograma("pdf_assets", "Assets buscados por PDF.", BUCKETS_ASSETS, _rotulos_pdf)
+_assets_bytes = registro.histograma(
+    "pdf_assets_bytes", "Bytes de assets buscados por PDF.", BUCKETS_BYTES, _rotulos_pdf
+)
+
+
+def registrar_medicao_pdf(medicao, empresa_id, proposta_id):
+    """
+    Histogramas por empresa e faixa de páginas (com METRICAS_ATIVAS) e log
+    estruturado dos PDFs acima de PDF_LIMITE_MS.
+    """
+    rotulos = {"empresa": empresa_id, "paginas": faixa_paginas(medicao.paginas)}
+    if settings.METRICAS_ATIVAS:
+        for nome in ETAPAS_PDF:
+            registro.observar_histograma(
+                _duracao_etapa, medicao.etapas.get(nome, 0.0) / 1000, etapa=nome, **rotulos
+            )
+        registro.observar_histograma(_duracao_total, medicao.total_ms / 1000, **rotulos)
+        registro.observar_histograma(_assets, medicao.assets, **rotulos)
+        registro.observar_histograma(_assets_bytes, medicao.assets_bytes, **rotulos)
+
+    if medicao.total_ms >= settings.PDF_LIMITE_MS:
+        dados = {"empresa_id": empresa_id, "proposta_id": proposta_id, **medicao.como_dict()}
+        logger.warning(
+            "PDF lento: %s",
+            " ".join(f"{chave}={valor}" for chave, valor in dados.items()),
+            extra={"pdf": dados},
+        )
+
+
+# =========================================================
+# PERFIL (?profile=1)
+# =========================================================
+
+def perfilar(funcao):
+    """
+    Executa `funcao` sob o profiler e retorna (resultado, relatório em
+    texto). Usa o pyinstrument quando instalado; senão, o cProfile.
+    """
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            resultado = funcao()
+        finally:
+            profiler.stop()
+        return resultado, profiler.output_text(unicode=True, color=False)
+
+    profiler = cProfile.Profile()
+    resultado = profiler.runcall(funcao)
+    saida = io.StringIO()
+    pstats.Stats(profiler, stream=saida).sort_stats("cumulative").print_stats(PERFIL_LINHAS)
+    return resultado, saida.getvalue()
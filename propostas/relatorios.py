@@ -0,0 +1,218 @@
+import csv
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.models import Servico
+
+from .models import Captacao, Proposta, PropostaItem
+
+
+# Relatórios usam o cache de consultas por empresa (TenantQuerySet.cached):
+# a chave inclui o SQL com os filtros e muda a cada save de proposta. Na
+# falta no cache a consulta vai ao primário, mesmo com a view na réplica.
+RELATORIO_CACHE_TIMEOUT = 60 * 10
+
+STATUS_PIPELINE = ("rascunho", "em_andamento")
+
+
+# =========================================================
+# ÍNDICE DE ITENS (PropostaItem)
+# =========================================================
+
+def _decimal(valor):
+    try:
+        return Decimal(str(valor or "0")).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        return Decimal("0.00")
+
+
+def indexar_itens(proposta):
+    """
+    Reconstrói as linhas de PropostaItem a partir de Proposta.itens,
+    resolvendo a categoria de cada serviço do catálogo em uma consulta.
+    """
+    itens = proposta.itens if isinstance(proposta.itens, list) else []
+    itens = [it for it in itens if isinstance(it, dict)]
+
+    servico_ids = set()
+    for it in itens:
+        try:
+            servico_ids.add(int(it.get("servico_id")))
+        except (TypeError, ValueError):
+            pass
+    categorias = dict(
+        Servico.objects.filter(pk__in=servico_ids, empresa_id=proposta.company_id)
+        .values_list("pk", "categoria_id")
+    )
+
+    linhas = []
+    for posicao, it in enumerate(itens):
+        try:
+            servico_id = int(it.get("servico_id"))
+        except (TypeError, ValueError):
+            servico_id = None
+        if servico_id not in categorias:
+            servico_id = None
+        linhas.append(
+            PropostaItem(
+                company_id=proposta.company_id,
+                proposta_id=proposta.pk,
+                posicao=posicao,
+                servico_id=servico_id,
+                categoria_id=categorias.get(servico_id),
+                descricao=str(it.get("nome") or it.get("descricao") or "")[:255],
+                valor=_decimal(it.get("valor")),
+            )
+        )
+
+    with transaction.atomic():
+        PropostaItem.objects.filter(proposta_id=proposta.pk).delete()
+        PropostaItem.objects.bulk_create(linhas)
+
+
+# =========================================================
+# FILTROS
+# =========================================================
+
+def _inicio_do_dia(data):
+    return timezone.make_aware(datetime.combine(data, datetime.min.time()))
+
+
+@dataclass(frozen=True)
+class FiltrosRelatorio:
+    """
+    Filtros dos relatórios (período pela data de criação, status e captação).
+    """
+
+    inicio: object = None
+    fim: object = None
+    status: tuple = ()
+    captacao_id: int | None = None
+
+    @classmethod
+    def from_querydict(cls, dados):
+        status_validos = dict(Proposta.STATUS_CHOICES)
+        try:
+            captacao_id = int(dados.get("captacao") or 0) or None
+        except ValueError:
+            captacao_id = None
+        return cls(
+            inicio=parse_date(dados.get("inicio") or ""),
+            fim=parse_date(dados.get("fim") or ""),
+            status=tuple(sorted(s for s in dados.getlist("status") if s in status_validos)),
+            captacao_id=captacao_id,
+        )
+
+    def filtro_propostas(self, prefixo=""):
+        filtro = {}
+        if self.inicio:
+            filtro[f"{prefixo}created_at__gte"] = _inicio_do_dia(self.inicio)
+        if self.fim:
+            filtro[f"{prefixo}created_at__lt"] = _inicio_do_dia(self.fim + timedelta(days=1))
+        if self.status:
+            filtro[f"{prefixo}status__in"] = self.status
+        if self.captacao_id:
+            filtro[f"{prefixo}captacao_id"] = self.captacao_id
+        return filtro
+
+
+# =========================================================
+# RELATÓRIOS
+# =========================================================
+
+def _conversao(linha):
+    decididas = linha["aprovadas"] + linha["rejeitadas"]
+    linha["conversao"] = round(linha["aprovadas"] * 100 / decididas, 1) if decididas else None
+    return linha
+
+
+def relatorio_por_captacao(filtros):
+    """
+    Por captação: propostas, valor total, valor em pipeline (rascunho + em
+    andamento), aprovadas/rejeitadas e conversão.
+    """
+    aprovado = Q(status="aprovado")
+    linhas = (
+        Proposta.tenant_objects.filter(**filtros.filtro_propostas())
+        .values("captacao_id", "captacao__nome")
+        .annotate(
+            propostas=Count("id"),
+            valor_total=Sum("total"),
+            valor_pipeline=Sum("total", filter=Q(status__in=STATUS_PIPELINE)),
+            aprovadas=Count("id", filter=aprovado),
+            valor_aprovado=Sum("total", filter=aprovado),
+            rejeitadas=Count("id", filter=Q(status="rejeitado")),
+        )
+        .order_by("-valor_total")
+        .cached(RELATORIO_CACHE_TIMEOUT)
+    )
+    return [_conversao(dict(linha)) for linha in linhas]
+
+
+def relatorio_por_categoria(filtros):
+    """
+    Por categoria de serviço (itens do catálogo; itens personalizados ficam
+    em "Sem categoria"). Valores dos itens, antes do desconto da proposta.
+    """
+    aprovado = Q(proposta__status="aprovado")
+    linhas = (
+        PropostaItem.tenant_objects.filter(**filtros.filtro_propostas("proposta__"))
+        .values("categoria_id", "categoria__nome")
+        .annotate(
+            propostas=Count("proposta", distinct=True),
+            itens=Count("id"),
+            valor_total=Sum("valor"),
+            valor_pipeline=Sum("valor", filter=Q(proposta__status__in=STATUS_PIPELINE)),
+            aprovadas=Count("proposta", filter=aprovado, distinct=True),
+            valor_aprovado=Sum("valor", filter=aprovado),
+            rejeitadas=Count("proposta", filter=Q(proposta__status="rejeitado"), distinct=True),
+        )
+        .order_by("-valor_total")
+        .cached(RELATORIO_CACHE_TIMEOUT)
+    )
+    return [_conversao(dict(linha)) for linha in linhas]
+
+
+def captacoes_para_filtro():
+    return Captacao.tenant_objects.order_by("nome").values("id", "nome").cached()
+
+
+# =========================================================
+# CSV
+# =========================================================
+
+COLUNAS_CSV = (
+    ("propostas", "Propostas"),
+    ("valor_total", "Valor total"),
+    ("valor_pipeline", "Valor em pipeline"),
+    ("aprovadas", "Aprovadas"),
+    ("valor_aprovado", "Valor aprovado"),
+    ("rejeitadas", "Rejeitadas"),
+    ("conversao", "Conversão (%)"),
+)
+
+
+def escrever_csv(saida, linhas, campo_nome, titulo_nome, padrao_nome):
+    """
+    CSV no formato do Excel em português (separador ";", decimal com vírgula).
+    Valores sempre com 2 casas (o SQLite devolve a soma sem as casas).
+    """
+    writer = csv.writer(saida, delimiter=";")
+    writer.writerow([titulo_nome] + [titulo for _, titulo in COLUNAS_CSV])
+    for linha in linhas:
+        valores = []
+        for campo, _ in COLUNAS_CSV:
+            valor = linha.get(campo)
+            if valor is None:
+                # Soma sem linhas vira 0; conversão sem propostas decididas fica vazia
+                valor = "" if campo == "conversao" else 0
+            if campo.startswith("valor_"):
+                valor = f"{Decimal(valor):.2f}"
+            valores.append(str(valor).replace(".", ","))
+        writer.writerow([linha.get(campo_nome) or padrao_nome] + valores)
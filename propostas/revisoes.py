@@ -0,0 +1,182 @@
+import hashlib
+import json
+import zlib
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import Proposta, PropostaRevisao
+
+
+# Conteúdo da proposta guardado nas revisões (o que aparece para o cliente / no PDF)
+CAMPOS_REVISAO = (
+    "numero",
+    "titulo_servico",
+    "data_servico",
+    "validade",
+    "captacao_id",
+    "status",
+    "cliente_id",
+    "cep",
+    "logradouro",
+    "numero_end",
+    "bairro",
+    "cidade",
+    "uf",
+    "complemento",
+    "itens",
+    "parcelas",
+    "desconto_modo",
+    "desconto_input",
+    "desconto_valor",
+    "subtotal",
+    "total",
+    "exibir_apenas_total",
+    "objetivo_texto",
+    "exclusos_texto",
+    "escopo_texto",
+    "investimentos_texto",
+    "declaracoes_texto",
+    "confidencialidade_texto",
+    "assinatura_texto",
+    "prazo_inicio_texto",
+    "prazo_entrega_texto",
+    "usar_modelo_sistema",
+)
+
+# A cada N revisões o conteúdo é gravado completo: a reconstrução nunca
+# aplica mais que N - 1 deltas
+REVISAO_INTERVALO_COMPLETO = 10
+
+# Revisões são imutáveis: o conteúdo reconstruído pode ficar muito tempo em cache
+REVISAO_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+# PDFs de revisão maiores que isso (papel timbrado, muitas imagens) não vão
+# para o cache: são gerados de novo a cada download
+REVISAO_PDF_CACHE_MAX_BYTES = 1024 * 1024
+
+
+def _conteudo(proposta):
+    """
+    Conteúdo atual da proposta já normalizado para JSON (datas e decimais
+    como texto), para comparar com o das revisões.
+    """
+    dados = {campo: getattr(proposta, campo) for campo in CAMPOS_REVISAO}
+    return json.loads(json.dumps(dados, cls=DjangoJSONEncoder))
+
+
+def _hash(conteudo):
+    return hashlib.sha256(
+        json.dumps(conteudo, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def _comprimir(dados):
+    return zlib.compress(
+        json.dumps(dados, separators=(",", ":"), ensure_ascii=False).encode(), 9
+    )
+
+
+def _descomprimir(dados):
+    return json.loads(zlib.decompress(bytes(dados)))
+
+
+def _cache_key(proposta_id, numero):
+    return f"propostas:revisao:{proposta_id}:{numero}"
+
+
+def criar_revisao(proposta, motivo, usuario=None):
+    """
+    Registra o conteúdo atual da proposta como nova revisão, se ele mudou
+    desde a última. Retorna a revisão criada (ou None quando não mudou).
+    """
+    conteudo = _conteudo(proposta)
+    conteudo_hash = _hash(conteudo)
+
+    with transaction.atomic():
+        # Trava a proposta: duas revisões simultâneas não disputam o mesmo número
+        Proposta.objects.select_for_update().filter(pk=proposta.pk).first()
+
+        ultima = (
+            PropostaRevisao.objects.filter(proposta=proposta)
+            .only("numero", "conteudo_hash")
+            .order_by("-numero")
+            .first()
+        )
+        if ultima and ultima.conteudo_hash == conteudo_hash:
+            return None
+
+        numero = ultima.numero + 1 if ultima else 1
+        completa = (numero - 1) % REVISAO_INTERVALO_COMPLETO == 0
+        if completa:
+            dados = conteudo
+        else:
+            anterior = reconstruir_revisao(proposta.pk, ultima.numero)
+            dados = {
+                campo: valor
+                for campo, valor in conteudo.items()
+                if anterior.get(campo) != valor
+            }
+
+        revisao = PropostaRevisao.objects.create(
+            company_id=proposta.company_id,
+            proposta=proposta,
+            numero=numero,
+            motivo=motivo,
+            completa=completa,
+            dados=_comprimir(dados),
+            conteudo_hash=conteudo_hash,
+            usuario_id=getattr(usuario, "pk", None),
+        )
+
+    cache.set(_cache_key(proposta.pk, numero), conteudo, REVISAO_CACHE_TIMEOUT)
+    return revisao
+
+
+def reconstruir_revisao(proposta_id, numero):
+    """
+    Conteúdo completo da revisão `numero`: parte da última revisão completa
+    e aplica os deltas seguintes (uma consulta, no máximo
+    REVISAO_INTERVALO_COMPLETO linhas). Levanta PropostaRevisao.DoesNotExist.
+    """
+    key = _cache_key(proposta_id, numero)
+    conteudo = cache.get(key)
+    if conteudo is not None:
+        return conteudo
+
+    inicio = numero - (numero - 1) % REVISAO_INTERVALO_COMPLETO
+    linhas = list(
+        PropostaRevisao.objects.filter(
+            proposta_id=proposta_id,
+            numero__gte=inicio,
+            numero__lte=numero,
+        )
+        .order_by("numero")
+        .values_list("numero", "completa", "dados")
+    )
+    if not linhas or linhas[-1][0] != numero or not linhas[0][1]:
+        raise PropostaRevisao.DoesNotExist(
+            f"Revisão {numero} da proposta {proposta_id} não encontrada."
+        )
+
+    conteudo = {}
+    for _, _, dados in linhas:
+        conteudo.update(_descomprimir(dados))
+
+    cache.set(key, conteudo, REVISAO_CACHE_TIMEOUT)
+    return conteudo
+
+
+def proposta_da_revisao(proposta, numero):
+    """
+    Instância de Proposta (não salva) com o conteúdo da revisão, para
+    renderizar a página/PDF como estavam naquele momento.
+    """
+    conteudo = reconstruir_revisao(proposta.pk, numero)
+    antiga = Proposta(pk=proposta.pk, company=proposta.company)
+    for campo in CAMPOS_REVISAO:
+        if campo in conteudo:
+            field = Proposta._meta.get_field(campo.removesuffix("_id"))
+            setattr(antiga, field.attname, field.to_python(conteudo[campo]))
+    return antiga
@@ -0,0 +1,306 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.utils import timezone
+
+from .models import Proposta, PropostaRollupDiario
+
+
+# Campos da Proposta que definem a linha do rollup (além do valor)
+CAMPOS_ROLLUP = ("company_id", "created_at", "status", "captacao_id", "cliente_id", "total")
+
+DASHBOARD_MESES = 12
+
+ZERO = Decimal("0.00")
+
+# Ligado durante alterações em massa: os sinais deixam o rollup para quem
+# está fazendo a alteração (ver rollup_manual)
+_rollup_manual = ContextVar("rollup_manual", default=False)
+
+
+# =========================================================
+# MANUTENÇÃO INCREMENTAL
+# =========================================================
+
+def chave_rollup(proposta):
+    """
+    (company_id, dia, status, captacao_id, cliente_id, total) da proposta, ou
+    None se algum campo não estiver carregado (ex.: instância com .only()).
+    Lê de __dict__ para não disparar consultas de campos adiados.
+    """
+    valores = proposta.__dict__
+    if any(campo not in valores for campo in CAMPOS_ROLLUP):
+        return None
+    if valores["created_at"] is None:
+        return None
+    return (
+        valores["company_id"],
+        timezone.localdate(valores["created_at"]),
+        valores["status"],
+        valores["captacao_id"],
+        valores["cliente_id"],
+        valores["total"] or ZERO,
+    )
+
+
+def _aplicar(linha, quantidade, valor):
+    company_id, dia, status, captacao_id, cliente_id = linha
+    filtro = dict(
+        company_id=company_id,
+        dia=dia,
+        status=status,
+        captacao_id=captacao_id,
+        cliente_id=cliente_id,
+    )
+    pk = PropostaRollupDiario.objects.filter(**filtro).values_list("pk", flat=True).first()
+    if pk is None:
+        try:
+            with transaction.atomic():
+                PropostaRollupDiario.objects.create(quantidade=quantidade, valor_total=valor, **filtro)
+            return
+        except IntegrityError:
+            # Outra transação criou a linha entre a consulta e o INSERT
+            pk = PropostaRollupDiario.objects.filter(**filtro).values_list("pk", flat=True).get()
+    PropostaRollupDiario.objects.filter(pk=pk).update(
+        quantidade=F("quantidade") + quantidade,
+        valor_total=F("valor_total") + valor,
+    )
+
+
+def mover_rollup(antiga, nova):
+    """
+    Tira a proposta da linha `antiga` e soma na `nova` (qualquer uma pode ser
+    None: criação / exclusão). Nada acontece se a chave não mudou.
+    """
+    mover_rollups([(antiga, nova)])
+
+
+def mover_rollups(movimentos):
+    """
+    Aplica vários pares (antiga, nova) de uma vez, agrupando por linha do
+    rollup: um UPDATE por linha afetada, não por proposta. Usado pelas
+    alterações em massa (update()), que não passam pelos sinais.
+    """
+    deltas = {}
+    for antiga, nova in movimentos:
+        if antiga == nova:
+            continue
+        for chave, sinal in ((antiga, -1), (nova, 1)):
+            if chave is None:
+                continue
+            quantidade, valor = deltas.get(chave[:5], (0, ZERO))
+            deltas[chave[:5]] = (quantidade + sinal, valor + sinal * chave[5])
+    if not deltas:
+        return
+    with transaction.atomic():
+        for linha, (quantidade, valor) in deltas.items():
+            if quantidade or valor:
+                _aplicar(linha, quantidade, valor)
+
+
+def soltar_captacao(captacao_id):
+    """
+    Soma as linhas da captação nas linhas "sem captação" equivalentes e as
+    apaga. Chamado antes de excluir a captação: o SET_NULL do rollup criaria
+    uma segunda linha sem captação para a mesma chave (constraint).
+    """
+    with transaction.atomic():
+        linhas = PropostaRollupDiario.objects.select_for_update().filter(captacao_id=captacao_id)
+        movidas = list(
+            linhas.values_list("company_id", "dia", "status", "cliente_id", "quantidade", "valor_total")
+        )
+        linhas.delete()
+        for company_id, dia, status, cliente_id, quantidade, valor in movidas:
+            if quantidade or valor:
+                _aplicar((company_id, dia, status, None, cliente_id), quantidade, valor)
+
+
+@contextmanager
+def rollup_manual():
+    """
+    Desliga a manutenção do rollup pelos sinais da Proposta dentro do bloco.
+    Quem usa fica responsável por chamar mover_rollups (uma vez, em lote).
+    """
+    token = _rollup_manual.set(True)
+    try:
+        yield
+    finally:
+        _rollup_manual.reset(token)
+
+
+def rollup_pelos_sinais():
+    return not _rollup_manual.get()
+
+
+def chave_rollup_gravada(pk):
+    """
+    Chave do rollup com o estado gravado no banco (antes de save/delete).
+    """
+    row = Proposta.objects.filter(pk=pk).values(*CAMPOS_ROLLUP).first()
+    return chave_rollup(Proposta(**row)) if row is not None else None
+
+
+def chaves_rollup_gravadas(pks):
+    """
+    {pk: chave} com o estado gravado no banco, em uma consulta.
+    """
+    rows = Proposta.objects.filter(pk__in=pks).values("pk", *CAMPOS_ROLLUP)
+    return {row.pop("pk"): chave_rollup(Proposta(**row)) for row in rows}
+
+
+# =========================================================
+# RECONCILIAÇÃO
+# =========================================================
+
+DIMENSOES_ROLLUP = ("dia", "status", "captacao_id", "cliente_id")
+
+
+def _agregados_propostas(empresa_id):
+    return (
+        Proposta.objects.filter(company_id=empresa_id)
+        .annotate(dia=TruncDate("created_at"))
+        .values(*DIMENSOES_ROLLUP)
+        .annotate(quantidade=Count("id"), valor_total=Coalesce(Sum("total"), Value(ZERO)))
+        .order_by()
+    )
+
+
+def recalcular_rollups(empresa_id):
+    """
+    Refaz o rollup da empresa a partir das propostas. Retorna
+    (linhas_antes, linhas_depois).
+    """
+    linhas = [
+        PropostaRollupDiario(company_id=empresa_id, **linha)
+        for linha in _agregados_propostas(empresa_id)
+    ]
+    with transaction.atomic():
+        antes, _ = PropostaRollupDiario.objects.filter(company_id=empresa_id).delete()
+        PropostaRollupDiario.objects.bulk_create(linhas, batch_size=1000)
+    return antes, len(linhas)
+
+
+def divergencias_rollup(empresa_id):
+    """
+    Combinações (dia, status, captação, cliente) em que o rollup não bate
+    com as propostas: lista de (chave, (qtd, valor) real, (qtd, valor) rollup).
+    Lista vazia = consistente.
+    """
+    def _indexar(linhas):
+        return {
+            tuple(linha[d] for d in DIMENSOES_ROLLUP): (linha["qtd"], linha["valor"])
+            for linha in linhas
+            if linha["qtd"]
+        }
+
+    reais = _indexar(
+        {"qtd": linha["quantidade"], "valor": linha["valor_total"], **linha}
+        for linha in _agregados_propostas(empresa_id)
+    )
+    rollup = _indexar(
+        PropostaRollupDiario.objects.filter(company_id=empresa_id)
+        .values(*DIMENSOES_ROLLUP)
+        .annotate(qtd=Sum("quantidade"), valor=Sum("valor_total"))
+        .order_by()
+    )
+    return [
+        (chave, reais.get(chave), rollup.get(chave))
+        for chave in sorted(set(reais) | set(rollup), key=str)
+        if reais.get(chave) != rollup.get(chave)
+    ]
+
+
+# =========================================================
+# LEITURA (DASHBOARD)
+# =========================================================
+
+def _soma(filtro=None):
+    return Coalesce(
+        Sum("valor_total", filter=filtro),
+        Value(ZERO),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def _qtd(filtro=None):
+    return Coalesce(Sum("quantidade", filter=filtro), Value(0))
+
+
+def _taxa(aprovadas, rejeitadas):
+    decididas = aprovadas + rejeitadas
+    return round(aprovadas * 100 / decididas, 1) if decididas else None
+
+
+def resumo_dashboard(empresa_id, hoje=None):
+    """
+    Números do dashboard da home, lidos só do rollup (nunca das propostas):
+    indicadores do mês, pipeline em andamento, série dos últimos
+    DASHBOARD_MESES meses e principais captações/clientes do período.
+    """
+    hoje = hoje or timezone.localdate()
+    inicio_mes = hoje.replace(day=1)
+    inicio_serie = inicio_mes
+    for _ in range(DASHBOARD_MESES - 1):
+        inicio_serie = (inicio_serie - timedelta(days=1)).replace(day=1)
+
+    base = PropostaRollupDiario.objects.filter(company_id=empresa_id)
+    periodo = base.filter(dia__gte=inicio_serie)
+
+    aprovado = Q(status="aprovado")
+    rejeitado = Q(status="rejeitado")
+
+    pipeline = base.filter(status="em_andamento").aggregate(
+        qtd=_qtd(),
+        valor=_soma(),
+    )
+
+    meses = []
+    for linha in (
+        periodo.annotate(mes=TruncMonth("dia"))
+        .values("mes")
+        .annotate(
+            qtd=_qtd(),
+            valor=_soma(),
+            aprovadas=_qtd(aprovado),
+            valor_aprovado=_soma(aprovado),
+            rejeitadas=_qtd(rejeitado),
+        )
+        .order_by("mes")
+    ):
+        linha["taxa_aprovacao"] = _taxa(linha["aprovadas"], linha["rejeitadas"])
+        meses.append(linha)
+
+    mes_atual = next(
+        (m for m in meses if m["mes"] == inicio_mes),
+        {"qtd": 0, "valor": ZERO, "aprovadas": 0, "valor_aprovado": ZERO, "taxa_aprovacao": None},
+    )
+
+    totais_periodo = periodo.aggregate(aprovadas=_qtd(aprovado), rejeitadas=_qtd(rejeitado))
+
+    captacoes = list(
+        periodo.values("captacao_id", "captacao__nome")
+        .annotate(qtd=_qtd(), valor=_soma(), aprovadas=_qtd(aprovado))
+        .filter(qtd__gt=0)
+        .order_by("-valor")[:5]
+    )
+    clientes = list(
+        periodo.values("cliente_id", "cliente__nome_fantasia", "cliente__razao_social")
+        .annotate(qtd=_qtd(), valor=_soma(), valor_aprovado=_soma(aprovado))
+        .filter(qtd__gt=0)
+        .order_by("-valor")[:5]
+    )
+
+    return {
+        "mes_atual": mes_atual,
+        "pipeline": pipeline,
+        "taxa_aprovacao_periodo": _taxa(totais_periodo["aprovadas"], totais_periodo["rejeitadas"]),
+        "meses": meses,
+        "captacoes": captacoes,
+        "clientes": clientes,
+        "inicio_periodo": inicio_serie,
+    }
@@ -0,0 +1,17 @@
+from .rollups import resumo_dashboard
+
+
+# =========================================================
+# SERVIÇOS USADOS POR OUTROS APPS
+# =========================================================
+# Ponto de entrada do core (home) nos dados de propostas: o core importa
+# este módulo só dentro das views, sem depender de propostas ao carregar.
+
+def dashboard_empresa(empresa):
+    """
+    Números do dashboard da home (propostas.rollups.resumo_dashboard), ou
+    None quando o usuário não tem empresa.
+    """
+    if empresa is None:
+        return None
+    return resumo_dashboard(empresa.pk)
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import Servico
+
+from .models import Captacao, Proposta, PropostaItem
+from .relatorios import indexar_itens
+from .rollups import chave_rollup, chave_rollup_gravada, mover_rollup, rollup_pelos_sinais, soltar_captacao
+
+
+@receiver(pre_save, sender=Proposta)
+@receiver(pre_delete, sender=Proposta)
+def proposta_antes_de_gravar(sender, instance, **kwargs):
+    # Estado no banco (não o da instância, que pode estar desatualizada)
+    instance._rollup_chave = None
+    if rollup_pelos_sinais() and not instance._state.adding and instance.pk:
+        instance._rollup_chave = chave_rollup_gravada(instance.pk)
+
+
+@receiver(post_save, sender=Proposta)
+def proposta_salva(sender, instance, update_fields=None, **kwargs):
+    if rollup_pelos_sinais():
+        nova = chave_rollup(instance)
+        if nova is None:
+            # Instância parcial (.only() / update_fields): estado atual vem do banco
+            nova = chave_rollup_gravada(instance.pk)
+        mover_rollup(instance._rollup_chave, nova)
+
+    if update_fields is None or "itens" in update_fields:
+        indexar_itens(instance)
+
+
+@receiver(post_save, sender=Servico)
+def servico_salvo(sender, instance, **kwargs):
+    # Mantém a categoria dos itens já indexados em dia com o catálogo
+    PropostaItem.objects.filter(servico=instance).exclude(
+        categoria_id=instance.categoria_id
+    ).update(categoria_id=instance.categoria_id)
+
+
+@receiver(post_delete, sender=Proposta)
+def proposta_excluida(sender, instance, **kwargs):
+    if rollup_pelos_sinais():
+        mover_rollup(instance._rollup_chave, None)
+
+
+@receiver(pre_delete, sender=Captacao)
+def captacao_antes_de_excluir(sender, instance, **kwargs):
+    # As propostas ficam sem captação (SET_NULL): o rollup acompanha
+    soltar_captacao(instance.pk)
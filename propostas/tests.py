@@ -1,3 +1,1076 @@
-from django.test import TestCase
+import io
+import json
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.test import Client
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.managers import tenant_context
+from core.services import get_proposta_defaults
+from core.models import CategoriaServico, Contato, Empresa, PropostaConfiguracao, Servico, User
+
+from . import ao_vivo, expiracao, pdf, tracking, views
+from .buffers import EventBuffer
+from .eventos import registrar_evento_proposta
+from .expiracao import STATUS_EXPIRADA, expirar_propostas, politicas_expiracao
+from .metricas import funil_propostas
+from .models import (
+    Captacao,
+    Proposta,
+    PropostaEvento,
+    PropostaResposta,
+    PropostaRevisao,
+    PropostaRollupDiario,
+)
+from .relatorios import COLUNAS_CSV, FiltrosRelatorio, relatorio_por_captacao, relatorio_por_categoria
+from .revisoes import REVISAO_PDF_CACHE_MAX_BYTES, criar_revisao
+from .rollups import divergencias_rollup
+
+
+# =========================================================
+# RASTREAMENTO DA PÁGINA PÚBLICA
+# =========================================================
+
+class TrackingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        cliente = Contato.objects.create(empresa=empresa, nome_fantasia="Cliente A")
+        self.proposta = Proposta.objects.create(
+            company=empresa, numero="A-1", titulo_servico="Obra A", cliente=cliente
+        )
+        self.url = reverse("propostas:proposta_public_evento", args=[self.proposta.public_token])
+        self.dados = {"id": tracking.assinar_proposta(self.proposta), "tipo": "abertura"}
+
+    def _enviar(self, dados, **extra):
+        with mock.patch.object(tracking, "registrar_evento") as registrar:
+            response = self.client.post(self.url, dados, **extra)
+        return response, registrar
+
+    def test_evento_repetido_conta_uma_vez(self):
+        response, registrar = self._enviar(self.dados)
+        self.assertEqual(response.status_code, 204)
+        registrar.assert_called_once_with(self.proposta.pk, self.proposta.company_id, "abertura", 0)
+
+        response, registrar = self._enviar(self.dados)
+        self.assertEqual(response.status_code, 204)
+        registrar.assert_not_called()
+
+        # Outro visitante conta
+        _, registrar = self._enviar(self.dados, REMOTE_ADDR="10.0.0.2")
+        registrar.assert_called_once()
+
+    def test_pdf_vem_do_beacon(self):
+        _, registrar = self._enviar({**self.dados, "tipo": "pdf"})
+        registrar.assert_called_once_with(self.proposta.pk, self.proposta.company_id, "pdf", 0)
+
+    def test_assinatura_expirada_ou_de_outra_proposta(self):
+        with mock.patch.object(tracking, "TRACKING_VALIDADE", -1):
+            response, registrar = self._enviar(self.dados)
+        self.assertEqual(response.status_code, 400)
+        registrar.assert_not_called()
+
+        outra = Proposta.objects.create(
+            company=self.proposta.company, numero="A-2", titulo_servico="Obra", cliente=self.proposta.cliente
+        )
+        response, _ = self._enviar({**self.dados, "id": tracking.assinar_proposta(outra)})
+        self.assertEqual(response.status_code, 400)
+
+
+# =========================================================
+# PÁGINA PÚBLICA (ETag / Last-Modified)
+# =========================================================
+
+@override_settings(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+)
+class PaginaPublicaCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+        self.proposta = Proposta.objects.create(
+            company=self.empresa,
+            numero="A-1",
+            titulo_servico="Obra A",
+            cliente=cliente,
+            permitir_acesso_publico=True,
+        )
+        self.url = reverse("propostas:proposta_public_view", args=[self.proposta.public_token])
+
+    def _etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_if_none_match_devolve_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+
+        with mock.patch.object(views, "render_to_string") as renderizar:
+            revalidada = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+            por_data = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        renderizar.assert_not_called()
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertEqual(revalidada.content, b"")
+        self.assertEqual(revalidada["ETag"], response["ETag"])
+        self.assertEqual(por_data.status_code, 304)
+
+    def test_editar_proposta_muda_o_etag(self):
+        etag = self._etag()
+        self.proposta.titulo_servico = "Obra revisada"
+        self.proposta.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertContains(response, "Obra revisada")
+
+    def test_editar_empresa_muda_o_etag(self):
+        etag = self._etag()
+        self.empresa.nome_fantasia = "Empresa A Ltda"
+        self.empresa.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_acesso_publico_revogado(self):
+        etag = self._etag()
+        Proposta.objects.filter(pk=self.proposta.pk).update(permitir_acesso_publico=False)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+
+# =========================================================
+# PDF DE REVISÕES
+# =========================================================
+
+class RevisaoPdfTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+        proposta = Proposta.objects.create(
+            company=self.empresa, numero="A-1", titulo_servico="Obra A", cliente=cliente
+        )
+        criar_revisao(proposta, "envio")
+        self.url = reverse("propostas:proposta_revisao_pdf", args=[proposta.pk, 1])
+        self.client.force_login(User.objects.create_user("ana", empresa=self.empresa, user_type="owner"))
+
+    def _baixar(self, pdf=b"%PDF-1.7"):
+        with mock.patch.object(views, "_renderizar_pdf", return_value=pdf) as renderizar:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return renderizar.call_count
+
+    def test_pdf_em_cache_ate_mudar_a_configuracao(self):
+        self.assertEqual(self._baixar(), 1)
+        self.assertEqual(self._baixar(), 0)
+
+        PropostaConfiguracao.objects.create(empresa=self.empresa, margem_superior=30)
+        self.assertEqual(self._baixar(), 1)
+        self.assertEqual(self._baixar(), 0)
+
+    def test_pdf_grande_nao_vai_para_o_cache(self):
+        grande = b"%PDF-" + b"0" * REVISAO_PDF_CACHE_MAX_BYTES
+        self.assertEqual(self._baixar(grande), 1)
+        self.assertEqual(self._baixar(grande), 1)
+
+
+# =========================================================
+# GERAÇÃO DO PDF (etapas, métricas e benchmark)
+# =========================================================
+
+class _DocumentoFalso:
+    pages = [object()] * 3
+
+    def write_pdf(self):
+        return b"%PDF-1.7 falso"
+
+
+class _HTMLFalso:
+    """
+    No lugar do weasyprint.HTML: busca um asset pelo url_fetcher, como o
+    layout faz com o logo.
+    """
+
+    def __init__(self, string, base_url, url_fetcher):
+        self.url_fetcher = url_fetcher
+
+    def render(self, stylesheets):
+        self.url_fetcher("file:///media/logo.png")
+        return _DocumentoFalso()
+
+
+@override_settings(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+)
+class PdfEtapasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+        self.proposta = Proposta.objects.create(
+            company=self.empresa, numero="A-1", titulo_servico="Obra A", cliente=cliente
+        )
+        for patcher in (
+            mock.patch.object(views, "HTML", _HTMLFalso),
+            mock.patch.object(views, "CSS"),
+            mock.patch.object(pdf, "default_url_fetcher", lambda url: {"file_obj": io.BytesIO(b"x" * 2048)}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.request = RequestFactory().get("/")
+
+    def _renderizar(self):
+        with mock.patch.object(pdf.registro, "observar_histograma") as observar:
+            pdf_file = views._renderizar_pdf(self.request, self.proposta, self.empresa)
+        self.assertEqual(pdf_file, b"%PDF-1.7 falso")
+        return observar
+
+    @override_settings(METRICAS_ATIVAS=True, PDF_LIMITE_MS=60_000)
+    def test_metricas_por_etapa(self):
+        with self.assertNoLogs("propostas.pdf", "WARNING"):
+            observar = self._renderizar()
+
+        rotulos = {"empresa": self.empresa.pk, "paginas": "2-3"}
+        chamadas = [(c.args[0], c.args[1], c.kwargs) for c in observar.call_args_list]
+        etapas = [kwargs.pop("etapa") for familia, _, kwargs in chamadas if familia is pdf._duracao_etapa]
+        self.assertEqual(etapas, list(pdf.ETAPAS_PDF))
+        self.assertTrue(all(kwargs == rotulos for _, _, kwargs in chamadas))
+
+        valores = {familia: valor for familia, valor, _ in chamadas}
+        self.assertEqual(valores[pdf._assets], 1)
+        self.assertEqual(valores[pdf._assets_bytes], 2048)
+        self.assertGreater(valores[pdf._duracao_total], 0)
+
+    @override_settings(METRICAS_ATIVAS=False, PDF_LIMITE_MS=0)
+    def test_log_acima_do_limite(self):
+        with self.assertLogs("propostas.pdf", "WARNING") as logs:
+            observar = self._renderizar()
+        # Sem METRICAS_ATIVAS o log continua, os histogramas não
+        observar.assert_not_called()
+
+        (registro,) = logs.records
+        self.assertTrue(registro.getMessage().startswith("PDF lento: "))
+        campos = ("empresa_id", "proposta_id", "paginas", "assets", "assets_bytes")
+        self.assertEqual(
+            {chave: registro.pdf[chave] for chave in campos},
+            {
+                "empresa_id": self.empresa.pk,
+                "proposta_id": self.proposta.pk,
+                "paginas": 3,
+                "assets": 1,
+                "assets_bytes": 2048,
+            },
+        )
+        self.assertTrue({f"{nome}_ms" for nome in pdf.ETAPAS_PDF} <= set(registro.pdf))
+
+    def test_profile_so_para_staff(self):
+        url = reverse("propostas:proposta_public_pdf", args=[self.proposta.pk])
+        usuario = User.objects.create_user("ana", empresa=self.empresa, user_type="owner")
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(url, {"profile": "1"})["Content-Type"], "application/pdf")
+
+        User.objects.filter(pk=usuario.pk).update(is_staff=True)
+        with mock.patch.object(pdf.registro, "observar_histograma") as observar:
+            response = self.client.get(url, {"profile": "1"})
+        observar.assert_not_called()
+        self.assertEqual(response["Content-Type"], "text/plain; charset=utf-8")
+        self.assertContains(response, "páginas: 3")
+
+
+class BenchmarkPdfTests(TestCase):
+    def _caso(self, imagem):
+        empresas = Empresa.objects.count()
+        papel_timbrado = []
+
+        def renderizar(request, proposta, empresa, medicao):
+            papel_timbrado.append(get_proposta_defaults(empresa).papel_timbrado)
+            with default_storage.open(papel_timbrado[-1]) as arquivo:
+                papel_timbrado.append(arquivo.read()[:8])
+            return b"%PDF-1.7 falso"
+
+        saida = StringIO()
+        with mock.patch.object(views, "_renderizar_pdf", renderizar):
+            call_command(
+                "benchmark_pdf",
+                caso=json.dumps({"itens": 2, "texto": "curto", "imagem": imagem}),
+                repeticoes=1,
+                stdout=saida,
+            )
+        # Nada do caso fica no banco
+        self.assertEqual(Empresa.objects.count(), empresas)
+        return json.loads(saida.getvalue()), papel_timbrado
+
+    def test_caso_com_papel_timbrado(self):
+        cache.clear()
+        resultado, papel_timbrado = self._caso("papel_timbrado")
+        self.assertEqual(resultado["imagem"], "papel_timbrado")
+        self.assertEqual(resultado["bytes"], len(b"%PDF-1.7 falso"))
+        self.assertEqual(set(resultado["etapas_mediana_ms"]), set(pdf.ETAPAS_PDF))
+        nome, cabecalho = papel_timbrado
+        self.assertTrue(nome.startswith("propostas/papel_timbrado/"))
+        self.assertEqual(cabecalho, b"\x89PNG\r\n\x1a\n")
+
+    def test_imagem_invalida(self):
+        with self.assertRaisesMessage(CommandError, "timbrado"):
+            call_command("benchmark_pdf", imagens="logo,timbrado", stdout=StringIO())
+
+
+# =========================================================
+# KANBAN AO VIVO
+# =========================================================
+
+class KanbanAoVivoTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        self.cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+
+    def _criar(self, numero):
+        return Proposta.objects.create(
+            company=self.empresa, numero=numero, titulo_servico="Obra", cliente=self.cliente
+        )
+
+    def _versao(self):
+        return ao_vivo.versoes_quadros([self.empresa.pk])[self.empresa.pk]
+
+    def test_versao_vem_do_banco(self):
+        self.assertIsNone(self._versao())
+        proposta = self._criar("A-1")
+        outra = self._criar("A-2")
+
+        versao = self._versao()
+        # Nada passa pelo cache: limpar não muda a versão
+        cache.clear()
+        self.assertEqual(self._versao(), versao)
+
+        Proposta.objects.filter(pk=proposta.pk).update(status="aprovado", updated_at=timezone.now())
+        self.assertNotEqual(self._versao(), versao)
+
+        versao = self._versao()
+        Proposta.objects.filter(pk=outra.pk).delete()
+        self.assertNotEqual(self._versao(), versao)
+
+    def test_mudancas_quadro_traz_alteradas_e_removidas(self):
+        proposta = self._criar("A-1")
+        estado = ao_vivo.estado_inicial(self.empresa.pk, self._versao())
+        # Primeira verificação reenvia a janela de sobreposição
+        ao_vivo.mudancas_quadro(self.empresa.pk, estado)
+        self.assertIsNone(ao_vivo.mudancas_quadro(self.empresa.pk, estado))
+
+        nova = self._criar("A-2")
+        Proposta.objects.filter(pk=proposta.pk).delete()
+        lote = ao_vivo.mudancas_quadro(self.empresa.pk, estado)
+        self.assertEqual([item["id"] for item in lote["propostas"]], [nova.pk])
+        self.assertEqual(lote["removidas"], [proposta.pk])
+
+
+# =========================================================
+# EXPIRAÇÃO
+# =========================================================
+
+class PoliticaExpiracaoTests(TestCase):
+    def test_expiracao_desligada_ate_a_empresa_ativar(self):
+        empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        self.assertFalse(next(politicas_expiracao(empresa.pk)).ativa)
+
+        PropostaConfiguracao.objects.create(empresa=empresa)
+        self.assertFalse(next(politicas_expiracao(empresa.pk)).ativa)
+
+        PropostaConfiguracao.objects.filter(empresa=empresa).update(expirar_vencidas=True)
+        self.assertTrue(next(politicas_expiracao(empresa.pk)).ativa)
+
+
+class ExpirarPropostasTests(TestCase):
+    def setUp(self):
+        self.hoje = timezone.localdate()
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        PropostaConfiguracao.objects.create(empresa=self.empresa, expirar_vencidas=True)
+        self.cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+
+    def _criar(self, numero, dias, status="em_andamento", empresa=None, cliente=None):
+        return Proposta.objects.create(
+            company=empresa or self.empresa,
+            numero=numero,
+            titulo_servico="Obra",
+            cliente=cliente or self.cliente,
+            status=status,
+            validade=self.hoje + timedelta(days=dias),
+        )
+
+    def _politica(self, empresa=None):
+        return next(politicas_expiracao((empresa or self.empresa).pk))
+
+    def _status(self, *propostas):
+        return [Proposta.objects.get(pk=p.pk).status for p in propostas]
+
+    def test_arquiva_vencidas_com_evento_e_rollup(self):
+        vencida = self._criar("A-1", -1)
+        no_prazo = self._criar("A-2", 0)
+        rascunho = self._criar("A-3", -1, status="rascunho")
+        aprovada = self._criar("A-4", -1, status="aprovado")
+
+        self.assertEqual(expirar_propostas(self._politica(), hoje=self.hoje), 1)
+        self.assertEqual(
+            self._status(vencida, no_prazo, rascunho, aprovada),
+            [STATUS_EXPIRADA, "em_andamento", "rascunho", "aprovado"],
+        )
+        evento = PropostaEvento.objects.get(tipo="arquivada")
+        self.assertEqual((evento.proposta_id, evento.origem, evento.usuario_id), (vencida.pk, "sistema", None))
+        self.assertEqual(divergencias_rollup(self.empresa.pk), [])
+
+        # Rodar de novo não repete o evento
+        self.assertEqual(expirar_propostas(self._politica(), hoje=self.hoje), 0)
+        self.assertEqual(PropostaEvento.objects.filter(tipo="arquivada").count(), 1)
+
+    def test_tolerancia_e_rascunhos(self):
+        PropostaConfiguracao.objects.filter(empresa=self.empresa).update(
+            expirar_apos_dias=3, expirar_rascunhos=True
+        )
+        na_tolerancia = self._criar("A-1", -3)
+        vencida = self._criar("A-2", -4)
+        rascunho = self._criar("A-3", -4, status="rascunho")
+
+        self.assertEqual(expirar_propostas(self._politica(), hoje=self.hoje), 2)
+        self.assertEqual(
+            self._status(na_tolerancia, vencida, rascunho), ["em_andamento", STATUS_EXPIRADA, STATUS_EXPIRADA]
+        )
+
+    def test_lotes_ate_acabar(self):
+        for i in range(5):
+            self._criar(f"A-{i}", -1)
+
+        with mock.patch.object(expiracao, "mudar_status_em_lote", wraps=expiracao.mudar_status_em_lote) as lote:
+            self.assertEqual(expirar_propostas(self._politica(), hoje=self.hoje, lote=2), 5)
+        # 2 + 2 + 1 e a chamada vazia que encerra
+        self.assertEqual(lote.call_count, 4)
+        self.assertEqual({c.kwargs["limite"] for c in lote.call_args_list}, {2})
+        self.assertFalse(Proposta.objects.exclude(status=STATUS_EXPIRADA).exists())
+
+    def test_empresa_com_politica_desligada_fica_de_fora(self):
+        desligada = Empresa.objects.create(nome_fantasia="Empresa B")
+        PropostaConfiguracao.objects.create(empresa=desligada)
+        sem_config = Empresa.objects.create(nome_fantasia="Empresa C")
+        propostas_b = []
+        for empresa in (desligada, sem_config):
+            cliente = Contato.objects.create(empresa=empresa, nome_fantasia="Cliente")
+            propostas_b.append(self._criar(f"B-{empresa.pk}", -10, empresa=empresa, cliente=cliente))
+        vencida = self._criar("A-1", -1)
+
+        self.assertEqual(expirar_propostas(self._politica(desligada), hoje=self.hoje), 0)
+        saida = StringIO()
+        call_command("expirar_propostas", stdout=saida)
+
+        self.assertEqual(self._status(vencida, *propostas_b), [STATUS_EXPIRADA, "em_andamento", "em_andamento"])
+        self.assertIn(f"Empresa {self.empresa.pk}: 1 proposta(s) arquivada(s).", saida.getvalue())
+        self.assertIn("1 proposta(s) arquivada(s).", saida.getvalue().splitlines()[-1])
+        self.assertEqual(PropostaEvento.objects.filter(tipo="arquivada").count(), 1)
+
+    def test_comando_simular_e_data(self):
+        vencida = self._criar("A-1", -1)
+        saida = StringIO()
+        call_command("expirar_propostas", simular=True, stdout=saida)
+        self.assertIn("1 proposta(s) vencida(s).", saida.getvalue())
+        self.assertEqual(self._status(vencida), ["em_andamento"])
+
+        # Com a data de referência de anteontem, ainda estava no prazo
+        anteontem = (self.hoje - timedelta(days=2)).isoformat()
+        call_command("expirar_propostas", data=anteontem, lote=1, stdout=StringIO())
+        self.assertEqual(self._status(vencida), ["em_andamento"])
+
+        with self.assertRaisesMessage(CommandError, "--lote"):
+            call_command("expirar_propostas", lote=0)
+        with self.assertRaisesMessage(CommandError, "--data"):
+            call_command("expirar_propostas", data="31/12/2025")
+
+
+# =========================================================
+# RELATÓRIOS
+# =========================================================
+
+class RelatoriosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        self.captacao = Captacao.objects.create(company=self.empresa, nome="Indicação")
+        categoria = CategoriaServico.objects.create(empresa=self.empresa, nome="Elétrica")
+        self.eletrica = Servico.objects.create(empresa=self.empresa, descricao="Quadro", categoria=categoria)
+        self.avulso = Servico.objects.create(empresa=self.empresa, descricao="Visita")
+
+        self._criar(self.empresa, "A-1", "aprovado", "100.00", [(self.eletrica, "60"), (self.avulso, "40")])
+        self._criar(self.empresa, "A-2", "rejeitado", "50.00", [(self.eletrica, "50")])
+        self._criar(self.empresa, "A-3", "em_andamento", "30.00", [(None, "30")], captacao=None)
+
+        # Outra empresa, com captação e categoria de mesmo nome
+        outra = Empresa.objects.create(nome_fantasia="Empresa B")
+        outra_categoria = CategoriaServico.objects.create(empresa=outra, nome="Elétrica")
+        servico = Servico.objects.create(empresa=outra, descricao="Quadro", categoria=outra_categoria)
+        captacao = Captacao.objects.create(company=outra, nome="Indicação")
+        self._criar(outra, "B-1", "aprovado", "999.00", [(servico, "999")], captacao=captacao)
+
+        self.client.force_login(User.objects.create_user("ana", empresa=self.empresa, user_type="owner"))
+        self.url = reverse("propostas:propostas_relatorios")
+
+    def _criar(self, empresa, numero, status, total, itens, captacao=...):
+        return Proposta.objects.create(
+            company=empresa,
+            numero=numero,
+            titulo_servico="Obra",
+            cliente=Contato.objects.create(empresa=empresa, nome_fantasia=f"Cliente {numero}"),
+            captacao=self.captacao if captacao is ... else captacao,
+            status=status,
+            total=Decimal(total),
+            itens=[
+                {"servico_id": getattr(servico, "pk", None), "nome": "Item", "valor": valor}
+                for servico, valor in itens
+            ],
+        )
+
+    def _resumo(self, linhas, campo):
+        colunas = [campo for campo, _ in COLUNAS_CSV]
+        return {linha[campo]: tuple(linha[c] for c in colunas) for linha in linhas}
+
+    def test_por_captacao(self):
+        with tenant_context(self.empresa):
+            linhas = relatorio_por_captacao(FiltrosRelatorio())
+        self.assertEqual(
+            self._resumo(linhas, "captacao__nome"),
+            {
+                "Indicação": (2, Decimal("150.00"), None, 1, Decimal("100.00"), 1, 50.0),
+                None: (1, Decimal("30.00"), Decimal("30.00"), 0, None, 0, None),
+            },
+        )
+
+    def test_por_categoria(self):
+        with tenant_context(self.empresa):
+            linhas = relatorio_por_categoria(FiltrosRelatorio())
+        self.assertEqual(
+            self._resumo(linhas, "categoria__nome"),
+            {
+                "Elétrica": (2, Decimal("110.00"), None, 1, Decimal("60.00"), 1, 50.0),
+                # Serviço sem categoria e item personalizado
+                None: (2, Decimal("70.00"), Decimal("30.00"), 1, Decimal("40.00"), 0, 100.0),
+            },
+        )
+        self.assertEqual([linha["itens"] for linha in linhas], [2, 2])
+
+    def test_filtros(self):
+        filtros = FiltrosRelatorio(status=("aprovado", "rejeitado"), captacao_id=self.captacao.pk)
+        with tenant_context(self.empresa):
+            por_captacao = relatorio_por_captacao(filtros)
+            por_categoria = relatorio_por_categoria(filtros)
+        self.assertEqual([linha["captacao__nome"] for linha in por_captacao], ["Indicação"])
+        self.assertEqual(
+            self._resumo(por_categoria, "categoria__nome"),
+            {
+                "Elétrica": (2, Decimal("110.00"), None, 1, Decimal("60.00"), 1, 50.0),
+                None: (1, Decimal("40.00"), None, 1, Decimal("40.00"), 0, 100.0),
+            },
+        )
+
+    def test_csv(self):
+        response = self.client.get(self.url, {"exportar": "captacao"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn('filename="relatorio_captacao_', response["Content-Disposition"])
+
+        conteudo = response.content.decode("utf-8")
+        self.assertTrue(conteudo.startswith("\ufeff"))
+        self.assertEqual(
+            conteudo[1:].splitlines(),
+            [
+                "Captação;Propostas;Valor total;Valor em pipeline;Aprovadas;Valor aprovado;Rejeitadas;Conversão (%)",
+                "Indicação;2;150,00;0,00;1;100,00;1;50,0",
+                "Sem captação;1;30,00;30,00;0;0,00;0;",
+            ],
+        )
+
+    def test_csv_por_categoria_so_da_empresa(self):
+        response = self.client.get(self.url, {"exportar": "categoria", "status": "aprovado"})
+        linhas = response.content.decode("utf-8")[1:].splitlines()
+        self.assertEqual(linhas[0].split(";")[0], "Categoria")
+        self.assertEqual(
+            linhas[1:],
+            ["Elétrica;1;60,00;0,00;1;60,00;0;100,0", "Sem categoria;1;40,00;0,00;1;40,00;0;100,0"],
+        )
+        self.assertNotIn("999", response.content.decode("utf-8"))
+
+
+# =========================================================
+# COMANDOS DE CARGA
+# =========================================================
+
+class ComandosCargaTests(TestCase):
+    @override_settings(DEBUG=False)
+    def test_loadtest_exige_forcar_sem_debug(self):
+        with self.assertRaisesMessage(CommandError, "--forcar"):
+            call_command("loadtest_respostas_publicas", envios=1, threads=1)
+        self.assertFalse(Proposta.objects.exists())
+
+    @override_settings(DEBUG=True)
+    def test_loadtest_conta_erro_por_envio(self):
+        empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        Contato.objects.create(empresa=empresa, nome_fantasia="Cliente A")
+        chamadas = []
+
+        def post_instavel(client, *args, **kwargs):
+            # Sem chegar à view: a thread do comando não enxerga a transação do teste
+            chamadas.append(1)
+            if len(chamadas) == 1:
+                raise RuntimeError("database is locked")
+            return mock.Mock(status_code=200)
+
+        saida, erros = StringIO(), StringIO()
+        with mock.patch.object(Client, "post", post_instavel):
+            with self.assertRaisesMessage(CommandError, "inconsistente"):
+                call_command(
+                    "loadtest_respostas_publicas",
+                    envios=3,
+                    threads=1,
+                    reenvios=0,
+                    stdout=saida,
+                    stderr=erros,
+                )
+        # O erro não interrompe os demais envios da thread
+        self.assertEqual(len(chamadas), 3)
+        self.assertIn("erros: 1", saida.getvalue())
+        self.assertIn("database is locked", erros.getvalue())
+
+    @override_settings(DEBUG=False)
+    def test_gerar_dados_carga_exige_forcar_sem_debug(self):
+        with self.assertRaisesMessage(CommandError, "--forcar"):
+            call_command("gerar_dados_carga", empresas=1)
+        self.assertFalse(Empresa.objects.exists())
+
+    def _gerar(self, **opcoes):
+        call_command(
+            "gerar_dados_carga", empresas=1, propostas=3, contatos=2, servicos=2, stdout=StringIO(), **opcoes
+        )
+        return User.objects.get(username="carga1")
+
+    @override_settings(DEBUG=True)
+    def test_usuario_gerado_sem_senha_utilizavel(self):
+        usuario = self._gerar()
+        self.assertFalse(usuario.has_usable_password())
+        self.assertEqual(usuario.empresa.propostas.count(), Proposta.objects.count())
+
+    @override_settings(DEBUG=False)
+    def test_senha_explicita_e_forcar(self):
+        usuario = self._gerar(senha="uma-senha-longa", forcar=True)
+        self.assertTrue(usuario.check_password("uma-senha-longa"))
+
+    @override_settings(DEBUG=True)
+    def test_limpar_remove_so_empresas_de_carga(self):
+        outra = Empresa.objects.create(nome_fantasia="Empresa real")
+        self._gerar()
+        call_command("gerar_dados_carga", empresas=0, limpar=True, stdout=StringIO())
+        self.assertEqual(list(Empresa.objects.all()), [outra])
+
+
+# =========================================================
+# ROLLUP DIÁRIO
+# =========================================================
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        self.cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+        self.captacao = Captacao.objects.create(company=self.empresa, nome="Indicação")
+
+    def _criar(self, numero, total, captacao=None):
+        return Proposta.objects.create(
+            company=self.empresa,
+            numero=numero,
+            titulo_servico="Obra",
+            cliente=self.cliente,
+            captacao=captacao,
+            total=Decimal(total),
+        )
+
+    def _linhas(self):
+        return set(
+            PropostaRollupDiario.objects.filter(quantidade__gt=0).values_list(
+                "status", "captacao_id", "quantidade", "valor_total"
+            )
+        )
+
+    def test_criar_alterar_e_excluir(self):
+        proposta = self._criar("A-1", "100.00")
+        self._criar("A-2", "50.00")
+        self.assertEqual(self._linhas(), {("rascunho", None, 2, Decimal("150.00"))})
+
+        proposta.status = "aprovado"
+        proposta.save()
+        self.assertEqual(
+            self._linhas(),
+            {("aprovado", None, 1, Decimal("100.00")), ("rascunho", None, 1, Decimal("50.00"))},
+        )
+
+        proposta.delete()
+        self.assertEqual(self._linhas(), {("rascunho", None, 1, Decimal("50.00"))})
+        self.assertEqual(divergencias_rollup(self.empresa.pk), [])
+
+    def test_excluir_captacao_junta_com_a_linha_sem_captacao(self):
+        self._criar("A-1", "100.00", captacao=self.captacao)
+        self._criar("A-2", "50.00")
+        self.assertEqual(
+            self._linhas(),
+            {
+                ("rascunho", None, 1, Decimal("50.00")),
+                ("rascunho", self.captacao.pk, 1, Decimal("100.00")),
+            },
+        )
+
+        self.captacao.delete()
+        self.assertEqual(self._linhas(), {("rascunho", None, 2, Decimal("150.00"))})
+        self.assertEqual(PropostaRollupDiario.objects.count(), 1)
+        self.assertEqual(divergencias_rollup(self.empresa.pk), [])
+
+    def test_excluir_captacao_sem_linha_sem_captacao(self):
+        self._criar("A-1", "100.00", captacao=self.captacao)
+        self.captacao.delete()
+        self.assertEqual(self._linhas(), {("rascunho", None, 1, Decimal("100.00"))})
+        self.assertEqual(divergencias_rollup(self.empresa.pk), [])
+
+
+# =========================================================
+# HISTÓRICO (EVENTOS) E FUNIL
+# =========================================================
+
+class HistoricoEventosTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        self.cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+        self.usuario = User.objects.create_user("ana", empresa=self.empresa, user_type="owner")
+
+    def _criar(self, numero, captacao=None):
+        return Proposta.objects.create(
+            company=self.empresa,
+            numero=numero,
+            titulo_servico="Obra",
+            cliente=self.cliente,
+            captacao=captacao,
+        )
+
+    def _tipos(self, proposta):
+        eventos = PropostaEvento.objects.filter(proposta=proposta).order_by("pk")
+        return list(eventos.values_list("tipo", flat=True))
+
+    def test_evento_gravado_na_hora(self):
+        proposta = self._criar("A-1")
+        registrar_evento_proposta(proposta, "criada", self.usuario)
+        evento = PropostaEvento.objects.get(proposta=proposta)
+        self.assertEqual(
+            (evento.tipo, evento.usuario_id, evento.origem), ("criada", self.usuario.pk, "interno")
+        )
+
+    def test_mudanca_de_status_grava_evento_e_revisao(self):
+        proposta = self._criar("A-1")
+        self.client.force_login(self.usuario)
+        url = reverse("propostas:proposta_change_status", args=[proposta.pk])
+        self.client.post(url, {"status": "aprovado"})
+        self.assertEqual(self._tipos(proposta), ["aprovada"])
+        self.assertEqual(PropostaRevisao.objects.filter(proposta=proposta, motivo="aprovada").count(), 1)
+
+    def test_resposta_do_cliente_grava_evento_junto(self):
+        proposta = self._criar("A-1")
+        Proposta.objects.filter(pk=proposta.pk).update(status="em_andamento")
+        proposta.refresh_from_db()
+        views._registrar_resposta(proposta, uuid.uuid4(), "aprovar", "", "em_andamento", proposta.updated_at)
+        self.assertEqual(self._tipos(proposta), ["aprovada"])
+
+    def test_funil_por_captacao(self):
+        indicacao = Captacao.objects.create(company=self.empresa, nome="Indicação")
+        inicio = timezone.now() - timedelta(days=10)
+
+        def _eventos(proposta, *etapas):
+            for horas, tipo in etapas:
+                PropostaEvento.objects.create(
+                    company=self.empresa,
+                    proposta=proposta,
+                    tipo=tipo,
+                    created_at=inicio + timedelta(hours=horas),
+                )
+
+        aprovada = self._criar("A-1", indicacao)
+        _eventos(aprovada, (0, "criada"), (2, "enviada"), (3, "visualizada"), (12, "aprovada"))
+        enviada = self._criar("A-2", indicacao)
+        _eventos(enviada, (0, "criada"), (1, "enviada"))
+        sem_captacao = self._criar("A-3")
+        _eventos(sem_captacao, (0, "criada"), (4, "aprovada"))
+        # Criada antes do período: fora da coorte
+        _eventos(self._criar("A-4"), (-24 * 30, "criada"), (1, "aprovada"))
+
+        funil = funil_propostas(self.empresa.pk, inicio=inicio - timedelta(days=1))
+        self.assertEqual(
+            funil["totais"], {"criada": 3, "enviada": 2, "visualizada": 1, "aprovada": 2, "conversao": 0.6667}
+        )
+        por_captacao = {item["captacao"]: item for item in funil["por_captacao"]}
+        self.assertEqual(por_captacao["Indicação"]["criada"], 2)
+        self.assertEqual(por_captacao["Indicação"]["conversao"], 0.5)
+        self.assertEqual(por_captacao["Sem captação"]["conversao"], 1.0)
+        # Do envio (A-1: 10 h) ou da criação (A-3: 4 h) até a aprovação
+        self.assertEqual(funil["tempo_ate_aprovacao"]["propostas"], 2)
+        self.assertEqual(funil["tempo_ate_aprovacao"]["media_horas"], 7.0)
+
+    def test_funil_outra_empresa_nao_entra(self):
+        proposta = self._criar("A-1")
+        PropostaEvento.objects.create(
+            company=self.empresa, proposta=proposta, tipo="criada", created_at=timezone.now()
+        )
+        outra = Empresa.objects.create(nome_fantasia="Empresa B")
+        self.assertEqual(funil_propostas(outra.pk)["totais"]["criada"], 0)
+
+
+class EventBufferTests(SimpleTestCase):
+    @override_settings(PROPOSTA_TRACKING_MAX_BUFFER=2)
+    def test_lote_volta_para_o_buffer_quando_a_gravacao_falha(self):
+        gravados = []
+        falhar = [True]
+
+        def gravar(eventos):
+            if falhar[0]:
+                raise RuntimeError("database is locked")
+            gravados.extend(eventos)
+
+        buffer = EventBuffer(gravar, "teste")
+        buffer._eventos = ["a", "b"]
+        with self.assertRaises(RuntimeError):
+            buffer.flush()
+        buffer._eventos.append("c")
+
+        falhar[0] = False
+        self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(gravados, ["a", "b", "c"])
+
+
+# =========================================================
+# RESPOSTA DO CLIENTE (IDEMPOTÊNCIA)
+# =========================================================
+
+class RespostaClienteTests(TestCase):
+    def setUp(self):
+        empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        cliente = Contato.objects.create(empresa=empresa, nome_fantasia="Cliente A")
+        self.proposta = Proposta.objects.create(
+            company=empresa, numero="A-1", titulo_servico="Obra", cliente=cliente, status="em_andamento"
+        )
+        self.versao = self.proposta.updated_at
+
+    def _responder(self, request_id, action="aprovar", versao=None):
+        return views._registrar_resposta(
+            self.proposta, request_id, action, "", "em_andamento", versao or self.versao
+        )
+
+    def test_reenvio_do_mesmo_request_id(self):
+        request_id = uuid.uuid4()
+        resposta = self._responder(request_id)
+        self.assertTrue(resposta.aplicada)
+        self.assertEqual(self._responder(request_id, "rejeitar"), resposta)
+
+        self.proposta.refresh_from_db()
+        self.assertEqual(self.proposta.status, "aprovado")
+        self.assertEqual(PropostaResposta.objects.count(), 1)
+        self.assertEqual(PropostaEvento.objects.filter(tipo="aprovada").count(), 1)
+
+    def test_versao_desatualizada_nao_sobrescreve(self):
+        self._responder(uuid.uuid4())
+        recusada = self._responder(uuid.uuid4(), "rejeitar")
+        self.assertFalse(recusada.aplicada)
+        self.assertEqual(recusada.status_final, "aprovado")
+
+        antiga = self.versao - timedelta(minutes=5)
+        Proposta.objects.filter(pk=self.proposta.pk).update(status="em_andamento")
+        self.assertFalse(self._responder(uuid.uuid4(), versao=antiga).aplicada)
+        self.assertEqual(PropostaEvento.objects.count(), 1)
+
+    def test_request_id_gravado_em_paralelo(self):
+        request_id = uuid.uuid4()
+        primeira = self._responder(request_id)
+
+        # A consulta inicial não viu a outra requisição: o INSERT bate na
+        # constraint e o UPDATE desta é desfeito
+        Proposta.objects.filter(pk=self.proposta.pk).update(status="em_andamento", updated_at=self.versao)
+        sem_registro = mock.Mock(**{"first.return_value": None})
+        with mock.patch.object(PropostaResposta.objects, "filter", return_value=sem_registro):
+            segunda = self._responder(request_id, "rejeitar")
+
+        self.assertEqual(segunda, primeira)
+        self.proposta.refresh_from_db()
+        self.assertEqual(self.proposta.status, "em_andamento")
+        self.assertEqual(PropostaResposta.objects.count(), 1)
+        self.assertEqual(PropostaEvento.objects.count(), 1)
+
+
+# =========================================================
+# KANBAN: MOVER CARD
+# =========================================================
+
+class MoverStatusTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+        self.proposta = Proposta.objects.create(
+            company=self.empresa,
+            numero="A-1",
+            titulo_servico="Obra",
+            cliente=cliente,
+            total=Decimal("100.00"),
+        )
+        self.client.force_login(User.objects.create_user("ana", empresa=self.empresa, user_type="owner"))
+
+    def _mover(self, proposta, status, versao):
+        url = reverse("propostas:proposta_mover_status", args=[proposta.pk])
+        dados = {"status": status}
+        if versao is not None:
+            dados["versao"] = versao.isoformat()
+        return self.client.post(url, dados)
+
+    def test_move_e_registra_evento_revisao_e_rollup(self):
+        response = self._mover(self.proposta, "em_andamento", self.proposta.updated_at)
+        self.assertEqual(response.status_code, 200)
+        item = response.json()["proposta"]
+        self.assertEqual(item["status"], "em_andamento")
+
+        self.proposta.refresh_from_db()
+        self.assertEqual(item["versao"], self.proposta.updated_at.isoformat())
+        self.assertEqual(list(PropostaEvento.objects.values_list("tipo", flat=True)), ["enviada"])
+        self.assertTrue(PropostaRevisao.objects.filter(proposta=self.proposta, motivo="enviada").exists())
+        self.assertEqual(
+            list(PropostaRollupDiario.objects.filter(quantidade__gt=0).values_list("status", "quantidade")),
+            [("em_andamento", 1)],
+        )
+        self.assertEqual(divergencias_rollup(self.empresa.pk), [])
+
+    def test_sem_versao_responde_428(self):
+        response = self._mover(self.proposta, "aprovado", None)
+        self.assertEqual(response.status_code, 428)
+        self.proposta.refresh_from_db()
+        self.assertEqual(self.proposta.status, "rascunho")
+
+    def test_versao_desatualizada_responde_409_com_o_card_atual(self):
+        versao = self.proposta.updated_at
+        Proposta.objects.filter(pk=self.proposta.pk).update(status="rejeitado", updated_at=timezone.now())
+
+        response = self._mover(self.proposta, "aprovado", versao)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["proposta"]["status"], "rejeitado")
+        self.proposta.refresh_from_db()
+        self.assertEqual(self.proposta.status, "rejeitado")
+        self.assertFalse(PropostaEvento.objects.exists())
+
+    def test_proposta_de_outra_empresa_responde_404(self):
+        outra = Empresa.objects.create(nome_fantasia="Empresa B")
+        proposta = Proposta.objects.create(
+            company=outra,
+            numero="B-1",
+            titulo_servico="Obra",
+            cliente=Contato.objects.create(empresa=outra, nome_fantasia="Cliente B"),
+        )
+        response = self._mover(proposta, "aprovado", proposta.updated_at)
+        self.assertEqual(response.status_code, 404)
+        proposta.refresh_from_db()
+        self.assertEqual(proposta.status, "rascunho")
+        self.assertFalse(PropostaEvento.objects.exists())
+
+
+# =========================================================
+# KANBAN: AÇÕES EM LOTE
+# =========================================================
+
+class AcoesLoteTests(TestCase):
+    def setUp(self):
+        self.empresa = Empresa.objects.create(nome_fantasia="Empresa A")
+        cliente = Contato.objects.create(empresa=self.empresa, nome_fantasia="Cliente A")
+        self.propostas = [
+            Proposta.objects.create(
+                company=self.empresa,
+                numero=f"A-{n}",
+                titulo_servico="Obra",
+                cliente=cliente,
+                total=Decimal("100.00"),
+            )
+            for n in range(3)
+        ]
+        outra = Empresa.objects.create(nome_fantasia="Empresa B")
+        self.proposta_outra = Proposta.objects.create(
+            company=outra,
+            numero="B-1",
+            titulo_servico="Obra",
+            cliente=Contato.objects.create(empresa=outra, nome_fantasia="Cliente B"),
+        )
+        self.url = reverse("propostas:propostas_acao_lote")
+        self.client.force_login(User.objects.create_user("ana", empresa=self.empresa, user_type="owner"))
+
+    def _rollup(self):
+        linhas = PropostaRollupDiario.objects.filter(company=self.empresa, quantidade__gt=0)
+        return list(linhas.values_list("status", "quantidade"))
+
+    def _enviar(self, ids, **dados):
+        return self.client.post(self.url, {"ids": ids, **dados})
+
+    def test_status_em_um_update_com_eventos_revisoes_e_rollup(self):
+        ids = [p.pk for p in self.propostas]
+        with CaptureQueriesContext(connection) as consultas:
+            response = self._enviar(ids, acao="status", status="em_andamento")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["afetadas"], ids)
+
+        updates = [
+            q["sql"] for q in consultas.captured_queries
+            if q["sql"].startswith('UPDATE "propostas_proposta"')
+        ]
+        self.assertEqual(len(updates), 1)
+
+        status = Proposta.objects.filter(pk__in=ids).values_list("status", flat=True)
+        self.assertEqual(set(status), {"em_andamento"})
+        eventos = PropostaEvento.objects.filter(tipo="enviada")
+        self.assertEqual(sorted(eventos.values_list("proposta_id", flat=True)), ids)
+        revisoes = PropostaRevisao.objects.filter(motivo="enviada")
+        self.assertEqual(sorted(revisoes.values_list("proposta_id", flat=True)), ids)
+        self.assertEqual(self._rollup(), [("em_andamento", 3)])
+        self.assertEqual(divergencias_rollup(self.empresa.pk), [])
+
+    def test_ids_de_outra_empresa_sao_ignorados(self):
+        ids = [self.propostas[0].pk, self.proposta_outra.pk]
+        response = self._enviar(ids, acao="arquivar")
+        self.assertEqual(response.json()["afetadas"], [self.propostas[0].pk])
+        self.assertEqual(response.json()["ignoradas"], [self.proposta_outra.pk])
+
+        self.proposta_outra.refresh_from_db()
+        self.assertEqual(self.proposta_outra.status, "rascunho")
+        self.assertFalse(PropostaEvento.objects.filter(proposta=self.proposta_outra).exists())
+
+        response = self._enviar([self.proposta_outra.pk], acao="excluir")
+        self.assertEqual(response.json()["afetadas"], [])
+        self.assertTrue(Proposta.objects.filter(pk=self.proposta_outra.pk).exists())
+
+    def test_excluir_em_lote_ajusta_rollup(self):
+        ids = [p.pk for p in self.propostas[:2]]
+        response = self._enviar(ids, acao="excluir")
+        self.assertEqual(response.json()["afetadas"], ids)
+        self.assertEqual(self._rollup(), [("rascunho", 1)])
+        self.assertEqual(divergencias_rollup(self.empresa.pk), [])
+
+    def test_status_ja_aplicado_fica_em_ignoradas(self):
+        response = self._enviar([self.propostas[0].pk], acao="status", status="rascunho")
+        self.assertEqual(response.json()["afetadas"], [])
+        self.assertFalse(PropostaEvento.objects.exists())
@@ -0,0 +1,135 @@
+import hashlib
+import time
+from collections import defaultdict
+
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .buffers import EventBuffer, apenas_propostas_existentes
+from .models import Proposta, PropostaEvento, PropostaVisualizacao
+
+
+# Salt do payload assinado embutido na página pública (beacon de eventos)
+TRACKING_SALT = "propostas.tracking"
+
+# Limite de segundos aceito em um único evento de tempo na página
+TEMPO_MAXIMO_EVENTO = 60 * 60 * 4
+
+# Validade do identificador assinado. A página pública troca o identificador
+# a cada TRACKING_RENOVACAO (entra no ETag), então uma aba aberta continua
+# enviando eventos por pelo menos TRACKING_VALIDADE - TRACKING_RENOVACAO.
+TRACKING_VALIDADE = 60 * 60 * 48
+TRACKING_RENOVACAO = 60 * 60 * 24
+
+# Segundos em que um mesmo evento (proposta, tipo, visitante) conta uma vez
+# só: recarregar a página ou repetir o beacon não infla os contadores.
+JANELA_DUPLICADOS = {"abertura": 60, "pdf": 60, "tempo": 10}
+
+
+def assinar_proposta(proposta):
+    """
+    Identificador assinado que a página pública devolve no beacon, para que o
+    endpoint de eventos não precise consultar o banco.
+    """
+    return signing.dumps(
+        {"p": proposta.pk, "c": proposta.company_id, "t": str(proposta.public_token)},
+        salt=TRACKING_SALT,
+        compress=True,
+    )
+
+
+def periodo_assinatura():
+    """Muda a cada TRACKING_RENOVACAO; faz parte do ETag da página pública."""
+    return int(time.time() // TRACKING_RENOVACAO)
+
+
+def ler_assinatura(valor, token):
+    try:
+        data = signing.loads(valor, salt=TRACKING_SALT, max_age=TRACKING_VALIDADE)
+    except signing.BadSignature:
+        return None
+    if data.get("t") != str(token):
+        return None
+    return data["p"], data["c"]
+
+
+def _visitante(request):
+    ip = request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip() or request.META.get("REMOTE_ADDR", "")
+    agente = request.META.get("HTTP_USER_AGENT", "")
+    return hashlib.sha1(f"{ip}|{agente}".encode()).hexdigest()
+
+
+def primeira_ocorrencia(request, proposta_id, tipo):
+    """
+    True se o evento ainda não foi contado para este visitante dentro de
+    JANELA_DUPLICADOS[tipo] (cache.add é atômico, vale entre workers com Redis).
+    """
+    chave = f"propostas:tracking:{proposta_id}:{tipo}:{_visitante(request)}"
+    return cache.add(chave, 1, JANELA_DUPLICADOS[tipo])
+
+
+def _gravar_visualizacoes(eventos):
+    """
+    Grava os eventos em lote e atualiza os contadores da Proposta com um
+    UPDATE por proposta. A primeira abertura de cada proposta no lote também
+    entra no histórico (PropostaEvento "visualizada").
+    """
+    eventos = apenas_propostas_existentes(eventos)
+    contadores = defaultdict(lambda: {"abertura": 0, "pdf": 0, "tempo": 0, "ultima": None})
+    historico = {}
+    for ev in eventos:
+        c = contadores[ev.proposta_id]
+        if ev.tipo == "tempo":
+            c["tempo"] += ev.duracao_segundos or 0
+        else:
+            c[ev.tipo] += 1
+        if ev.tipo == "abertura":
+            if c["ultima"] is None or ev.created_at > c["ultima"]:
+                c["ultima"] = ev.created_at
+            historico.setdefault(
+                ev.proposta_id,
+                PropostaEvento(
+                    company_id=ev.company_id,
+                    proposta_id=ev.proposta_id,
+                    tipo="visualizada",
+                    origem="cliente",
+                    created_at=ev.created_at,
+                ),
+            )
+
+    with transaction.atomic():
+        PropostaVisualizacao.objects.bulk_create(eventos, batch_size=500)
+        PropostaEvento.objects.bulk_create(historico.values(), batch_size=500)
+        for proposta_id, c in contadores.items():
+            campos = {
+                "visualizacoes_count": F("visualizacoes_count") + c["abertura"],
+                "downloads_pdf_count": F("downloads_pdf_count") + c["pdf"],
+                "tempo_visualizacao_segundos": F("tempo_visualizacao_segundos") + c["tempo"],
+            }
+            if c["ultima"] is not None:
+                campos["ultima_visualizacao_em"] = c["ultima"]
+            # .update() não mexe em updated_at: não invalida o cache da página
+            # pública nem reordena o kanban.
+            Proposta.objects.filter(pk=proposta_id).update(**campos)
+
+
+buffer = EventBuffer(_gravar_visualizacoes, "propostas-tracking-flush")
+
+
+def registrar_evento(proposta_id, company_id, tipo, duracao_segundos=None):
+    if tipo == "tempo":
+        duracao_segundos = max(0, min(int(duracao_segundos or 0), TEMPO_MAXIMO_EVENTO))
+        if not duracao_segundos:
+            return
+    buffer.registrar(
+        PropostaVisualizacao(
+            proposta_id=proposta_id,
+            company_id=company_id,
+            tipo=tipo,
+            duracao_segundos=duracao_segundos,
+            created_at=timezone.now(),
+        )
+    )
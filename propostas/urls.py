@@ -7,20 +7,28 @@ urlpatterns = [
     path("", views.propostas_list, name="propostas_list"),
     path("nova/", views.proposta_create, name="proposta_create"),
     path("<int:pk>/", views.proposta_edit, name="proposta_edit"),
+    path("<int:pk>/modelo-proprio/upload/", views.proposta_modelo_upload, name="proposta_modelo_upload"),
 
     path("captacao/nova/", views.captacao_create, name="captacao_create"),
 
     path("p/<uuid:token>/", views.proposta_public_view, name="proposta_public_view"),
     path("p/<uuid:token>/responder/", views.proposta_public_responder, name="proposta_public_responder"),
+    path("p/<uuid:token>/evento/", views.proposta_public_evento, name="proposta_public_evento"),
 
     path("proposta/<int:pk>/pdf/", views.proposta_public_pdf, name="proposta_public_pdf"),
+    path("proposta/<int:pk>/revisoes/<int:numero>/pdf/", views.proposta_revisao_pdf, name="proposta_revisao_pdf"),
 
     path("", views.propostas_list, name="propostas_list"),
     path("historico/", views.propostas_historico, name="propostas_historico"),
 
     path("<int:pk>/excluir/", views.proposta_delete, name="proposta_delete"),
     path("<int:pk>/status/", views.proposta_change_status, name="proposta_change_status"),
+    path("<int:pk>/mover/", views.proposta_mover_status, name="proposta_mover_status"),
+    path("lote/", views.propostas_acao_lote, name="propostas_acao_lote"),
+    path("ao-vivo/", views.propostas_ao_vivo, name="propostas_ao_vivo"),
 
     path("gerar-numero/", views.proposta_gerar_numero, name="proposta_gerar_numero"),
+    path("metricas/funil/", views.propostas_funil_json, name="propostas_funil_json"),
+    path("relatorios/", views.propostas_relatorios, name="propostas_relatorios"),
     
 ]
\ No newline at end of file
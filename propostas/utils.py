@@ -2,7 +2,7 @@ from datetime import datetime
 
 from django.db.models import Max
 
-from core.models import PropostaConfiguracao
+from core.services import get_proposta_defaults
 from .models import Proposta
 
 
@@ -14,7 +14,7 @@ def gerar_numero_proposta(empresa):
     - Proposta.sequencia_int (sequência interna por empresa)
     """
 
-    config = PropostaConfiguracao.objects.filter(empresa=empresa).first()
+    defaults = get_proposta_defaults(empresa)
 
     # Descobre a próxima sequência interna da empresa
     agg = Proposta.objects.filter(company=empresa).aggregate(
@@ -24,11 +24,11 @@ def gerar_numero_proposta(empresa):
     proxima_seq = ultimo_seq + 1
 
     # Se não existir config, faz um fallback simples: só usa a sequência
-    if not config:
+    if not defaults.tem_configuracao:
         return str(proxima_seq)
 
     # Calcula o "numero" baseando-se na sequência e no numero_auto_iniciar
-    base = config.numero_auto_iniciar or 1
+    base = defaults.numero_auto_iniciar
     numero_interno = base + proxima_seq - 1
 
     agora = datetime.now()
@@ -40,7 +40,7 @@ def gerar_numero_proposta(empresa):
         "horario": agora.strftime("%H%M"),
     }
 
-    cfg = config.numero_config or []
+    cfg = defaults.numero_config
     partes = []
     for linha in cfg:
         if not isinstance(linha, dict):
@@ -1,40 +1,70 @@
+import hashlib
 import json
-from datetime import date, datetime
+import uuid
+from datetime import date, datetime, timedelta
 from ast import literal_eval
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
 from django.db.models import Q, Max
 from django.http import (
+    Http404,
     JsonResponse,
     HttpResponse,
     HttpResponseForbidden,
+    StreamingHttpResponse,
 )
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
 from django.templatetags.static import static
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date, quote_etag
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 
 from weasyprint import HTML, CSS
 
+from . import ao_vivo, tracking
+from .eventos import eventos_mudanca_status, registrar_evento_proposta
 from .forms import PropostaDadosGeraisForm
-from .models import Proposta, Captacao
-from core.models import Servico, PropostaConfiguracao
+from .lote import excluir_em_lote, mudar_status_em_lote, regenerar_tokens_em_lote
+from .metricas import funil_propostas
+from .pdf import MedicaoPdf, perfilar, registrar_medicao_pdf
+from .relatorios import (
+    FiltrosRelatorio,
+    captacoes_para_filtro,
+    escrever_csv,
+    relatorio_por_captacao,
+    relatorio_por_categoria,
+)
+from .models import Proposta, PropostaResposta, PropostaRevisao, Captacao
+from .revisoes import REVISAO_CACHE_TIMEOUT, REVISAO_PDF_CACHE_MAX_BYTES, proposta_da_revisao
+from .rollups import chave_rollup, mover_rollup
+from core.db import usa_replica
+from core.managers import invalidate_tenant_query_cache
+from core.models import Servico
+from core.services import get_proposta_defaults, valores_servicos
+from core.uploads import confirmar_upload_direto, iniciar_upload_direto
 
 
 # ======================================================================
 # LISTA (KANBAN)
 # ======================================================================
 @login_required
+@usa_replica
 def propostas_list(request):
-    empresa = request.user.empresa
-
     busca = request.GET.get("q", "").strip()
 
-    base_qs = Proposta.objects.filter(company=empresa)
+    # cliente aparece em toda linha/card
+    base_qs = Proposta.tenant_objects.select_related("cliente")
 
     if busca:
         base_qs = base_qs.filter(
@@ -43,6 +73,8 @@ def propostas_list(request):
             | Q(cliente__nome_fantasia__icontains=busca)
         )
 
+    # Ponto de partida do stream ao vivo: o que mudar depois disto chega pelo SSE
+    renderizado_em = timezone.now()
     rascunhos = base_qs.filter(status="rascunho").order_by("-created_at")[:100]
     em_andamento = base_qs.filter(status="em_andamento").order_by("-updated_at")[:100]
 
@@ -53,23 +85,52 @@ def propostas_list(request):
             "rascunhos": rascunhos,
             "em_andamento": em_andamento,
             "busca": busca,
+            "status_choices": Proposta.STATUS_CHOICES,
+            "ao_vivo_desde": renderizado_em.isoformat(),
         },
     )
 
 
+@login_required
+@require_GET
+def propostas_ao_vivo(request):
+    """
+    Stream SSE (text/event-stream) com as mudanças do kanban da empresa:
+    cards alterados já renderizados e ids removidos. Só funciona servido
+    via ASGI (gestiospro.asgi); sob WSGI responde 204, e o EventSource do
+    navegador não tenta de novo.
+    """
+    empresa_id = request.tenant.empresa_id
+    if not empresa_id or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    # Reconexão: o navegador manda o id do último evento recebido
+    desde = parse_datetime(
+        request.headers.get("Last-Event-ID") or request.GET.get("desde") or ""
+    )
+    response = StreamingHttpResponse(
+        ao_vivo.stream_quadro(empresa_id, desde),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # nginx: não segurar o stream em buffer
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 # ======================================================================
 # HISTÓRICO
 # ======================================================================
 @login_required
+@usa_replica
 def propostas_historico(request):
-    empresa = request.user.empresa
-
     status_hist = request.GET.get("status_hist", "aprovado")
     data_ini = request.GET.get("data_ini")
     data_fim = request.GET.get("data_fim")
     busca = request.GET.get("q", "").strip()
 
-    base_qs = Proposta.objects.filter(company=empresa)
+    # cliente aparece em toda linha/card
+    base_qs = Proposta.tenant_objects.select_related("cliente")
 
     if busca:
         base_qs = base_qs.filter(
@@ -146,7 +207,7 @@ def _gerar_numero_proposta(empresa):
 
     Retorna (codigo, sequencia_int).
     """
-    config = PropostaConfiguracao.objects.filter(empresa=empresa).first()
+    defaults = get_proposta_defaults(empresa)
 
     # Próxima sequência interna da empresa (1, 2, 3...) baseada no maior sequencia_int
     agg = Proposta.objects.filter(company=empresa).aggregate(
@@ -156,11 +217,11 @@ def _gerar_numero_proposta(empresa):
     proxima_seq = ultimo_seq + 1
 
     # Se não houver configuração, usa apenas a sequência
-    if not config:
+    if not defaults.tem_configuracao:
         return str(proxima_seq), proxima_seq
 
     # numero interno: base + sequencia_int - 1
-    base = config.numero_auto_iniciar or 1
+    base = defaults.numero_auto_iniciar
     numero_interno = base + proxima_seq - 1
 
     agora = datetime.now()
@@ -171,7 +232,7 @@ def _gerar_numero_proposta(empresa):
         "horario": agora.strftime("%H%M"),
     }
 
-    cfg = config.numero_config or []
+    cfg = defaults.numero_config
 
     def montar_codigo(num):
         contexto = dict(contexto_base)
@@ -216,7 +277,7 @@ def proposta_gerar_numero(request):
     Endpoint AJAX para botão "Gerar automático" na tela de proposta.
     Retorna apenas o código gerado para preencher o input do formulário.
     """
-    empresa = request.user.empresa
+    empresa = request.tenant.empresa
     codigo, _ = _gerar_numero_proposta(empresa)
     return JsonResponse({"ok": True, "numero": codigo})
 
@@ -226,7 +287,7 @@ def proposta_gerar_numero(request):
 # ======================================================================
 @login_required
 def proposta_create(request):
-    empresa = request.user.empresa
+    empresa = request.tenant.empresa
 
     if request.method == "POST":
         form = PropostaDadosGeraisForm(request.POST, company=empresa)
@@ -278,7 +339,13 @@ def proposta_create(request):
 
             # Calcular totais
             proposta.calcular_totais()
-            proposta.save()
+            # Proposta e histórico gravados juntos
+            with transaction.atomic():
+                proposta.save()
+                registrar_evento_proposta(proposta, "criada", request.user)
+                for tipo in eventos_mudanca_status("rascunho", proposta.status):
+                    registrar_evento_proposta(proposta, tipo, request.user)
+
             messages.success(request, "Proposta criada com sucesso.")
             return redirect("propostas:proposta_edit", pk=proposta.pk)
     else:
@@ -289,45 +356,12 @@ def proposta_create(request):
         if not form.initial.get("data_servico"):
             form.initial["data_servico"] = date.today()
 
-        # Textos padrão de PropostaConfiguracao / Empresa
-        config = PropostaConfiguracao.objects.filter(empresa=empresa).first()
-
-        exclusoes_padrao = ""
-        declaracoes_padrao = ""
-        termo_conf_padrao = ""
-        prazo_inicio_padrao = ""
-        prazo_entrega_padrao = ""
-        agradecimentos_padrao = ""
-
-        if config:
-            exclusoes_padrao = config.exclusoes or ""
-            declaracoes_padrao = config.declaracoes or ""
-            termo_conf_padrao = config.termo_confi or ""
-            prazo_inicio_padrao = config.prazo_inicio or ""
-            prazo_entrega_padrao = config.prazo_entrega or ""
-            agradecimentos_padrao = config.agradecimentos or ""
-
-        if not exclusoes_padrao:
-            exclusoes_padrao = empresa.exclusoes_padrao or ""
-        if not declaracoes_padrao:
-            declaracoes_padrao = empresa.declaracoes_padrao or ""
-        if not termo_conf_padrao:
-            termo_conf_padrao = empresa.termo_confidencialidade_padrao or ""
-        if not prazo_inicio_padrao:
-            prazo_inicio_padrao = empresa.prazo_inicio_padrao or ""
-        if not prazo_entrega_padrao:
-            prazo_entrega_padrao = empresa.prazo_entrega_padrao or ""
-        if not agradecimentos_padrao:
-            agradecimentos_padrao = empresa.agradecimentos_padrao or ""
-
-        form.initial.setdefault("exclusos_texto", exclusoes_padrao)
-        form.initial.setdefault("declaracoes_texto", declaracoes_padrao)
-        form.initial.setdefault("confidencialidade_texto", termo_conf_padrao)
-        form.initial.setdefault("prazo_inicio_texto", prazo_inicio_padrao)
-        form.initial.setdefault("prazo_entrega_texto", prazo_entrega_padrao)
-        form.initial.setdefault("assinatura_texto", agradecimentos_padrao)
-
-    servicos = Servico.objects.filter(empresa=empresa, ativo=True).values(
+        # Textos padrão de PropostaConfiguracao / Empresa (já resolvidos e em cache)
+        defaults = get_proposta_defaults(empresa)
+        for campo, valor in defaults.textos_iniciais().items():
+            form.initial.setdefault(campo, valor)
+
+    servicos = Servico.tenant_objects.filter(ativo=True).values(
         "id",
         "descricao",
         "valor",
@@ -341,6 +375,8 @@ def proposta_create(request):
             "form": form,
             "proposta": None,
             "servicos": servicos,
+            "catalogo_servicos": valores_servicos(servicos),
+            "modelo_proprio_max_mb": settings.MODELO_PROPRIO_MAX_MB,
         },
     )
 
@@ -350,8 +386,8 @@ def proposta_create(request):
 # ======================================================================
 @login_required
 def proposta_edit(request, pk):
-    empresa = request.user.empresa
-    proposta = get_object_or_404(Proposta, pk=pk, company=empresa)
+    empresa = request.tenant.empresa
+    proposta = get_object_or_404(Proposta.tenant_objects, pk=pk)
 
     # Corrigir itens/parcelas antigos salvos como string Python
     itens_fix = _fix_json_field(proposta.itens)
@@ -362,7 +398,16 @@ def proposta_edit(request, pk):
         proposta.save(update_fields=["itens", "parcelas"])
 
     if request.method == "POST":
+        # Lido antes do form: a validação já aplica os dados na instância
+        status_anterior = proposta.status
         form = PropostaDadosGeraisForm(request.POST, instance=proposta, company=empresa)
+        upload_confirmado = None
+        token_upload = request.POST.get("modelo_proprio_upload")
+        if token_upload and request.POST.get("usar_modelo_sistema", "1") != "1" and form.is_valid():
+            try:
+                upload_confirmado = confirmar_upload_direto(request, token_upload, f"proposta:{proposta.pk}")
+            except ValidationError as erro:
+                form.add_error(None, erro)
         if form.is_valid():
             proposta = form.save(commit=False)
 
@@ -404,7 +449,10 @@ def proposta_edit(request, pk):
             # arquivo do modelo próprio
             if not proposta.usar_modelo_sistema:
                 arquivo = request.FILES.get("modelo_proprio_arquivo")
-                if arquivo:
+                if upload_confirmado:
+                    # Enviado direto ao storage pelo navegador
+                    proposta.modelo_proprio_arquivo.name = upload_confirmado
+                elif arquivo:
                     proposta.modelo_proprio_arquivo = arquivo
             else:
                 # opcional: limpar arquivo quando volta pro sistema
@@ -412,19 +460,31 @@ def proposta_edit(request, pk):
                 pass
 
             proposta.calcular_totais()
-            proposta.save()
+            with transaction.atomic():
+                proposta.save()
+                registrar_evento_proposta(proposta, "editada", request.user)
+                for tipo in eventos_mudanca_status(status_anterior, proposta.status):
+                    registrar_evento_proposta(proposta, tipo, request.user)
+
             messages.success(request, "Proposta atualizada com sucesso.")
             return redirect("propostas:proposta_edit", pk=proposta.pk)
     else:
         form = PropostaDadosGeraisForm(instance=proposta, company=empresa)
 
-    servicos = Servico.objects.filter(empresa=empresa, ativo=True).values(
+    servicos = Servico.tenant_objects.filter(ativo=True).values(
         "id",
         "descricao",
         "valor",
         "entregaveis",
     )
 
+    # Só a lista (sem o conteúdo comprimido)
+    revisoes = PropostaRevisao.objects.filter(proposta=proposta).only(
+        "numero",
+        "motivo",
+        "created_at",
+    )
+
     return render(
         request,
         "propostas/proposta_form.html",
@@ -432,10 +492,49 @@ def proposta_edit(request, pk):
             "form": form,
             "proposta": proposta,
             "servicos": servicos,
+            "catalogo_servicos": valores_servicos(servicos),
+            "revisoes": revisoes,
+            "modelo_proprio_max_mb": settings.MODELO_PROPRIO_MAX_MB,
         },
     )
 
 
+# ======================================================================
+# UPLOAD DIRETO DO MODELO PRÓPRIO
+# ======================================================================
+EXTENSOES_MODELO_PROPRIO = {".pdf", ".doc", ".docx", ".png", ".jpg", ".jpeg", ".webp"}
+
+
+@login_required
+@require_POST
+def proposta_modelo_upload(request, pk):
+    """
+    Autoriza o envio do modelo próprio direto ao storage (core.uploads).
+    Espera POST com 'nome' e 'tamanho'; o token retornado vai no campo
+    'modelo_proprio_upload' do formulário da proposta.
+    """
+    proposta = get_object_or_404(Proposta.tenant_objects.only("pk"), pk=pk)
+    try:
+        tamanho = int(request.POST.get("tamanho", ""))
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Tamanho inválido."}, status=400)
+
+    campo = Proposta._meta.get_field("modelo_proprio_arquivo")
+    try:
+        dados = iniciar_upload_direto(
+            request,
+            f"proposta:{proposta.pk}",
+            request.POST.get("nome", ""),
+            tamanho,
+            EXTENSOES_MODELO_PROPRIO,
+            settings.MODELO_PROPRIO_MAX_MB * 1024 * 1024,
+            max_length=campo.max_length,
+        )
+    except ValidationError as erro:
+        return JsonResponse({"ok": False, "error": erro.messages[0]}, status=400)
+    return JsonResponse({"ok": True, **dados})
+
+
 # ======================================================================
 # CAPTAÇÃO AJAX
 # ======================================================================
@@ -448,12 +547,12 @@ def captacao_create(request):
     if request.method != "POST":
         return JsonResponse({"ok": False, "error": "Método inválido."}, status=400)
 
-    empresa = request.user.empresa
+    empresa = request.tenant.empresa
     nome = request.POST.get("nome", "").strip()
     if not nome:
         return JsonResponse({"ok": False, "error": "Nome é obrigatório."}, status=400)
 
-    exists = Captacao.objects.filter(company=empresa, nome__iexact=nome).first()
+    exists = Captacao.tenant_objects.filter(nome__iexact=nome).first()
     if exists:
         return JsonResponse({"ok": True, "id": exists.id, "nome": exists.nome})
 
@@ -464,33 +563,223 @@ def captacao_create(request):
 # ======================================================================
 # PÚBLICA (VIEW + RESPOSTA CLIENTE)
 # ======================================================================
+# Incrementar ao mudar proposta_publica.html (descarta páginas já cacheadas)
+PROPOSTA_PUBLICA_TEMPLATE_VERSAO = 4
+PROPOSTA_PUBLICA_CACHE_TIMEOUT = 60 * 60 * 24
+
+
 def _get_proposta_publica_or_404(token):
     return get_object_or_404(
-        Proposta,
+        Proposta.objects.select_related("company"),
         public_token=token,
         permitir_acesso_publico=True,
         company__isnull=False,
     )
 
 
-def proposta_public_view(request, token):
-    proposta = _get_proposta_publica_or_404(token)
-    empresa = proposta.company
+def _proposta_publica_versao(token):
+    """
+    Consulta enxuta usada para validar o cache da página pública: só existe
+    enquanto o acesso público estiver liberado e muda quando a proposta ou a
+    empresa (marca) forem salvas.
+    """
+    versao = (
+        Proposta.objects.filter(
+            public_token=token,
+            permitir_acesso_publico=True,
+            company__isnull=False,
+        )
+        .values("pk", "updated_at", "company__updated_at")
+        .first()
+    )
+    if versao is None:
+        raise Http404("Proposta não encontrada.")
+    return versao
 
-    itens = proposta.itens or []
-    parcelas = proposta.parcelas or []
 
-    return render(
+@usa_replica
+def proposta_public_view(request, token):
+    versao = _proposta_publica_versao(token)
+    last_modified = max(versao["updated_at"], versao["company__updated_at"])
+
+    chave = ":".join(
+        [
+            str(PROPOSTA_PUBLICA_TEMPLATE_VERSAO),
+            str(versao["pk"]),
+            versao["updated_at"].isoformat(),
+            versao["company__updated_at"].isoformat(),
+            # Renova o identificador de rastreamento embutido na página
+            str(tracking.periodo_assinatura()),
+        ]
+    )
+    digest = hashlib.sha1(chave.encode()).hexdigest()
+    etag = quote_etag(digest)
+
+    # Revalidação (If-None-Match / If-Modified-Since): 304 sem renderizar nada
+    response = get_conditional_response(
         request,
-        "propostas/proposta_publica.html",
-        {
-            "proposta": proposta,
-            "empresa": empresa,
-            "itens": itens,
-            "parcelas": parcelas,
-        },
+        etag=etag,
+        last_modified=int(last_modified.timestamp()),
     )
 
+    if response is None:
+        cache_key = f"propostas:publica:{token}:{digest}"
+        html = cache.get(cache_key)
+        if html is None:
+            proposta = _get_proposta_publica_or_404(token)
+            html = render_to_string(
+                "propostas/proposta_publica.html",
+                {
+                    "proposta": proposta,
+                    "empresa": proposta.company,
+                    "itens": proposta.itens or [],
+                    "parcelas": proposta.parcelas or [],
+                    "tracking_id": tracking.assinar_proposta(proposta),
+                    "versao": proposta.updated_at.isoformat(),
+                },
+            )
+            cache.set(cache_key, html, PROPOSTA_PUBLICA_CACHE_TIMEOUT)
+        response = HttpResponse(html)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified.timestamp())
+    # Navegador sempre revalida; CDN pode servir por alguns segundos
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=0,
+        s_maxage=settings.PROPOSTA_PUBLICA_CDN_MAX_AGE,
+        must_revalidate=True,
+    )
+    return response
+
+
+@csrf_exempt
+@require_POST
+def proposta_public_evento(request, token):
+    """
+    Beacon da página pública (navigator.sendBeacon): abertura, tempo na
+    página e impressão/PDF. Só valida a assinatura e empilha no buffer; nada
+    é gravado no banco durante a requisição.
+    """
+    ids = tracking.ler_assinatura(request.POST.get("id", ""), token)
+    tipo = request.POST.get("tipo")
+    if ids is None or tipo not in tracking.JANELA_DUPLICADOS:
+        return HttpResponse(status=400)
+
+    try:
+        segundos = int(request.POST.get("segundos") or 0)
+    except ValueError:
+        segundos = 0
+
+    proposta_id, company_id = ids
+    if tracking.primeira_ocorrencia(request, proposta_id, tipo):
+        tracking.registrar_evento(proposta_id, company_id, tipo, segundos)
+    return HttpResponse(status=204)
+
+
+# Novo status e campos gravados por cada ação do cliente
+def _campos_resposta(action, mensagem, agora):
+    if action == "aprovar":
+        return {
+            "status": "aprovado",
+            "aprovado_em": agora,
+            "rejeitado_em": None,
+            "revisao_solicitada_em": None,
+            "revisao_mensagem": "",
+        }
+    if action == "rejeitar":
+        return {"status": "rejeitado", "rejeitado_em": agora}
+    if action == "revisao":
+        return {
+            "status": "em_andamento",
+            "revisao_solicitada_em": agora,
+            "revisao_mensagem": mensagem,
+        }
+    return None
+
+
+EVENTO_POR_RESPOSTA = {
+    "aprovar": "aprovada",
+    "rejeitar": "rejeitada",
+    "revisao": "revisao_solicitada",
+}
+
+MENSAGENS_RESPOSTA = {
+    "aprovar": "Proposta aprovada com sucesso. Obrigado!",
+    "rejeitar": "Proposta rejeitada. Obrigado pelo retorno.",
+    "revisao": "Seu pedido de revisão foi registrado. Entraremos em contato.",
+}
+
+
+def _registrar_resposta(proposta, request_id, action, mensagem, status_esperado, versao=None):
+    """
+    Aplica a resposta do cliente de forma idempotente e sem corrida:
+
+    - o UPDATE só acontece se a proposta ainda estiver como o cliente a viu
+      na página (`status_esperado` e `versao`, o updated_at da renderização);
+      se outra resposta ou edição chegou antes, nada é sobrescrito e a
+      resposta fica registrada como não aplicada;
+    - o registro de PropostaResposta é único por (proposta, request_id):
+      um reenvio com o mesmo id devolve o resultado já gravado.
+    """
+    existente = PropostaResposta.objects.filter(
+        proposta=proposta, request_id=request_id
+    ).first()
+    if existente:
+        return existente
+
+    agora = timezone.now()
+    campos = _campos_resposta(action, mensagem, agora)
+
+    try:
+        with transaction.atomic():
+            # updated_at explícito: .update() não aciona auto_now e a data
+            # invalida o cache (ETag) da página pública.
+            condicao = Proposta.objects.filter(
+                pk=proposta.pk,
+                status=status_esperado,
+                permitir_acesso_publico=True,
+            )
+            if versao is not None:
+                condicao = condicao.filter(updated_at=versao)
+            aplicada = condicao.update(updated_at=agora, **campos)
+
+            if aplicada:
+                status_final = campos["status"]
+            else:
+                status_final = (
+                    Proposta.objects.filter(pk=proposta.pk)
+                    .values_list("status", flat=True)
+                    .first()
+                )
+
+            resposta = PropostaResposta.objects.create(
+                company_id=proposta.company_id,
+                proposta=proposta,
+                request_id=request_id,
+                acao=action,
+                mensagem=mensagem,
+                status_anterior=status_esperado,
+                status_final=status_final or "",
+                aplicada=bool(aplicada),
+            )
+
+            if aplicada:
+                # .update() não dispara sinais: rollup e histórico gravados
+                # aqui, na mesma transação da resposta
+                antiga = chave_rollup(proposta)
+                for campo, valor in campos.items():
+                    setattr(proposta, campo, valor)
+                mover_rollup(antiga, chave_rollup(proposta))
+                registrar_evento_proposta(proposta, EVENTO_POR_RESPOSTA[action], origem="cliente")
+                transaction.on_commit(lambda: invalidate_tenant_query_cache(proposta.company_id))
+    except IntegrityError:
+        # Mesmo request_id processado em paralelo: a outra requisição venceu
+        # e o UPDATE desta foi desfeito junto com a transação.
+        return PropostaResposta.objects.get(proposta=proposta, request_id=request_id)
+    return resposta
+
 
 @csrf_exempt
 def proposta_public_responder(request, token):
@@ -498,6 +787,9 @@ def proposta_public_responder(request, token):
     Endpoint público para registrar ação do cliente:
     - action = "aprovar" | "rejeitar" | "revisao"
     - mensagem (opcional, para revisão)
+    - request_id (UUID gerado na página; torna o envio idempotente)
+    - status_esperado / versao (estado exibido na página; evita sobrescrever
+      outra resposta)
     """
     proposta = _get_proposta_publica_or_404(token)
 
@@ -506,42 +798,36 @@ def proposta_public_responder(request, token):
 
     action = request.POST.get("action")
     mensagem = (request.POST.get("mensagem") or "").strip()
-    agora = timezone.now()
 
-    if action == "aprovar":
-        proposta.status = "aprovado"
-        proposta.aprovado_em = agora
-        proposta.rejeitado_em = None
-        proposta.revisao_solicitada_em = None
-        proposta.revisao_mensagem = ""
-        proposta.save(
-            update_fields=[
-                "status",
-                "aprovado_em",
-                "rejeitado_em",
-                "revisao_solicitada_em",
-                "revisao_mensagem",
-            ]
-        )
-        msg = "Proposta aprovada com sucesso. Obrigado!"
-
-    elif action == "rejeitar":
-        proposta.status = "rejeitado"
-        proposta.rejeitado_em = agora
-        proposta.save(update_fields=["status", "rejeitado_em"])
-        msg = "Proposta rejeitada. Obrigado pelo retorno."
-
-    elif action == "revisao":
-        proposta.status = "em_andamento"
-        proposta.revisao_solicitada_em = agora
-        proposta.revisao_mensagem = mensagem
-        proposta.save(
-            update_fields=["status", "revisao_solicitada_em", "revisao_mensagem"]
-        )
-        msg = "Seu pedido de revisão foi registrado. Entraremos em contato."
+    if action not in MENSAGENS_RESPOSTA:
+        return HttpResponseForbidden("Ação inválida.")
+
+    try:
+        request_id = uuid.UUID(request.POST.get("request_id") or "")
+    except ValueError:
+        # Página antiga / sem JavaScript: sem idempotência, mas ainda
+        # protegida pelo UPDATE condicional.
+        request_id = uuid.uuid4()
+
+    status_esperado = request.POST.get("status_esperado")
+    if status_esperado not in dict(Proposta.STATUS_CHOICES):
+        status_esperado = proposta.status
+    versao = parse_datetime(request.POST.get("versao") or "")
+
+    resposta = _registrar_resposta(
+        proposta, request_id, action, mensagem, status_esperado, versao
+    )
 
+    if resposta.aplicada:
+        msg = MENSAGENS_RESPOSTA[resposta.acao]
     else:
-        return HttpResponseForbidden("Ação inválida.")
+        status_label = dict(Proposta.STATUS_CHOICES).get(
+            resposta.status_final, resposta.status_final
+        )
+        msg = (
+            "A proposta foi alterada ou já recebeu outra resposta desde que esta "
+            f"página foi aberta, e sua resposta não foi aplicada. Status atual: {status_label}."
+        )
 
     return render(
         request,
@@ -558,24 +844,94 @@ def proposta_public_responder(request, token):
 # ======================================================================
 @login_required
 def proposta_public_pdf(request, pk):
-    empresa = request.user.empresa
-    proposta = get_object_or_404(Proposta, pk=pk, company=empresa)
+    # Empresa completa (dados do cabeçalho) vem junto com a proposta
+    proposta = get_object_or_404(
+        Proposta.tenant_objects.select_related("company"),
+        pk=pk,
+    )
+
+    # ?profile=1 (staff): relatório do profiler e tempo por etapa no lugar
+    # do PDF. Não entra nas métricas.
+    if request.GET.get("profile") == "1" and request.user.is_staff:
+        medicao = MedicaoPdf()
+        _, relatorio = perfilar(
+            lambda: _renderizar_pdf(request, proposta, proposta.company, medicao=medicao)
+        )
+        return HttpResponse(
+            "%s\n\n%s" % (medicao.tabela(), relatorio),
+            content_type="text/plain; charset=utf-8",
+        )
+
+    pdf_file = _renderizar_pdf(request, proposta, proposta.company)
+
+    response = HttpResponse(pdf_file, content_type="application/pdf")
+    filename = f"Proposta_{proposta.numero}.pdf"
+    response["Content-Disposition"] = f'inline; filename="{filename}"'
+    return response
+
+
+@login_required
+def proposta_revisao_pdf(request, pk, numero):
+    """
+    PDF de uma revisão anterior, com o conteúdo como estava no envio/resposta.
+    A revisão não muda, então o PDF fica em cache.
+    """
+    proposta = get_object_or_404(
+        Proposta.tenant_objects.select_related("company"),
+        pk=pk,
+    )
+
+    if not PropostaRevisao.objects.filter(proposta=proposta, numero=numero).exists():
+        raise Http404("Revisão não encontrada.")
+
+    # Empresa e configuração de propostas entram na chave: logo, dados do
+    # cabeçalho, margens e papel timbrado podem ter mudado
+    cache_key = "propostas:revisao_pdf:%s:%s:%s:%s" % (
+        proposta.pk,
+        numero,
+        proposta.company.updated_at.isoformat(),
+        get_proposta_defaults(proposta.company).versao,
+    )
+    pdf_file = cache.get(cache_key)
+    if pdf_file is None:
+        antiga = proposta_da_revisao(proposta, numero)
+        pdf_file = _renderizar_pdf(request, antiga, proposta.company)
+        if len(pdf_file) <= REVISAO_PDF_CACHE_MAX_BYTES:
+            cache.set(cache_key, pdf_file, REVISAO_CACHE_TIMEOUT)
+
+    response = HttpResponse(pdf_file, content_type="application/pdf")
+    filename = f"Proposta_{proposta.numero}_rev{numero}.pdf"
+    response["Content-Disposition"] = f'inline; filename="{filename}"'
+    return response
+
+
+def _renderizar_pdf(request, proposta, empresa, medicao=None):
+    """
+    Gera o PDF da proposta medindo cada etapa (propostas.pdf). Sem
+    `medicao`, mede e registra nas métricas; com ela (modo profile), só
+    preenche a medição passada.
+    """
+    registrar = medicao is None
+    if registrar:
+        medicao = MedicaoPdf()
 
     itens = _fix_json_field(proposta.itens)
     parcelas = _fix_json_field(proposta.parcelas)
 
-    html_string = render_to_string(
-        "propostas/proposta_publica_pdf.html",
-        {
-            "proposta": proposta,
-            "empresa": empresa,
-            "itens": itens,
-            "parcelas": parcelas,
-        },
-        request=request,
-    )
+    with medicao.etapa("template"):
+        html_string = render_to_string(
+            "propostas/proposta_publica_pdf.html",
+            {
+                "proposta": proposta,
+                "empresa": empresa,
+                "itens": itens,
+                "parcelas": parcelas,
+            },
+            request=request,
+        )
 
     base_url = request.build_absolute_uri("/")
+    defaults = get_proposta_defaults(empresa)
 
     pdf_css = """
     @page {
@@ -726,14 +1082,24 @@ def proposta_public_pdf(request, pk):
     }
     """
 
-    pdf_file = HTML(string=html_string, base_url=base_url).write_pdf(
-        stylesheets=[CSS(string=pdf_css)]
-    )
-
-    response = HttpResponse(pdf_file, content_type="application/pdf")
-    filename = f"Proposta_{proposta.numero}.pdf"
-    response["Content-Disposition"] = f'inline; filename="{filename}"'
-    return response
+    with medicao.etapa("css"):
+        stylesheets = [CSS(string=pdf_css)]
+        # Margens definidas em PropostaConfiguracao sobrepõem as do CSS base;
+        # sem configuração, o PDF fica como sempre foi
+        if defaults.tem_configuracao:
+            stylesheets.append(CSS(string="@page { margin: %s; }" % defaults.margens_pdf()))
+    with medicao.etapa("parse"):
+        html = HTML(string=html_string, base_url=base_url, url_fetcher=medicao.url_fetcher)
+    with medicao.etapa("layout"):
+        documento = html.render(stylesheets=stylesheets)
+    with medicao.etapa("pdf"):
+        pdf_file = documento.write_pdf()
+
+    medicao.paginas = len(documento.pages)
+    medicao.encerrar()
+    if registrar:
+        registrar_medicao_pdf(medicao, empresa.pk, proposta.pk)
+    return pdf_file
 
 
 # ======================================================================
@@ -741,8 +1107,7 @@ def proposta_public_pdf(request, pk):
 # ======================================================================
 @login_required
 def proposta_delete(request, pk):
-    empresa = request.user.empresa
-    proposta = get_object_or_404(Proposta, pk=pk, company=empresa)
+    proposta = get_object_or_404(Proposta.tenant_objects, pk=pk)
 
     if request.method == "POST":
         numero = proposta.numero
@@ -762,20 +1127,215 @@ def proposta_change_status(request, pk):
     """
     Ação rápida para marcar proposta como aprovada ou rejeitada a partir do Kanban.
     """
-    empresa = request.user.empresa
-    proposta = get_object_or_404(Proposta, pk=pk, company=empresa)
+    proposta = get_object_or_404(Proposta.tenant_objects, pk=pk)
 
     novo_status = request.POST.get("status")
     if novo_status not in ["aprovado", "rejeitado"]:
         messages.error(request, "Status inválido.")
         return redirect("propostas:propostas_list")
 
+    status_anterior = proposta.status
     proposta.status = novo_status
-    proposta.save(update_fields=["status"])
+    with transaction.atomic():
+        # updated_at junto: é a versão usada pela página pública (cache e respostas)
+        proposta.save(update_fields=["status", "updated_at"])
+        for tipo in eventos_mudanca_status(status_anterior, novo_status):
+            registrar_evento_proposta(proposta, tipo, request.user)
 
     if novo_status == "aprovado":
         messages.success(request, f"Proposta {proposta.numero} marcada como aprovada.")
     else:
         messages.success(request, f"Proposta {proposta.numero} marcada como rejeitada.")
 
-    return redirect("propostas:propostas_list")
\ No newline at end of file
+    return redirect("propostas:propostas_list")
+
+
+# ======================================================================
+# MOVER CARD (ARRASTAR ENTRE COLUNAS)
+# ======================================================================
+@login_required
+@require_POST
+def proposta_mover_status(request, pk):
+    """
+    Troca o status de uma proposta (qualquer um de STATUS_CHOICES) e devolve
+    só o card atualizado, em JSON.
+
+    Exige `versao` (updated_at da proposta como estava na tela): se alguém
+    alterou a proposta nesse meio tempo, nada é gravado e a resposta é 409
+    com o estado atual, para a tela desfazer o movimento.
+    """
+    novo_status = request.POST.get("status")
+    if novo_status not in dict(Proposta.STATUS_CHOICES):
+        return JsonResponse({"ok": False, "error": "Status inválido."}, status=400)
+
+    versao = parse_datetime(request.POST.get("versao") or "")
+    if versao is None:
+        return JsonResponse(
+            {"ok": False, "error": "Informe a versão da proposta."},
+            status=428,
+        )
+
+    # Um UPDATE condicionado à versão (e ao tenant)
+    movida = mudar_status_em_lote(
+        Proposta.tenant_objects.filter(pk=pk, updated_at=versao),
+        novo_status,
+        request.user,
+    )
+
+    proposta = Proposta.tenant_objects.select_related("cliente").filter(pk=pk).first()
+    if proposta is None:
+        return JsonResponse({"ok": False, "error": "Proposta não encontrada."}, status=404)
+
+    item = ao_vivo.item_quadro(proposta)
+    if not movida and proposta.status != novo_status:
+        return JsonResponse(
+            {
+                "ok": False,
+                "error": "A proposta foi alterada por outra pessoa. Confira o card atualizado.",
+                "proposta": item,
+            },
+            status=409,
+        )
+    return JsonResponse({"ok": True, "proposta": item})
+
+
+# ======================================================================
+# AÇÕES EM LOTE (SELEÇÃO MÚLTIPLA NO KANBAN)
+# ======================================================================
+ACOES_LOTE = ("status", "arquivar", "excluir", "novo_token")
+
+# Máximo de propostas por requisição
+LOTE_MAXIMO = 500
+
+
+@login_required
+@require_POST
+def propostas_acao_lote(request):
+    """
+    Aplica uma ação a várias propostas de uma vez, em uma transação:
+    `acao` (status / arquivar / excluir / novo_token), `ids` (repetido) e,
+    para "status", o `status` novo. Responde JSON para o kanban atualizar
+    os cards sem recarregar a página.
+    """
+    acao = request.POST.get("acao")
+    if acao not in ACOES_LOTE:
+        return JsonResponse({"ok": False, "error": "Ação inválida."}, status=400)
+
+    try:
+        ids = {int(valor) for valor in request.POST.getlist("ids")}
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Seleção inválida."}, status=400)
+    if not ids:
+        return JsonResponse({"ok": False, "error": "Nenhuma proposta selecionada."}, status=400)
+    if len(ids) > LOTE_MAXIMO:
+        return JsonResponse(
+            {"ok": False, "error": f"Selecione no máximo {LOTE_MAXIMO} propostas."},
+            status=400,
+        )
+
+    propostas = Proposta.tenant_objects.filter(pk__in=ids)
+    resposta = {"ok": True, "acao": acao}
+
+    if acao in ("status", "arquivar"):
+        novo_status = "arquivado" if acao == "arquivar" else request.POST.get("status")
+        if novo_status not in dict(Proposta.STATUS_CHOICES):
+            return JsonResponse({"ok": False, "error": "Status inválido."}, status=400)
+        afetadas = list(mudar_status_em_lote(propostas, novo_status, request.user))
+        resposta["status"] = novo_status
+    elif acao == "excluir":
+        afetadas = excluir_em_lote(propostas)
+    else:
+        tokens = regenerar_tokens_em_lote(propostas)
+        afetadas = list(tokens)
+        resposta["links"] = {
+            pk: request.build_absolute_uri(
+                reverse("propostas:proposta_public_view", kwargs={"token": token})
+            )
+            for pk, token in tokens.items()
+        }
+
+    resposta["afetadas"] = sorted(afetadas)
+    # Inexistentes, de outra empresa ou que já estavam no status pedido
+    resposta["ignoradas"] = sorted(ids - set(afetadas))
+    return JsonResponse(resposta)
+
+
+# ======================================================================
+# MÉTRICAS (FUNIL)
+# ======================================================================
+def _inicio_do_dia(valor):
+    data = parse_date(valor or "")
+    if data is None:
+        return None
+    return timezone.make_aware(datetime.combine(data, datetime.min.time()))
+
+
+@login_required
+@require_GET
+@usa_replica
+def propostas_funil_json(request):
+    """
+    Funil das propostas criadas no período (?inicio=AAAA-MM-DD&fim=AAAA-MM-DD,
+    padrão: últimos 90 dias): etapas e conversão por captação e tempo até
+    aprovação, calculados a partir do histórico de eventos.
+    """
+    empresa_id = request.tenant.empresa_id
+    if not empresa_id:
+        return JsonResponse({"ok": False, "error": "Usuário sem empresa."}, status=400)
+
+    fim = _inicio_do_dia(request.GET.get("fim"))
+    if fim is not None:
+        fim += timedelta(days=1)
+
+    dados = funil_propostas(
+        empresa_id,
+        inicio=_inicio_do_dia(request.GET.get("inicio")),
+        fim=fim,
+    )
+    return JsonResponse({"ok": True, **dados})
+
+
+# ======================================================================
+# RELATÓRIOS (CAPTAÇÃO / CATEGORIA DE SERVIÇO)
+# ======================================================================
+RELATORIOS_CSV = {
+    "captacao": (relatorio_por_captacao, "captacao__nome", "Captação", "Sem captação"),
+    "categoria": (relatorio_por_categoria, "categoria__nome", "Categoria", "Sem categoria"),
+}
+
+
+@login_required
+@require_GET
+@usa_replica
+def propostas_relatorios(request):
+    """
+    Valor em pipeline e conversão por captação e por categoria de serviço,
+    com filtros de período, status e captação. ?exportar=captacao|categoria
+    devolve o relatório em CSV.
+    """
+    filtros = FiltrosRelatorio.from_querydict(request.GET)
+
+    exportar = request.GET.get("exportar")
+    if exportar in RELATORIOS_CSV:
+        gerar, campo_nome, titulo_nome, padrao_nome = RELATORIOS_CSV[exportar]
+        response = HttpResponse(content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = (
+            f'attachment; filename="relatorio_{exportar}_{date.today():%Y%m%d}.csv"'
+        )
+        # BOM: o Excel reconhece o UTF-8 (acentos)
+        response.write("\ufeff")
+        escrever_csv(response, gerar(filtros), campo_nome, titulo_nome, padrao_nome)
+        return response
+
+    return render(
+        request,
+        "propostas/relatorios.html",
+        {
+            "filtros": filtros,
+            "por_captacao": relatorio_por_captacao(filtros),
+            "por_categoria": relatorio_por_categoria(filtros),
+            "captacoes": captacoes_para_filtro(),
+            "status_choices": Proposta.STATUS_CHOICES,
+            "querystring": request.GET.urlencode(),
+        },
+    )
@@ -676,6 +676,57 @@
             atualizarFinanceiro(subtotal);
         }
 
+        // --------------------------------------------------------------------
+        // VALORES DO CATÁLOGO
+        // Vêm na própria página (json_script). Se a aba ficar em segundo plano
+        // (o catálogo pode ter sido editado em outra aba), atualiza em lote ao
+        // voltar; o navegador revalida com If-None-Match (304 se nada mudou).
+        // --------------------------------------------------------------------
+        const urlServicosValores = dataDiv
+            ? dataDiv.dataset.servicosValoresUrl
+            : null;
+        const catalogoScript = qId("catalogoServicos");
+        let catalogoServicos = catalogoScript
+            ? JSON.parse(catalogoScript.textContent)
+            : {};
+
+        async function atualizarValoresServicos() {
+            if (!servicoSelect || !urlServicosValores) return;
+            const ids = Array.from(servicoSelect.options)
+                .map((o) => o.value)
+                .filter((v) => v);
+            if (!ids.length) return;
+
+            try {
+                const params = new URLSearchParams({ ids: ids.join(",") });
+                const resp = await fetch(`${urlServicosValores}?${params}`, {
+                    credentials: "same-origin",
+                });
+                if (!resp.ok) return;
+                const data = await resp.json();
+                catalogoServicos = data.servicos || {};
+
+                Array.from(servicoSelect.options).forEach((opt) => {
+                    const s = catalogoServicos[opt.value];
+                    if (!s) return;
+                    opt.dataset.valor = s.valor;
+                    opt.dataset.entregaveis = s.entregaveis;
+                });
+            } catch (err) {
+                console.error("Erro ao atualizar valores dos serviços", err);
+            }
+        }
+
+        let catalogoOculto = false;
+        document.addEventListener("visibilitychange", () => {
+            if (document.hidden) {
+                catalogoOculto = true;
+            } else if (catalogoOculto) {
+                catalogoOculto = false;
+                atualizarValoresServicos();
+            }
+        });
+
         // Adicionar serviço de catálogo
         btnAdicionarServico?.addEventListener("click", () => {
             const opt = servicoSelect?.selectedOptions[0];
@@ -685,8 +736,13 @@
             }
             const id = Number(opt.value);
             const nome = opt.textContent.trim();
-            const valorPadrao = parseNumber(opt.dataset.valor || 0);
-            const entregaveis = opt.dataset.entregaveis || "";
+            const doCatalogo = catalogoServicos[opt.value];
+            const valorPadrao = parseNumber(
+                doCatalogo ? doCatalogo.valor : opt.dataset.valor || 0
+            );
+            const entregaveis = doCatalogo
+                ? doCatalogo.entregaveis
+                : opt.dataset.entregaveis || "";
             const valor = Math.round(valorPadrao * 100) / 100;
 
             itens.push({
@@ -1076,6 +1132,94 @@
             r.addEventListener("change", atualizarModoFinalizacao);
         });
 
+        // --------------------------------------------------------------------
+        // Upload direto do modelo próprio (navegador -> armazenamento)
+        // O arquivo vai direto para o bucket (ou para o fallback local) assim
+        // que é escolhido; o formulário envia só o token. Se falhar, o arquivo
+        // continua no input e segue junto com o formulário, como antes.
+        // --------------------------------------------------------------------
+        const inputModelo = qId("id_modelo_proprio_arquivo");
+        const inputModeloUpload = qId("id_modelo_proprio_upload");
+        const statusModelo = qId("modeloProprioStatus");
+        const urlModeloUpload = dataDiv ? dataDiv.dataset.modeloUploadUrl : null;
+        let envioModelo = null;
+
+        function mostrarStatusModelo(texto) {
+            if (!statusModelo) return;
+            statusModelo.textContent = texto;
+            statusModelo.classList.toggle("is-hidden", !texto);
+        }
+
+        function postarArquivo(url, campos, arquivo, local) {
+            return new Promise((resolve, reject) => {
+                const corpo = new FormData();
+                Object.entries(campos).forEach(([k, v]) => corpo.append(k, v));
+                // S3 exige o arquivo como último campo
+                corpo.append("file", arquivo);
+
+                const xhr = new XMLHttpRequest();
+                xhr.open("POST", url);
+                if (local) xhr.setRequestHeader("X-CSRFToken", getCookie("csrftoken"));
+                xhr.upload.addEventListener("progress", (ev) => {
+                    if (ev.lengthComputable) {
+                        const pct = Math.round((ev.loaded / ev.total) * 100);
+                        mostrarStatusModelo(`Enviando ${arquivo.name}... ${pct}%`);
+                    }
+                });
+                xhr.addEventListener("load", () => {
+                    if (xhr.status >= 200 && xhr.status < 300) resolve();
+                    else reject(new Error(`HTTP ${xhr.status}`));
+                });
+                xhr.addEventListener("error", () => reject(new Error("Falha de rede")));
+                xhr.send(corpo);
+            });
+        }
+
+        async function enviarModelo(arquivo) {
+            inputModeloUpload.value = "";
+            mostrarStatusModelo(`Enviando ${arquivo.name}...`);
+
+            const resp = await fetch(urlModeloUpload, {
+                method: "POST",
+                headers: {
+                    "X-Requested-With": "XMLHttpRequest",
+                    "X-CSRFToken": getCookie("csrftoken"),
+                },
+                credentials: "same-origin",
+                body: new URLSearchParams({ nome: arquivo.name, tamanho: arquivo.size }),
+            });
+            const dados = await resp.json();
+            if (!dados.ok) {
+                // Recusado pelo servidor (tipo/tamanho): não adianta reenviar
+                inputModelo.value = "";
+                mostrarStatusModelo(dados.error || "Arquivo não permitido.");
+                return;
+            }
+
+            await postarArquivo(dados.url, dados.campos, arquivo, dados.local);
+            inputModeloUpload.value = dados.token;
+            // Já está no armazenamento: não vai de novo com o formulário
+            inputModelo.value = "";
+            mostrarStatusModelo(`Arquivo enviado: ${arquivo.name}. Salve a proposta para anexá-lo.`);
+        }
+
+        if (inputModelo && inputModeloUpload && urlModeloUpload) {
+            inputModelo.addEventListener("change", () => {
+                const arquivo = inputModelo.files && inputModelo.files[0];
+                if (!arquivo) return;
+                envioModelo = enviarModelo(arquivo)
+                    .catch((err) => {
+                        console.error("Erro no upload direto do modelo próprio:", err);
+                        mostrarStatusModelo(
+                            "Não foi possível enviar agora; o arquivo seguirá junto com o formulário."
+                        );
+                    })
+                    .finally(() => {
+                        envioModelo = null;
+                    });
+            });
+        }
+
         // --------------------------------------------------------------------
         // Render inicial e submit
         // --------------------------------------------------------------------
@@ -1088,7 +1232,12 @@
         renderInvestTabela();
 
         if (form) {
-            form.addEventListener("submit", () => {
+            form.addEventListener("submit", (ev) => {
+                if (envioModelo) {
+                    ev.preventDefault();
+                    alert("Aguarde o envio do arquivo do modelo próprio terminar.");
+                    return;
+                }
                 if (itensJsonInput)
                     itensJsonInput.value = JSON.stringify(itens || []);
                 if (parcelasJsonInput)